@@ -0,0 +1,215 @@
+import os
+import re
+import json
+import math
+from collections import Counter, deque
+
+from storage import SUMMARY_COLUMNS, sidecar_path
+from schema import as_list
+
+# Suffix of the saved totals, kept next to the dream log they summarize
+AGGREGATES_SUFFIX = ".aggregates.json"
+
+# Number of most recent dreams kept whole, for "recent" trends
+RECENT_ENTRIES = 5
+
+# Keys of the per-day rollups
+DAY_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}$")
+
+_aggregates = None
+
+def aggregates_path(store_path=None):
+    """Where the totals of the dream log at store_path (default DREAM_STORE) are saved."""
+    return sidecar_path(store_path, AGGREGATES_SUFFIX)
+
+def _day(date):
+    """Return the YYYY-MM-DD day of a stored date, or None for an undated dream."""
+    day = str(date)[:10]
+    return day if DAY_PATTERN.match(day) else None
+
+def _sentiment(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+class DreamAggregates:
+    """Running totals over the dream history, maintained on every insert.
+
+    Holds emotion, theme and category counts, the sentiment sum and count,
+    per-day rollups and the most recent entries, so dashboards and pattern
+    summaries don't re-split every row of the log. Counts keep the order in
+    which values first appeared, like a Counter built over the history.
+
+    The totals are saved to a JSON file next to the dream log
+    (aggregates_path) together with the store version they describe; if
+    the store has changed since, they are rebuilt from it.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or aggregates_path()
+        self._clear()
+        self._load()
+
+    def _clear(self):
+        self.store_version = None
+        self.total = 0
+        self.emotion_counts = Counter()
+        self.theme_counts = Counter()
+        self.category_counts = Counter()
+        self.sentiment_sum = 0.0
+        self.sentiment_count = 0
+        # date -> [dreams, sentiment count, sentiment sum]
+        self.daily = {}
+        self.recent = deque(maxlen=RECENT_ENTRIES)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.store_version = data['store_version']
+            self.total = data['total']
+            self.emotion_counts = Counter(data['emotion_counts'])
+            self.theme_counts = Counter(data['theme_counts'])
+            self.category_counts = Counter(data['category_counts'])
+            self.sentiment_sum = data['sentiment_sum']
+            self.sentiment_count = data['sentiment_count']
+            # Files written before undated dreams were skipped may hold e.g. a "NaT" day
+            self.daily = {day: values for day, values in data['daily'].items() if _day(day)}
+            self.recent = deque(data['recent'], maxlen=RECENT_ENTRIES)
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Error loading dream aggregates, rebuilding them: {e}")
+            self._clear()
+
+    def _save(self):
+        data = {
+            'store_version': self.store_version,
+            'total': self.total,
+            'emotion_counts': self.emotion_counts,
+            'theme_counts': self.theme_counts,
+            'category_counts': self.category_counts,
+            'sentiment_sum': self.sentiment_sum,
+            'sentiment_count': self.sentiment_count,
+            'daily': self.daily,
+            'recent': list(self.recent)
+        }
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving dream aggregates: {e}")
+
+    def _add(self, entry):
+        emotions = as_list(entry.get('emotions'))
+        themes = as_list(entry.get('themes'))
+        category = entry.get('category')
+        category = category if isinstance(category, str) else None
+        sentiment = _sentiment(entry.get('sentiment'))
+
+        self.total += 1
+        self.emotion_counts.update(emotions)
+        self.theme_counts.update(themes)
+        if category is not None:
+            self.category_counts[category] += 1
+
+        # CLI entries carry a time of day; rollups are per calendar day, and
+        # undated dreams are left out of them
+        date = entry.get('date')
+        day = _day(date)
+        rollup = self.daily.setdefault(day, [0, 0, 0.0]) if day is not None else None
+        if rollup is not None:
+            rollup[0] += 1
+        if sentiment is not None:
+            self.sentiment_sum += sentiment
+            self.sentiment_count += 1
+            if rollup is not None:
+                rollup[1] += 1
+                rollup[2] += sentiment
+
+        self.recent.append({'date': str(date) if day is not None else None, 'themes': list(themes),
+                            'emotions': list(emotions), 'sentiment': sentiment, 'category': category})
+
+    def add_entries(self, entries, store_version=None):
+        """Fold newly stored entries into the totals and save them."""
+        for entry in entries:
+            self._add(entry)
+        self.store_version = store_version
+        self._save()
+
+    def rebuild(self, store):
+        """Recompute every total from the store, reading it a chunk at a time."""
+        self._clear()
+        store_version = store.version()
+        for chunk in store.iter_chunks(columns=SUMMARY_COLUMNS):
+            for entry in chunk.to_dict('records'):
+                self._add(entry)
+        self.store_version = store_version
+        self._save()
+
+    def reset(self, store_version=None):
+        """Empty the totals, e.g. when the dream history is cleared."""
+        self._clear()
+        self.add_entries([], store_version)
+
+    def sync(self, store):
+        """Rebuild the totals if the store changed without them, e.g. from another process."""
+        if self.store_version is None or self.store_version != store.version():
+            self.rebuild(store)
+        return self
+
+    def sentiment_mean(self):
+        return self.sentiment_sum / self.sentiment_count if self.sentiment_count else float("nan")
+
+    def top_category(self):
+        """Most frequent category, ties broken like DataFrame.mode (smallest value)."""
+        if not self.category_counts:
+            return None
+        most = max(self.category_counts.values())
+        return min(category for category, count in self.category_counts.items() if count == most)
+
+    def recent_sentiments(self, n=3):
+        return [e['sentiment'] for e in list(self.recent)[-n:] if e['sentiment'] is not None]
+
+    def recent_themes(self, n=5):
+        return [theme for e in list(self.recent)[-n:] for theme in e['themes']]
+
+    def daily_sentiment(self):
+        """Return (dates, mean sentiment per day) sorted by date, for days with sentiment."""
+        days = sorted((date, values) for date, values in self.daily.items() if values[1])
+        return [date for date, _ in days], [values[2] / values[1] for _, values in days]
+
+def get_aggregates(store=None):
+    """Return the process-wide aggregates, those of store, synced with it, when one is given."""
+    global _aggregates
+    if store is not None and (_aggregates is None or _aggregates.path != aggregates_path(store.path)):
+        _aggregates = DreamAggregates(aggregates_path(store.path))
+    if _aggregates is None:
+        _aggregates = DreamAggregates()
+    if store is not None:
+        _aggregates.sync(store)
+    return _aggregates
+
+def record_dreams(store, entries, views=()):
+    """Append entries to store and fold them into the aggregates and any other views.
+
+    views are further objects derived from the store the way the
+    aggregates are, with store_version, sync, add_entries and rebuild,
+    e.g. the timeline. Each one takes the new entries only if it was in
+    sync with the store right before this append; if another process
+    appended in between, it is rebuilt instead, so those dreams count too.
+    """
+    aggregates = get_aggregates(store)
+    views = [aggregates] + [view.sync(store) for view in views]
+    entries = list(entries)
+    before, after = store.append_many(entries)
+    for view in views:
+        if before is not None and view.store_version == before:
+            view.add_entries(entries, after)
+        else:
+            view.rebuild(store)
+    return aggregates
@@ -1,15 +1,24 @@
 import streamlit as st
 import pandas as pd
-import nltk
 import matplotlib.pyplot as plt
 import os
-from nltk.sentiment import SentimentIntensityAnalyzer
-from nlp_utils import extract_keywords, analyze_sentiment, extract_dream_themes
-from gpt_predictor import predict_future_impact, analyze_dream_patterns, GOOGLE_API_KEY
+import io
+from nlp_utils import analyze_dream
+from resources import get_nlp, get_sentiment_analyzer
+from gpt_predictor import predict_future_impact_stream, analyze_dream_patterns, GOOGLE_API_KEY
 from personality import get_personality_data, get_personality_profile, get_dream_processing_style
-from visualization import generate_wordcloud, plot_sentiment_over_time, plot_emotion_distribution, plot_theme_correlation, plot_interactive_sentiment_timeline, create_dream_dashboard
-from emotion_detection import detect_emotions, analyze_emotion_patterns, get_emotion_recommendations
-from dream_symbols import analyze_dream_symbols, get_symbol_frequencies, generate_symbol_insights
+from visualization import generate_wordcloud, plot_sentiment_over_time, plot_emotion_distribution, plot_theme_correlation, plot_interactive_sentiment_timeline, plot_emotion_timeline, create_dream_dashboard
+from emotion_detection import analyze_emotion_patterns, get_emotion_recommendations
+from dream_symbols import get_symbol_frequencies, generate_symbol_insights, get_symbol_index
+from storage import open_store, SUMMARY_COLUMNS
+from aggregates import get_aggregates, record_dreams
+from history_stream import describe_patterns
+from timeline import get_timeline
+from search_index import get_search_index, search_dreams
+from similarity import get_similarity_index, find_similar_dreams, prediction_context
+from theme_matrix import ThemeMatrix
+from schema import as_list, to_typed
+from metrics import get_metrics, timer
 import datetime
 import numpy as np
 import sys
@@ -17,33 +26,56 @@ import sys
 # Version number
 APP_VERSION = "1.0.0"
 
-# Initialize NLTK
-try:
-    nltk.data.find('vader_lexicon')
-except LookupError:
-    nltk.download('vader_lexicon')
-
 st.set_page_config(page_title="Future Dream Influence Predictor", layout="wide")
 
+# Derived results are cached per history version; older versions are evicted
+CACHE_MAX_VERSIONS = 4
+
+# Number of dreams shown for a search
+SEARCH_RESULTS = 20
+
+# Number of past dreams shown as "dreams like this one" and passed to the prediction
+SIMILAR_DREAMS = 3
+
+@st.cache_resource
+def get_store():
+    # Dream log storage backend (CSV by default, SQLite when DREAM_STORE points at a .db file)
+    return open_store()
+
+@st.cache_resource(show_spinner="Loading language models...")
+def load_language_models():
+    return get_nlp(), get_sentiment_analyzer()
+
+store = get_store()
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def load_history(version):
+    # Dream text is only loaded by the pages that need it; lists, dates and
+    # categories are parsed once here instead of by every consumer
+    return to_typed(store.load(columns=SUMMARY_COLUMNS))
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def load_history_columns(version, columns):
+    return to_typed(store.load(columns=list(columns)))
+
 # Initialize session state
 def init_session_state():
     if 'personality' not in st.session_state:
         st.session_state.personality = {"intuition": 5, "stress": 5, "creativity": 5, "analytical": 5}
     
-    if 'dream_history' not in st.session_state:
-        try:
-            df = pd.read_csv("dream_log.csv")
-            # Ensure all required columns exist
-            required_columns = ["date", "dream", "themes", "sentiment", "category"]
-            for col in required_columns:
-                if col not in df.columns:
-                    df[col] = "" if col != "sentiment" else 0.0
-            
-            st.session_state.dream_history = df
-        except (FileNotFoundError, pd.errors.EmptyDataError):
-            st.session_state.dream_history = pd.DataFrame(
-                columns=["date", "dream", "themes", "sentiment", "category", "emotions", "symbols"]
-            )
+    if 'use_response_cache' not in st.session_state:
+        st.session_state.use_response_cache = True
+    
+    # Reload only when the log changed, including writes from other sessions or the CLI
+    try:
+        version = store.version()
+        if st.session_state.get('history_version') != version or 'dream_history' not in st.session_state:
+            st.session_state.dream_history = load_history(version)
+            st.session_state.history_version = version
+    except Exception as e:
+        st.error(f"Error loading dream history: {str(e)}")
+        st.session_state.dream_history = to_typed(pd.DataFrame(columns=SUMMARY_COLUMNS))
+        st.session_state.history_version = None
 
 # Call initialization function
 init_session_state()
@@ -74,49 +106,60 @@ def categorize_dream(themes, sentiment):
     max_category = max(category_scores.items(), key=lambda x: x[1]) if category_scores else ("other", 0)
     return max_category[0] if max_category[1] > 0 else "other"
 
-def analyze_patterns(dream_history):
+def analyze_patterns(dream_history, aggregates=None):
+    if aggregates is not None:
+        return _analyze_aggregate_patterns(aggregates)
+    
     if not isinstance(dream_history, pd.DataFrame) or len(dream_history) < 2:
         return "Not enough dream data to analyze patterns."
     
     try:
-        sentiment_trend = "increasing" if dream_history["sentiment"].iloc[-1] > dream_history["sentiment"].mean() else "decreasing"
-        
         all_themes = []
-        for themes_str in dream_history["themes"]:
-            if isinstance(themes_str, str):
-                all_themes.extend([t.strip() for t in themes_str.split(",")])
+        for themes in dream_history["themes"]:
+            all_themes.extend(as_list(themes))
         
         from collections import Counter
-        common_themes = Counter(all_themes).most_common(3) if all_themes else [("unknown", 0)]
-        
         if "category" in dream_history.columns and not dream_history["category"].empty:
             most_common_category = dream_history["category"].mode()[0]
         else:
             most_common_category = "unknown"
         
-        analysis = f"Your dream sentiment is {sentiment_trend}. "
-        analysis += f"Your most common dream themes are: {', '.join([t[0] for t in common_themes])}. "
-        analysis += f"Your dreams most frequently fall into the '{most_common_category}' category."
-        
-        return analysis
+        sentiment = dream_history["sentiment"]
+        return describe_patterns(sentiment.iloc[-1], sentiment.mean(), Counter(all_themes), most_common_category)
     except Exception as e:
         return f"Error analyzing patterns: {str(e)}"
 
-def generate_recommendations(dream_history, personality):
-    if not isinstance(dream_history, pd.DataFrame) or len(dream_history) < 2:
+def _analyze_aggregate_patterns(aggregates):
+    # Same summary as analyze_patterns, read from the running totals
+    if aggregates.total < 2:
+        return "Not enough dream data to analyze patterns."
+    
+    last_sentiment = aggregates.recent[-1]['sentiment'] if aggregates.recent else None
+    return describe_patterns(last_sentiment, aggregates.sentiment_mean(), aggregates.theme_counts,
+                             aggregates.top_category())
+
+def generate_recommendations(dream_history, personality, aggregates=None):
+    history_size = aggregates.total if aggregates is not None else (
+        len(dream_history) if isinstance(dream_history, pd.DataFrame) else 0)
+    if history_size < 2:
         return "Not enough dream data to generate personalized recommendations."
     
     try:
         recommendations = []
         
-        recent_sentiments = dream_history["sentiment"].tail(3)
+        if aggregates is not None:
+            recent_sentiments = pd.Series(aggregates.recent_sentiments(3), dtype="float64")
+        else:
+            recent_sentiments = dream_history["sentiment"].tail(3)
         if recent_sentiments.mean() < -0.2:
             recommendations.append("Your recent dreams show negative emotions. Consider stress-reduction activities like meditation or exercise.")
         
-        all_themes = []
-        for themes_str in dream_history["themes"].tail(5):
-            if isinstance(themes_str, str):
-                all_themes.extend([t.strip() for t in themes_str.split(",")])
+        if aggregates is not None:
+            all_themes = aggregates.recent_themes(5)
+        else:
+            all_themes = []
+            for themes in dream_history["themes"].tail(5):
+                all_themes.extend(as_list(themes))
         
         from collections import Counter
         theme_counts = Counter(all_themes)
@@ -144,15 +187,148 @@ def generate_recommendations(dream_history, personality):
     except Exception as e:
         return f"Error generating recommendations: {str(e)}"
 
-def save_dream_history():
+def _png(fig):
+    # Figures are cached as rendered images, so a rerun only sends the bytes again
+    if fig is None:
+        return None
+    buffer = io.BytesIO()
+    with timer("chart_render"):
+        fig.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def history_categories(version):
+    return store.categories()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def search_history(version, query):
+    history = load_history_columns(version, ("date", "dream", "themes", "sentiment", "category"))
+    return search_dreams(history, query, k=SEARCH_RESULTS, index=get_search_index(store))
+
+def similar_past_dreams(keywords, symbols, emotions):
+    # At the version the similarity index syncs to, so its positions match the rows
+    history = load_history_columns(store.version(), ("date", "dream", "themes", "sentiment", "category"))
+    return find_similar_dreams(store, keywords, symbols, emotions, k=SIMILAR_DREAMS, history=history)
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def history_figures(version, start_date, end_date, category):
+    filtered_df = get_timeline(store).between(start_date, end_date, category)
+    sentiment_fig = _png(plot_sentiment_over_time(filtered_df))
+    
+    category_fig = None
+    if "category" in filtered_df.columns:
+        fig, ax = plt.subplots(figsize=(10, 6))
+        category_counts = filtered_df["category"].value_counts()
+        category_counts = category_counts[category_counts > 0]
+        category_counts.plot(kind="bar", ax=ax)
+        ax.set_title("Dream Categories")
+        ax.set_ylabel("Count")
+        ax.tick_params(axis="x", labelrotation=45)
+        category_fig = _png(fig)
+    return sentiment_fig, category_fig
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def cached_dream_patterns(version, personality):
+    return analyze_dream_patterns(load_history_columns(version, ("dream", "themes", "emotions", "sentiment")),
+                                  personality, use_cache=True, symbol_index=get_symbol_index(store))
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def cached_patterns(version):
+    return analyze_patterns(None, aggregates=get_aggregates(store))
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def cached_recommendations(version, personality):
+    return generate_recommendations(None, personality, aggregates=get_aggregates(store))
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def cached_emotion_patterns(version):
+    return analyze_emotion_patterns(load_history(version))
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def cached_symbol_insights(version, personality):
+    return generate_symbol_insights(load_history_columns(version, ("dream",)), personality,
+                                    index=get_symbol_index(store))
+
+@st.cache_resource(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def load_theme_matrix(version):
+    # Tokenized once per history version and shared by the theme charts
+    return ThemeMatrix.from_series(load_history(version)["themes"])
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def sentiment_histogram_figure(version):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.hist(load_history(version)["sentiment"], bins=10, alpha=0.7)
+    ax.set_title("Distribution of Dream Sentiment")
+    ax.set_xlabel("Sentiment Score")
+    ax.set_ylabel("Frequency")
+    return _png(fig)
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def sentiment_timeline_figure(version):
+    return plot_interactive_sentiment_timeline(None, timeline=get_timeline(store))
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def emotion_timeline_figure(version):
+    return plot_emotion_timeline(get_timeline(store))
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def emotion_distribution_figure(version):
+    return _png(plot_emotion_distribution(None, aggregates=get_aggregates(store)))
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def theme_correlation_figure(version):
+    return _png(plot_theme_correlation(load_history(version), theme_matrix=load_theme_matrix(version)))
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def dashboard_figure(version):
+    return create_dream_dashboard(None, aggregates=get_aggregates(store))
+
+@st.cache_data(max_entries=CACHE_MAX_VERSIONS, show_spinner=False)
+def theme_evolution_figure(version):
+    dream_history = load_history(version)
+    theme_matrix = load_theme_matrix(version)
+    
+    # Get top 5 themes
+    top_theme_names = [theme for theme, _ in theme_matrix.top_k(5)]
+    if not top_theme_names:
+        return None
+    
+    # Rolling frequencies are computed over the dreams in the timeline's date order
+    timeline = get_timeline(store)
+    window = min(3, len(dream_history))
+    rolling = theme_matrix.rolling_frequency(top_theme_names, window=window, order=timeline.order)
+    sorted_dates = timeline.dates
+    
+    fig, ax = plt.subplots(figsize=(12, 6))
+    for theme in top_theme_names:
+        ax.plot(sorted_dates, rolling[theme], marker='o', label=theme)
+    
+    ax.set_title("Theme Frequency Over Time (3-dream rolling average)")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Frequency")
+    ax.legend()
+    return _png(fig)
+
+def save_dream_entry(entry):
     try:
-        if st.session_state.dream_history is not None:
-            st.session_state.dream_history.to_csv("dream_log.csv", index=False)
-            return True
+        aggregates = record_dreams(store, [entry], views=[get_timeline(), get_similarity_index(),
+                                                          get_search_index(store)])
+        version = aggregates.store_version
+        st.session_state.dream_history = load_history(version)
+        st.session_state.history_version = version
+        return True
     except Exception as e:
         st.error(f"Error saving dream history: {str(e)}")
         return False
-    return False
+
+def clear_dream_history():
+    store.clear()
+    get_aggregates().reset(store.version())
+    get_timeline().reset(store.version())
+    get_similarity_index().reset(store.version())
+    get_search_index().reset(store.version())
+    st.session_state.dream_history = to_typed(pd.DataFrame(columns=SUMMARY_COLUMNS))
 
 # Navigation sidebar
 page = st.sidebar.radio("Go to", ["Dream Input", "Dream History", "Analysis & Insights", "Settings"])
@@ -169,19 +345,21 @@ if page == "Dream Input":
     
     if st.button("Analyze Dream"):
         if dream_text:
+            load_language_models()
             with st.spinner("Analyzing your dream..."):
                 try:
-                    themes = extract_keywords(dream_text)
-                    sentiment_scores = analyze_sentiment(dream_text)
+                    analysis = analyze_dream(dream_text)
+                    themes = analysis.keywords
+                    sentiment_scores = analysis.sentiment
                     compound_sentiment = sentiment_scores.get('compound', 0)
-                    dream_themes = extract_dream_themes(dream_text)
+                    dream_themes = analysis.themes
                     category = categorize_dream(themes, compound_sentiment)
                     
-                    emotions = detect_emotions(dream_text)
+                    emotions = analysis.emotions
                     primary_emotions = emotions['primary_emotions']
                     emotion_scores = emotions['emotion_scores']
                     
-                    symbol_analysis = analyze_dream_symbols(dream_text, st.session_state.personality)
+                    symbol_analysis = analysis.symbol_analysis(st.session_state.personality)
                     symbols_found = symbol_analysis['symbols_found']
                     
                     col1, col2 = st.columns(2)
@@ -220,10 +398,32 @@ if page == "Dream Input":
                             with st.expander("Symbol Interpretation"):
                                 st.write(symbol_analysis['interpretation'])
                     
+                    # Found before the dream is saved, so it does not match itself
+                    similar_dreams = []
+                    try:
+                        similar = similar_past_dreams(themes, symbols_found, primary_emotions)
+                        similar_dreams = prediction_context(similar)
+                    except Exception as e:
+                        print(f"Error finding similar dreams: {e}")
+                    if similar_dreams:
+                        st.subheader("Dreams Like This One")
+                        for similar in similar_dreams:
+                            themes_text = ", ".join(similar['themes'])
+                            st.markdown(f"**{similar['date'] or 'Undated'}** ({similar['similarity']:.0%} similar"
+                                        + (f"; themes: {themes_text}" if themes_text else "") + ")")
+                            st.caption(similar['excerpt'])
+                    
                     st.subheader("Future Influence Prediction")
-                    prediction = predict_future_impact(dream_themes, compound_sentiment, st.session_state.personality, 
-                                                    dream_text=dream_text, emotions=emotion_scores, symbols=symbols_found)
-                    st.write(prediction)
+                    # Render the prediction chunk by chunk as it streams in
+                    prediction_placeholder = st.empty()
+                    prediction = ""
+                    for chunk in predict_future_impact_stream(dream_themes, compound_sentiment, st.session_state.personality, 
+                                                              dream_text=dream_text, emotions=emotion_scores, symbols=symbols_found,
+                                                              use_cache=st.session_state.use_response_cache,
+                                                              similar_dreams=similar_dreams):
+                        prediction += chunk
+                        prediction_placeholder.markdown(prediction + "▌")
+                    prediction_placeholder.markdown(prediction)
                     
                     st.subheader("Personalized Recommendations")
                     tabs = st.tabs(["Emotion-Based", "Symbol-Based"])
@@ -233,26 +433,20 @@ if page == "Dream Input":
                     with tabs[1]:
                         st.write(symbol_analysis['recommendations'])
                     
-                    emotions_str = ", ".join(primary_emotions) if primary_emotions else "neutral"
-                    symbols_str = ", ".join(symbols_found) if symbols_found else ""
-                    
+                    # A typed entry; the store writes lists in its comma-joined format
                     new_entry = {
-                        "date": dream_date.strftime("%Y-%m-%d"),
+                        "date": pd.Timestamp(dream_date),
                         "dream": dream_text,
-                        "themes": ", ".join(themes),
+                        "themes": list(themes),
                         "sentiment": compound_sentiment,
                         "category": category,
-                        "emotions": emotions_str,
-                        "symbols": symbols_str
+                        "emotions": primary_emotions if primary_emotions else ["neutral"],
+                        "symbols": list(symbols_found)
                     }
                     
-                    # Add new dream entry
-                    st.session_state.dream_history = pd.concat([st.session_state.dream_history, 
-                                                            pd.DataFrame([new_entry])], 
-                                                            ignore_index=True)
-                    
-                    # Save to file
-                    if save_dream_history():
+                    # Add new dream entry and save it to the dream log
+                    if save_dream_entry(new_entry):
+                        get_symbol_index(store).add_dream(dream_text)
                         st.success("Dream analyzed and saved to history!")
                 except Exception as e:
                     st.error(f"Error analyzing dream: {str(e)}")
@@ -265,54 +459,55 @@ elif page == "Dream History":
     if isinstance(st.session_state.dream_history, pd.DataFrame) and len(st.session_state.dream_history) > 0:
         st.write(f"You have recorded {len(st.session_state.dream_history)} dreams.")
         
+        st.subheader("Search Dreams")
+        search_query = st.text_input("Search your dreams",
+                                     placeholder='Words to look for, or "an exact phrase"')
+        if search_query.strip():
+            try:
+                results = search_history(st.session_state.history_version, search_query)
+                if len(results) > 0:
+                    st.dataframe(results[["date", "dream", "themes", "category", "score"]], hide_index=True)
+                else:
+                    st.info("No dreams match your search.")
+            except Exception as e:
+                st.error(f"Error searching dreams: {str(e)}")
+        
         st.subheader("Filter Dreams")
         col1, col2 = st.columns(2)
         with col1:
             date_range = st.date_input("Date range", 
                                       [datetime.date.today() - datetime.timedelta(days=30), datetime.date.today()])
         with col2:
-            if "category" in st.session_state.dream_history.columns:
-                all_categories = st.session_state.dream_history["category"].dropna().unique()
-                categories = ["All"] + list(all_categories)
-                selected_category = st.selectbox("Category", categories)
+            categories = ["All"] + history_categories(st.session_state.history_version)
+            selected_category = st.selectbox("Category", categories)
         
         try:
-            filtered_df = st.session_state.dream_history.copy()
-            if len(date_range) == 2:
-                filtered_df = filtered_df[(filtered_df["date"] >= date_range[0].strftime("%Y-%m-%d")) & 
-                                        (filtered_df["date"] <= date_range[1].strftime("%Y-%m-%d"))]
-            
-            if "category" in filtered_df.columns and selected_category != "All":
-                filtered_df = filtered_df[filtered_df["category"] == selected_category]
+            # Date ranges are binary searches over the sorted timeline, not filtered copies
+            start_date, end_date = date_range if len(date_range) == 2 else (None, None)
+            category_filter = None if selected_category == "All" else selected_category
+            version = st.session_state.history_version
+            filtered_df = get_timeline(store).between(start_date, end_date, category_filter)
             
             st.subheader("Dream Records")
             display_columns = ["date", "dream", "themes", "sentiment", "category"]
             # Only include columns that exist
             display_columns = [col for col in display_columns if col in filtered_df.columns]
-            st.dataframe(filtered_df[display_columns])
+            st.dataframe(filtered_df[display_columns], hide_index=True)
             
             if len(filtered_df) > 1:
-                st.subheader("Sentiment Over Time")
                 try:
-                    fig, ax = plt.subplots(figsize=(10, 6))
-                    filtered_df["date"] = pd.to_datetime(filtered_df["date"])
-                    plot_sentiment_over_time(filtered_df)
-                    st.pyplot(fig)
+                    sentiment_fig, category_fig = history_figures(version, start_date, end_date, category_filter)
                 except Exception as e:
-                    st.error(f"Error plotting sentiment: {str(e)}")
+                    st.error(f"Error plotting dream history: {str(e)}")
+                    sentiment_fig, category_fig = None, None
                 
-                if "category" in filtered_df.columns:
-                    try:
-                        st.subheader("Dream Category Distribution")
-                        fig, ax = plt.subplots(figsize=(10, 6))
-                        category_counts = filtered_df["category"].value_counts()
-                        category_counts.plot(kind="bar", ax=ax)
-                        plt.title("Dream Categories")
-                        plt.ylabel("Count")
-                        plt.xticks(rotation=45)
-                        st.pyplot(fig)
-                    except Exception as e:
-                        st.error(f"Error plotting categories: {str(e)}")
+                if sentiment_fig is not None:
+                    st.subheader("Sentiment Over Time")
+                    st.image(sentiment_fig)
+                
+                if category_fig is not None:
+                    st.subheader("Dream Category Distribution")
+                    st.image(category_fig)
         except Exception as e:
             st.error(f"Error processing dream history: {str(e)}")
     else:
@@ -322,16 +517,25 @@ elif page == "Analysis & Insights":
     st.title("Dream Analysis & Insights")
     
     if isinstance(st.session_state.dream_history, pd.DataFrame) and len(st.session_state.dream_history) > 1:
+        # Everything below is cached per history version, so reruns only redraw
+        version = st.session_state.history_version
+        personality = st.session_state.personality
+        
         st.subheader("Dream Patterns")
         if len(st.session_state.dream_history) >= 3:
-            pattern_analysis = analyze_dream_patterns(st.session_state.dream_history, st.session_state.personality)
+            if st.session_state.use_response_cache:
+                pattern_analysis = cached_dream_patterns(version, personality)
+            else:
+                pattern_analysis = analyze_dream_patterns(
+                    load_history_columns(version, ("dream", "themes", "emotions", "sentiment")),
+                    personality, use_cache=False, symbol_index=get_symbol_index(store))
             st.write(pattern_analysis)
         else:
-            pattern_analysis = analyze_patterns(st.session_state.dream_history)
+            pattern_analysis = cached_patterns(version)
             st.write(pattern_analysis)
         
         st.subheader("Personalized Recommendations")
-        recommendations = generate_recommendations(st.session_state.dream_history, st.session_state.personality)
+        recommendations = cached_recommendations(version, personality)
         st.write(recommendations)
         
         st.subheader("Dream Insights Visualization")
@@ -341,32 +545,37 @@ elif page == "Analysis & Insights":
         with tabs[0]:
             st.subheader("Distribution of Dream Sentiment")
             try:
-                fig, ax = plt.subplots(figsize=(10, 6))
-                plt.hist(st.session_state.dream_history["sentiment"], bins=10, alpha=0.7)
-                plt.title("Distribution of Dream Sentiment")
-                plt.xlabel("Sentiment Score")
-                plt.ylabel("Frequency")
-                st.pyplot(fig)
+                st.image(sentiment_histogram_figure(version))
             except Exception as e:
                 st.error(f"Error creating sentiment histogram: {str(e)}")
             
             st.subheader("Interactive Sentiment Timeline")
             try:
-                interactive_fig = plot_interactive_sentiment_timeline(st.session_state.dream_history)
+                interactive_fig = sentiment_timeline_figure(version)
                 if interactive_fig:
                     st.plotly_chart(interactive_fig, use_container_width=True)
                 else:
                     st.info("Not enough data to create interactive timeline.")
             except Exception as e:
                 st.error(f"Error creating sentiment timeline: {str(e)}")
+            
+            st.subheader("Emotions Over Time")
+            try:
+                emotion_timeline = emotion_timeline_figure(version)
+                if emotion_timeline:
+                    st.plotly_chart(emotion_timeline, use_container_width=True)
+                else:
+                    st.info("Not enough emotion data to show emotions over time.")
+            except Exception as e:
+                st.error(f"Error creating emotion timeline: {str(e)}")
         
         with tabs[1]:
             if 'emotions' in st.session_state.dream_history.columns:
                 st.subheader("Emotion Distribution")
                 try:
-                    emotion_fig = plot_emotion_distribution(st.session_state.dream_history)
+                    emotion_fig = emotion_distribution_figure(version)
                     if emotion_fig:
-                        st.pyplot(emotion_fig)
+                        st.image(emotion_fig)
                     else:
                         st.info("Not enough emotion data for visualization.")
                 except Exception as e:
@@ -375,7 +584,7 @@ elif page == "Analysis & Insights":
                 if len(st.session_state.dream_history) >= 3:
                     st.subheader("Emotion Pattern Analysis")
                     try:
-                        emotion_analysis = analyze_emotion_patterns(st.session_state.dream_history)
+                        emotion_analysis = cached_emotion_patterns(version)
                         st.write(emotion_analysis)
                     except Exception as e:
                         st.error(f"Error analyzing emotion patterns: {str(e)}")
@@ -387,9 +596,9 @@ elif page == "Analysis & Insights":
             if len(st.session_state.dream_history) >= 5:
                 st.subheader("Theme Correlation Analysis")
                 try:
-                    theme_fig = plot_theme_correlation(st.session_state.dream_history)
+                    theme_fig = theme_correlation_figure(version)
                     if theme_fig:
-                        st.pyplot(theme_fig)
+                        st.image(theme_fig)
                     else:
                         st.info("Not enough theme data for correlation analysis.")
                 except Exception as e:
@@ -399,7 +608,7 @@ elif page == "Analysis & Insights":
                 if 'symbols' in st.session_state.dream_history.columns:
                     st.subheader("Dream Symbol Insights")
                     try:
-                        symbol_insights = generate_symbol_insights(st.session_state.dream_history, st.session_state.personality)
+                        symbol_insights = cached_symbol_insights(version, personality)
                         st.write(symbol_insights)
                     except Exception as e:
                         st.error(f"Error generating symbol insights: {str(e)}")
@@ -411,7 +620,7 @@ elif page == "Analysis & Insights":
             if len(st.session_state.dream_history) >= 3:
                 st.subheader("Dream Analysis Dashboard")
                 try:
-                    dashboard = create_dream_dashboard(st.session_state.dream_history)
+                    dashboard = dashboard_figure(version)
                     if dashboard:
                         st.plotly_chart(dashboard, use_container_width=True)
                     else:
@@ -426,47 +635,9 @@ elif page == "Analysis & Insights":
             st.subheader("Theme Evolution Over Time")
             
             try:
-                # Extract all unique themes
-                all_themes = set()
-                for themes_str in st.session_state.dream_history["themes"]:
-                    if isinstance(themes_str, str):
-                        all_themes.update([t.strip() for t in themes_str.split(",")])
-                
-                if all_themes:
-                    # Get top 5 themes
-                    theme_counts = {}
-                    for theme in all_themes:
-                        count = sum(1 for themes_str in st.session_state.dream_history["themes"] 
-                                  if isinstance(themes_str, str) and theme in themes_str)
-                        theme_counts[theme] = count
-                    
-                    top_themes = sorted(theme_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-                    top_theme_names = [t[0] for t in top_themes]
-                    
-                    # Create dataframe for theme evolution
-                    theme_evolution = pd.DataFrame()
-                    theme_evolution["date"] = st.session_state.dream_history["date"]
-                    
-                    for theme in top_theme_names:
-                        theme_evolution[theme] = st.session_state.dream_history["themes"].apply(
-                            lambda x: 1 if isinstance(x, str) and theme in x else 0
-                        )
-                    
-                    # Plot theme evolution
-                    theme_evolution["date"] = pd.to_datetime(theme_evolution["date"])
-                    theme_evolution = theme_evolution.sort_values("date")
-                    
-                    fig, ax = plt.subplots(figsize=(12, 6))
-                    for theme in top_theme_names:
-                        plt.plot(theme_evolution["date"], 
-                                theme_evolution[theme].rolling(window=min(3, len(theme_evolution)), min_periods=1).mean(), 
-                                marker='o', label=theme)
-                    
-                    plt.title("Theme Frequency Over Time (3-dream rolling average)")
-                    plt.xlabel("Date")
-                    plt.ylabel("Frequency")
-                    plt.legend()
-                    st.pyplot(fig)
+                evolution_fig = theme_evolution_figure(version)
+                if evolution_fig:
+                    st.image(evolution_fig)
                 else:
                     st.info("No theme data available for visualization.")
             except Exception as e:
@@ -505,17 +676,40 @@ elif page == "Settings":
         if isinstance(st.session_state.dream_history, pd.DataFrame) and len(st.session_state.dream_history) > 0:
             confirm = st.checkbox("Are you sure? This action cannot be undone.")
             if confirm:
-                st.session_state.dream_history = pd.DataFrame(
-                    columns=["date", "dream", "themes", "sentiment", "category", "emotions", "symbols"]
-                )
                 try:
-                    save_dream_history()
+                    clear_dream_history()
+                    get_symbol_index(store).reset()
                     st.success("Dream history cleared successfully!")
                 except Exception as e:
                     st.error(f"Error clearing dream history: {str(e)}")
         else:
             st.info("No dream history to clear.")
 
+    st.subheader("Diagnostics")
+    metrics = get_metrics()
+    st.write("Time spent in each analysis stage by this app process. "
+             "Results served from Streamlit's caches are not re-timed.")
+    stage_rows = metrics.summary_rows()
+    if stage_rows:
+        st.dataframe(pd.DataFrame(stage_rows).round(2), hide_index=True)
+    else:
+        st.info("No stages have been timed yet.")
+    counters = metrics.to_dict()['counters']
+    if counters:
+        st.dataframe(pd.DataFrame(list(counters.items()), columns=["event", "count"]), hide_index=True)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("Download metrics (Prometheus)", metrics.to_prometheus(),
+                           file_name="dream_metrics.prom", mime="text/plain")
+    with col2:
+        st.download_button("Download metrics (JSON)", metrics.to_json(),
+                           file_name="dream_metrics.json", mime="application/json")
+    with col3:
+        if st.button("Reset metrics"):
+            metrics.reset()
+            st.rerun()
+    
     st.subheader("About")
     st.write("""
     **Future Dream Influence Predictor**
@@ -532,8 +726,8 @@ elif page == "Settings":
     st.subheader("API Configuration")
     api_placeholder = "Your API key is configured in gpt_predictor.py"
     if GOOGLE_API_KEY == "YOUR_API_KEY_HERE":
-        api_status = "Not configured - Prediction features disabled"
-        st.warning("API key not configured. Prediction features are disabled.")
+        api_status = "Not configured - Using offline predictions"
+        st.warning("API key not configured. Predictions come from the offline predictor.")
     else:
         masked_key = "•" * 8 + GOOGLE_API_KEY[-4:] if len(GOOGLE_API_KEY) > 4 else "•" * 4
         api_status = f"Configured {masked_key}"
@@ -541,4 +735,8 @@ elif page == "Settings":
     st.text_input("Google AI API Key Status", value=api_status, disabled=True, 
                 help="To set your API key, edit the GOOGLE_API_KEY variable in gpt_predictor.py")
     
+    st.session_state.use_response_cache = st.checkbox(
+        "Reuse cached AI responses", value=st.session_state.use_response_cache,
+        help="Identical predictions and pattern analyses are answered from a local cache. Uncheck to always ask Gemini for a fresh response.")
+    
     st.info("To use the generative AI features, you need to set your Google Gemini API key in the gpt_predictor.py file. Get an API key from https://makersuite.google.com/app/apikey")
\ No newline at end of file
@@ -0,0 +1,134 @@
+import csv
+import json
+import itertools
+from collections import deque
+
+import pandas as pd
+
+from nlp_utils import iter_analyze_dreams
+from dream_symbols import interpret_symbols
+from emotion_detection import get_emotion_recommendations
+from gpt_predictor import predict_many
+
+# Fields that may hold the dream text in an input record
+TEXT_FIELDS = ("dream", "text")
+
+def detect_format(path, fmt=None):
+    """Return fmt, or the input format implied by path (.csv or JSONL)."""
+    if fmt:
+        return fmt
+    return "csv" if path and path != "-" and path.lower().endswith(".csv") else "jsonl"
+
+def read_dream_records(stream, fmt="jsonl"):
+    """Yield input records lazily from a JSONL or CSV stream.
+
+    JSONL lines are objects with a "dream" (or "text") field, or bare JSON
+    strings; CSV files need a "dream" or "text" column. Other fields, such
+    as "id" and "date", are passed through. Each record gets a 1-based
+    "line" number; lines that can't be parsed yield a record with "error".
+    """
+    if fmt == "csv":
+        for line, row in enumerate(csv.DictReader(stream), start=1):
+            yield dict(row, line=line)
+        return
+
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            yield {'line': line, 'error': f"invalid JSON: {e}"}
+            continue
+        if isinstance(record, str):
+            record = {'dream': record}
+        if not isinstance(record, dict):
+            yield {'line': line, 'error': "expected a JSON object or string"}
+            continue
+        record['line'] = line
+        yield record
+
+def _dream_text(record):
+    for field in TEXT_FIELDS:
+        value = record.get(field)
+        if isinstance(value, str) and value.strip():
+            return value
+    return None
+
+def build_result(record, analysis, personality):
+    """Combine an input record and its analysis dict into the JSON result for it."""
+    emotions = analysis['emotions']
+    symbol_analysis = interpret_symbols(analysis['symbols'], personality)
+    return {
+        'id': record.get('id', record.get('line')),
+        'date': record.get('date'),
+        'keywords': analysis['keywords'],
+        'themes': analysis['themes'],
+        'sentiment': analysis['sentiment'].get('compound', 0),
+        'sentiment_scores': analysis['sentiment'],
+        'emotions': emotions['emotion_scores'],
+        'primary_emotions': emotions['primary_emotions'],
+        'symbols': symbol_analysis['symbols_found'],
+        'symbol_interpretation': symbol_analysis['interpretation'],
+        'recommendations': get_emotion_recommendations(emotions['emotion_scores'], personality),
+        'symbol_recommendations': symbol_analysis['recommendations']
+    }
+
+def add_predictions(results, personality):
+    """Add a 'prediction' to each result, requesting them all together."""
+    requests = [{'dream_themes': result['themes'], 'sentiment': result['sentiment'], 'personality': personality,
+                 'emotions': result['emotions'], 'symbols': result['symbols']} for result in results]
+    for result, prediction in zip(results, predict_many(requests)):
+        result['prediction'] = prediction
+
+def analyze_records(records, personality, n_process=None, batch_size=64, predict=False):
+    """Analyze input records and yield (record, result) pairs in input order.
+
+    Records are consumed lazily and only the chunks in flight in the worker
+    pool are held in memory. Records without dream text, or that failed to
+    parse, yield a result with an "error" field. With predict, predictions
+    for each chunk of batch_size results are requested together.
+    """
+    pending = deque()
+
+    def texts():
+        for record in records:
+            text = _dream_text(record) if 'error' not in record else None
+            if text is None:
+                record.setdefault('error', "missing dream text")
+            pending.append((record, text))
+            # Invalid records are analyzed as empty text to keep results aligned
+            yield text or ""
+
+    def results():
+        for analysis in iter_analyze_dreams(texts(), n_process=n_process, batch_size=batch_size):
+            record, text = pending.popleft()
+            if text is None:
+                yield record, {'id': record.get('id', record['line']), 'error': record['error']}
+            else:
+                yield record, build_result(record, analysis, personality)
+
+    stream = results()
+    if not predict:
+        yield from stream
+        return
+
+    while True:
+        chunk = list(itertools.islice(stream, batch_size))
+        if not chunk:
+            return
+        add_predictions([result for _, result in chunk if 'error' not in result], personality)
+        yield from chunk
+
+def history_entry(record, result, default_date):
+    """Build the dream log entry for an analyzed record, in the typed schema."""
+    date = pd.to_datetime(record.get('date'), errors="coerce") if record.get('date') else pd.NaT
+    return {
+        'date': default_date if pd.isna(date) else date,
+        'dream': _dream_text(record),
+        'themes': list(result['keywords']),
+        'sentiment': result['sentiment'],
+        'category': record.get('category') or None,
+        'emotions': result['primary_emotions'] or ["neutral"],
+        'symbols': list(result['symbols'])
+    }
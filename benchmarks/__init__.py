@@ -0,0 +1,8 @@
+"""Micro-benchmarks for the dream analysis and visualization functions.
+
+Run from the repository root:
+
+    python -m benchmarks run --output benchmarks/baselines/main.json
+    python -m benchmarks run --baseline benchmarks/baselines/main.json
+    python -m benchmarks compare benchmarks/baselines/main.json current.json
+"""
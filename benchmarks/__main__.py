@@ -0,0 +1,77 @@
+import sys
+import argparse
+
+from benchmarks.suite import (BENCHMARKS, DEFAULT_SIZES, DEFAULT_REPEAT, THRESHOLD, MIN_DELTA, run_suite,
+                              save_report, load_report, compare_reports, format_report, format_comparison)
+from benchmarks.corpus import DreamCorpus
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Dream analysis micro-benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("names", nargs="*", help="Benchmarks to run (default: all)")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Corpus sizes")
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="Save the results as a JSON baseline")
+    run_parser.add_argument("--baseline", help="Compare the results with this baseline")
+    run_parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                            help="Relative slowdown reported as a regression")
+
+    compare_parser = commands.add_parser("compare", help="Compare two saved results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                                help="Relative slowdown reported as a regression")
+    compare_parser.add_argument("--min-delta", type=float, default=MIN_DELTA,
+                                help="Smallest slowdown in seconds reported as a regression")
+
+    commands.add_parser("list", help="List the benchmarks")
+
+    corpus_parser = commands.add_parser("corpus", help="Write a synthetic dream history as CSV")
+    corpus_parser.add_argument("size", type=int)
+    corpus_parser.add_argument("output")
+    corpus_parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        print("\n".join(BENCHMARKS))
+        return 0
+
+    if args.command == "corpus":
+        DreamCorpus(args.seed).history(args.size).to_csv(args.output, index=False)
+        print(f"Wrote {args.size} synthetic dreams to {args.output}")
+        return 0
+
+    if args.command == "compare":
+        rows = compare_reports(load_report(args.baseline), load_report(args.current), args.threshold, args.min_delta)
+        print(format_comparison(rows))
+        return 1 if any(row['status'] == "regression" for row in rows) else 0
+
+    def progress(name, size, timing):
+        print(f"  {name} @ {size}: {timing['median'] * 1000:.2f} ms", file=sys.stderr)
+
+    try:
+        report = run_suite(args.names, args.sizes, args.repeat, args.seed, progress=progress)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+
+    print(format_report(report))
+    if args.output:
+        save_report(report, args.output)
+        print(f"\nSaved results to {args.output}")
+    if args.baseline:
+        rows = compare_reports(load_report(args.baseline), report, args.threshold)
+        if args.names:
+            # Only a subset was run; the rest of the baseline isn't missing
+            rows = [row for row in rows if row['status'] != "missing"]
+        print()
+        print(format_comparison(rows))
+        return 1 if any(row['status'] == "regression" for row in rows) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import random
+import pandas as pd
+
+from dream_symbols import DREAM_SYMBOLS
+from emotion_detection import EMOTION_LEXICON, INTENSITY_MODIFIERS
+from nlp_utils import DREAM_THEMES
+from schema import to_typed
+
+# Same categories as the app's categorize_dream
+CATEGORIES = ["adventure", "relationship", "fear", "success", "loss", "other"]
+
+OPENINGS = [
+    "Last night I dreamt that",
+    "In my dream",
+    "I was dreaming that",
+    "It started in a strange place where",
+    "I remember a dream where",
+]
+
+SUBJECTS = ["I", "my friend", "a stranger", "my family", "someone I used to know", "we"]
+
+PLACES = ["in an old city", "near the sea", "at my childhood home", "in a dark forest",
+          "on a crowded train", "in an empty school", "on top of a hill"]
+
+FILLERS = ["and then", "suddenly", "for a long time", "without knowing why", "while everything shifted"]
+
+class DreamCorpus:
+    """Deterministic generator of synthetic dreams and dream histories.
+
+    Dreams are assembled from DREAM_SYMBOLS, the emotion lexicon with its
+    intensity modifiers, and the DREAM_THEMES keywords, so every analysis
+    step has something to find. The same seed always gives the same corpus.
+    """
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.symbols = sorted(DREAM_SYMBOLS)
+        self.emotion_words = sorted(word for word in EMOTION_LEXICON if " " not in word)
+        self.modifiers = sorted(INTENSITY_MODIFIERS)
+        self.themes = sorted(DREAM_THEMES)
+
+    def _sentence(self, rng):
+        symbol = rng.choice(self.symbols)
+        theme_word = rng.choice(DREAM_THEMES[rng.choice(self.themes)])
+        emotion = rng.choice(self.emotion_words)
+        if rng.random() < 0.4:
+            emotion = f"{rng.choice(self.modifiers)} {emotion}"
+        subject = rng.choice(SUBJECTS)
+        return (f"{subject[0].upper()}{subject[1:]} saw the {symbol} {rng.choice(PLACES)}, "
+                f"{rng.choice(FILLERS)} felt {emotion} and kept thinking about {theme_word}.")
+
+    def dream(self, rng, sentences=None):
+        sentences = sentences or rng.randint(2, 6)
+        return " ".join([rng.choice(OPENINGS)] + [self._sentence(rng) for _ in range(sentences)])
+
+    def dreams(self, n):
+        """Return n dream texts."""
+        rng = random.Random(self.seed)
+        return [self.dream(rng) for _ in range(n)]
+
+    def history(self, n, start="2023-01-01"):
+        """Return an n-dream history in the legacy string layout the stores persist.
+
+        Themes, emotions and symbols are drawn directly rather than derived
+        from the text, so building a large history is cheap.
+        """
+        rng = random.Random(self.seed)
+        emotions = sorted(set(EMOTION_LEXICON.values()))
+        start = pd.Timestamp(start)
+        rows = []
+        for i in range(n):
+            rows.append({
+                'date': (start + pd.Timedelta(hours=rng.randint(0, 36) + 24 * i // 2)).strftime("%Y-%m-%d"),
+                'dream': self.dream(rng),
+                'themes': ", ".join(rng.sample(self.themes, rng.randint(1, 3))),
+                'sentiment': round(rng.uniform(-1, 1), 4),
+                'category': rng.choice(CATEGORIES),
+                'emotions': ", ".join(rng.sample(emotions, rng.randint(1, 3))) if rng.random() < 0.9 else "neutral",
+                'symbols': ", ".join(rng.sample(self.symbols, rng.randint(0, 3)))
+            })
+        return pd.DataFrame(rows, columns=["date", "dream", "themes", "sentiment", "category", "emotions", "symbols"])
+
+    def typed_history(self, n, start="2023-01-01"):
+        """Return an n-dream history in the typed schema, as the app loads it."""
+        return to_typed(self.history(n, start))
@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import statistics
+from collections import Counter
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+import nlp_utils
+from nlp_utils import extract_keywords, analyze_sentiment, extract_dream_themes, analyze_dreams_batch
+from emotion_detection import detect_emotions, analyze_emotion_patterns
+from dream_symbols import identify_symbols, get_symbol_frequencies, SymbolIndex
+from result_cache import ResultCache
+from schema import as_list
+from history_stream import summarize_history
+from search_index import SearchIndex
+from similarity import SimilarityIndex
+import visualization
+from benchmarks.corpus import DreamCorpus
+
+DEFAULT_SIZES = [10, 100, 1000]
+DEFAULT_REPEAT = 3
+
+# A benchmark is slower than its baseline when its median grew by more than
+# THRESHOLD and by at least MIN_DELTA seconds, so tiny timings don't flap
+THRESHOLD = 0.25
+MIN_DELTA = 0.001
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Register a benchmark.
+
+    The decorated function takes (corpus, size), does any untimed setup and
+    returns the zero-argument callable that is timed. It is called again
+    before every repeat, so each timing starts from the same state.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def _cold_analysis():
+    # A fresh in-memory cache, so dreams are analyzed instead of looked up
+    # and the user's on-disk analysis cache is left alone
+    nlp_utils._analysis_cache = ResultCache()
+
+def _per_dream(function):
+    def setup(corpus, size):
+        _cold_analysis()
+        dreams = corpus.dreams(size)
+        return lambda: [function(dream) for dream in dreams]
+    return setup
+
+benchmark("extract_keywords")(_per_dream(extract_keywords))
+benchmark("analyze_sentiment")(_per_dream(analyze_sentiment))
+benchmark("extract_dream_themes")(_per_dream(extract_dream_themes))
+benchmark("detect_emotions")(_per_dream(detect_emotions))
+benchmark("identify_symbols")(_per_dream(identify_symbols))
+
+@benchmark("analyze_dreams_batch")
+def _analyze_dreams_batch(corpus, size):
+    dreams = corpus.dreams(size)
+    return lambda: analyze_dreams_batch(dreams, n_process=1)
+
+@benchmark("get_symbol_frequencies")
+def _symbol_frequencies(corpus, size):
+    history = corpus.typed_history(size)
+    # Indexing the whole history from scratch, as on first start
+    path = os.path.join(_scratch_dir(), "symbol_index.jsonl")
+    if os.path.exists(path):
+        os.remove(path)
+    index = SymbolIndex(path)
+    return lambda: get_symbol_frequencies(history, index=index)
+
+@benchmark("search")
+def _search(corpus, size):
+    history = corpus.typed_history(size)
+    path = os.path.join(_scratch_dir(), "search_index.jsonl")
+    if os.path.exists(path):
+        os.remove(path)
+    index = SearchIndex(path)
+    index.sync_history(history)
+    queries = ["forest", "water falling", '"dark forest"', "felt afraid of the house"]
+    return lambda: [index.search(query) for query in queries]
+
+@benchmark("similar_dreams")
+def _similar_dreams(corpus, size):
+    history = corpus.typed_history(size)
+    index = SimilarityIndex(history)
+    # Past dreams as queries, each excluded from its own results
+    queries = [(position, index.matrix[position].copy()) for position in range(min(size, 20))]
+    return lambda: [index.search(vector, 3, exclude=[position]) for position, vector in queries]
+
+@benchmark("analyze_emotion_patterns")
+def _emotion_patterns(corpus, size):
+    history = corpus.typed_history(size)
+    return lambda: analyze_emotion_patterns(history)
+
+@benchmark("summarize_history")
+def _summarize_history(corpus, size):
+    history = corpus.history(size)
+    # Several chunks even at the small sizes, to include the merges
+    return lambda: summarize_history(history, chunksize=max(1, size // 4), n_process=1)
+
+def _history_plot(builder):
+    def setup(corpus, size):
+        history = corpus.typed_history(size)
+        return lambda: builder(history)
+    return setup
+
+benchmark("plot_sentiment_over_time")(_history_plot(visualization.plot_sentiment_over_time))
+benchmark("plot_emotion_distribution")(_history_plot(visualization.plot_emotion_distribution))
+benchmark("plot_theme_correlation")(_history_plot(visualization.plot_theme_correlation))
+benchmark("plot_interactive_sentiment_timeline")(_history_plot(visualization.plot_interactive_sentiment_timeline))
+benchmark("create_dream_dashboard")(_history_plot(visualization.create_dream_dashboard))
+
+@benchmark("generate_wordcloud")
+def _wordcloud(corpus, size):
+    themes = [theme for value in corpus.typed_history(size)['themes'] for theme in as_list(value)]
+    return lambda: visualization.generate_wordcloud(themes)
+
+@benchmark("plot_dream_symbol_network")
+def _symbol_network(corpus, size):
+    counts = Counter(symbol for value in corpus.typed_history(size)['symbols'] for symbol in as_list(value))
+    return lambda: visualization.plot_dream_symbol_network(dict(counts))
+
+_scratch = None
+
+def _scratch_dir():
+    global _scratch
+    if _scratch is None:
+        _scratch = tempfile.mkdtemp(prefix="dream-bench-")
+    return _scratch
+
+def time_benchmark(name, corpus, size, repeat=DEFAULT_REPEAT):
+    """Time one benchmark at one corpus size; returns min/median/mean seconds.
+
+    An untimed warm-up run comes first, so models and lookup tables loaded
+    on first use don't count against the first repeat.
+    """
+    BENCHMARKS[name](corpus, size)()
+    plt.close("all")
+    timings = []
+    for _ in range(repeat):
+        run = BENCHMARKS[name](corpus, size)
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+        plt.close("all")
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'repeat': repeat
+    }
+
+def run_suite(names=None, sizes=None, repeat=DEFAULT_REPEAT, seed=0, progress=None):
+    """Run the selected benchmarks at every size and return a JSON-ready report."""
+    names = list(names or BENCHMARKS)
+    sizes = list(sizes or DEFAULT_SIZES)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    corpus = DreamCorpus(seed)
+    results = {}
+    try:
+        for name in names:
+            results[name] = {}
+            for size in sizes:
+                results[name][str(size)] = time_benchmark(name, corpus, size, repeat)
+                if progress:
+                    progress(name, size, results[name][str(size)])
+    finally:
+        global _scratch
+        if _scratch is not None:
+            shutil.rmtree(_scratch, ignore_errors=True)
+            _scratch = None
+
+    return {
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'seed': seed,
+        'sizes': sizes,
+        'repeat': repeat,
+        'results': results
+    }
+
+def save_report(report, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+def load_report(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def compare_reports(baseline, current, threshold=THRESHOLD, min_delta=MIN_DELTA):
+    """Compare median timings of two reports.
+
+    Returns one dict per benchmark and size with both medians, their ratio
+    and a status: "regression", "improvement", "ok", "new" or "missing".
+    """
+    rows = []
+    names = list(current['results']) + [name for name in baseline['results'] if name not in current['results']]
+    for name in names:
+        old_sizes = baseline['results'].get(name, {})
+        new_sizes = current['results'].get(name, {})
+        for size in list(new_sizes) + [size for size in old_sizes if size not in new_sizes]:
+            old = old_sizes.get(size, {}).get('median')
+            new = new_sizes.get(size, {}).get('median')
+            if old is None or new is None:
+                rows.append({'name': name, 'size': int(size), 'baseline': old, 'current': new, 'ratio': None,
+                             'status': "new" if old is None else "missing"})
+                continue
+            ratio = new / old if old else float("inf")
+            if ratio > 1 + threshold and new - old >= min_delta:
+                status = "regression"
+            elif ratio < 1 / (1 + threshold) and old - new >= min_delta:
+                status = "improvement"
+            else:
+                status = "ok"
+            rows.append({'name': name, 'size': int(size), 'baseline': old, 'current': new, 'ratio': ratio,
+                         'status': status})
+    return rows
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.2f}"
+
+def format_report(report):
+    lines = [f"{'benchmark':<38}{'size':>7}{'median ms':>12}{'min ms':>12}"]
+    for name, sizes in report['results'].items():
+        for size, timing in sizes.items():
+            lines.append(f"{name:<38}{size:>7}{_ms(timing['median']):>12}{_ms(timing['min']):>12}")
+    return "\n".join(lines)
+
+def format_comparison(rows):
+    lines = [f"{'benchmark':<38}{'size':>7}{'baseline ms':>13}{'current ms':>12}{'ratio':>8}  status"]
+    for row in rows:
+        ratio = "-" if row['ratio'] is None else f"{row['ratio']:.2f}x"
+        lines.append(f"{row['name']:<38}{row['size']:>7}{_ms(row['baseline']):>13}{_ms(row['current']):>12}"
+                     f"{ratio:>8}  {row['status']}")
+    regressions = sum(row['status'] == "regression" for row in rows)
+    lines.append(f"\n{regressions} regression(s) in {len(rows)} comparison(s)")
+    return "\n".join(lines)
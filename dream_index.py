@@ -0,0 +1,165 @@
+import os
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+def text_hashes(dream_texts):
+    """Return a uint64 hash per dream text, non-text values hashing like ""."""
+    texts = pd.Series([text if isinstance(text, str) else "" for text in dream_texts], dtype=object)
+    return pd.util.hash_pandas_object(texts, index=False).to_numpy()
+
+class DreamTextIndex:
+    """Per-dream rows derived from the dream texts, persisted as an append-only JSON lines file.
+
+    The file is a header, {HEADER_KEY: signature}, then one line per dream
+    in history order, {'hash': text hash, ROW_KEY: row}. The signature
+    identifies how rows are derived, e.g. the symbol dictionary in use; a
+    change rebuilds the index. Rows are matched to the history by the
+    hashes of the dream texts, so dreams appended since are indexed alone.
+
+    Subclasses set NAME, HEADER_KEY and ROW_KEY, define current_signature()
+    and index_text(), and may extend _clear and _add_row with state derived
+    from the rows. With path None the index is kept in memory only.
+    """
+
+    NAME = "index"
+    HEADER_KEY = "signature"
+    ROW_KEY = "row"
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._load()
+
+    def current_signature(self):
+        raise NotImplementedError
+
+    def index_text(self, dream_text):
+        """Return the row stored for one dream text."""
+        raise NotImplementedError
+
+    def _mtime(self):
+        if self.path is None:
+            return None
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        self._clear()
+        if self.path is None:
+            self._dirty = False
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                rows = [json.loads(line) for line in f if line.strip()]
+                rows = [(row['hash'], row[self.ROW_KEY]) for row in rows]
+        except FileNotFoundError:
+            self._dirty = False
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Error loading {self.NAME}, rebuilding it: {e}")
+            return
+
+        if header.get(self.HEADER_KEY) != self.signature:
+            return
+
+        for row in rows:
+            self._add_row(*row)
+        self._dirty = False
+        self._loaded_mtime = self._mtime()
+
+    def _clear(self):
+        self.signature = self.current_signature()
+        self.hashes = []
+        self.rows = []
+        # The file no longer matches memory and must be rewritten in full
+        self._dirty = True
+        self._loaded_mtime = None
+
+    def _add_row(self, text_hash, row):
+        self.hashes.append(text_hash)
+        self.rows.append(row)
+
+    def _line(self, text_hash, row):
+        return json.dumps({'hash': text_hash, self.ROW_KEY: row}) + "\n"
+
+    def _write(self, new_rows):
+        if self.path is None:
+            self._dirty = False
+            return
+        try:
+            if self._dirty or not os.path.exists(self.path):
+                with open(self.path, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({self.HEADER_KEY: self.signature}) + "\n")
+                    for text_hash, row in zip(self.hashes, self.rows):
+                        f.write(self._line(text_hash, row))
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for text_hash, row in new_rows:
+                        f.write(self._line(text_hash, row))
+            self._dirty = False
+            self._loaded_mtime = self._mtime()
+        except OSError as e:
+            print(f"Error saving {self.NAME}: {e}")
+
+    def __len__(self):
+        return len(self.rows)
+
+    def is_stale(self):
+        """Whether rows would now be derived differently than when the index was built."""
+        return self.signature != self.current_signature()
+
+    def add_dreams(self, dream_texts):
+        """Index newly appended dreams, in history order."""
+        with self._lock:
+            if self.is_stale():
+                self.reset()
+
+            dream_texts = list(dream_texts)
+            new_rows = []
+            for text_hash, dream_text in zip(text_hashes(dream_texts), dream_texts):
+                new_rows.append((int(text_hash), self.index_text(dream_text)))
+                self._add_row(*new_rows[-1])
+
+            if new_rows:
+                self._write(new_rows)
+
+    def add_dream(self, dream_text):
+        """Index a single newly appended dream."""
+        self.add_dreams([dream_text])
+
+    def reset(self):
+        """Empty the index, e.g. when the dream history is cleared."""
+        with self._lock:
+            self._clear()
+            self._write([])
+
+    def sync_history(self, dream_history):
+        """Bring the index in line with dream_history.
+
+        Dreams appended since the last sync are indexed incrementally. If the
+        history no longer extends the indexed one, dream for dream, the index
+        is rebuilt. Hashing is vectorized, so only new dreams are scanned.
+        """
+        with self._lock:
+            # Another process may have appended to the index file since we read it
+            if not self._dirty and self._mtime() != self._loaded_mtime:
+                self._load()
+
+            dreams = dream_history['dream'] if 'dream' in dream_history.columns else pd.Series([], dtype=object)
+            hashes = text_hashes(dreams)
+            size = len(self.rows)
+
+            is_extension = (not self.is_stale() and size <= len(dreams)
+                            and np.array_equal(hashes[:size], np.array(self.hashes, dtype=np.uint64)))
+            if not is_extension:
+                self.reset()
+                size = 0
+
+            if size < len(dreams):
+                self.add_dreams(dreams.iloc[size:])
@@ -1,7 +1,13 @@
 import pandas as pd
 import numpy as np
 import re
+import json
+import heapq
+import hashlib
 from collections import Counter
+from metrics import timed
+from storage import DEFAULT_STORE_PATH, sidecar_path
+from dream_index import DreamTextIndex
 
 DREAM_SYMBOLS = {
     'water': {
@@ -136,41 +142,193 @@ DREAM_SYMBOLS = {
     }
 }
 
+# Words and single punctuation marks; symbols and dream text are split the same way
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Bumped whenever DREAM_SYMBOLS is changed through update_symbol_dictionary
+_dictionary_version = 0
+_matcher = None
+
+class SymbolMatcher:
+    """Token-level trie over a symbol dictionary.
+
+    Built once per dictionary version, it finds every symbol, including
+    multi-word ones, in a single pass over the tokens of a text.
+    """
+
+    def __init__(self, symbols, version=0):
+        self.version = version
+        self.size = len(symbols)
+        self.order = {}
+        self.root = {}
+        # Identifies the symbol names across processes, for persisted indexes
+        # of symbol counts
+        self.fingerprint = hashlib.sha1(
+            "\n".join(sorted(symbols)).encode("utf-8")).hexdigest()
+        # Identifies the whole dictionary, meanings, categories and
+        # associations included, for cached results that embed them
+        self.content_fingerprint = hashlib.sha1(
+            json.dumps(symbols, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        
+        for position, symbol in enumerate(symbols):
+            tokens = TOKEN_PATTERN.findall(symbol.lower())
+            if not tokens:
+                continue
+            node = self.root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            # None never occurs as a token, so it marks the end of a symbol
+            node[None] = symbol
+            self.order[symbol] = position
+
+    def count(self, text):
+        """Return {symbol: count} for every symbol found in text."""
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        counts = {}
+        last_end = {}
+        root = self.root
+        
+        for start in range(len(tokens)):
+            node = root.get(tokens[start])
+            end = start + 1
+            while node is not None:
+                symbol = node.get(None)
+                # Count non-overlapping occurrences of each symbol, like re.findall
+                if symbol is not None and start >= last_end.get(symbol, 0):
+                    counts[symbol] = counts.get(symbol, 0) + 1
+                    last_end[symbol] = end
+                if end >= len(tokens):
+                    break
+                node = node.get(tokens[end])
+                end += 1
+        
+        return dict(sorted(counts.items(), key=lambda x: self.order[x[0]]))
+
+def get_symbol_matcher():
+    """Return the compiled matcher for the current symbol dictionary."""
+    global _matcher
+    if (_matcher is None or _matcher.version != _dictionary_version
+            or _matcher.size != len(DREAM_SYMBOLS)):
+        _matcher = SymbolMatcher(DREAM_SYMBOLS, version=_dictionary_version)
+    return _matcher
+
+def update_symbol_dictionary(symbols, replace=False):
+    """Add symbols to (or replace) DREAM_SYMBOLS and invalidate the matcher."""
+    global _dictionary_version
+    if replace:
+        DREAM_SYMBOLS.clear()
+    DREAM_SYMBOLS.update(symbols)
+    _dictionary_version += 1
+
+def load_symbol_dictionary(path, replace=False):
+    """Load symbols from a JSON file shaped like DREAM_SYMBOLS."""
+    with open(path, encoding="utf-8") as f:
+        symbols = json.load(f)
+    update_symbol_dictionary(symbols, replace=replace)
+    return len(symbols)
+
+@timed("symbol_scan")
 def identify_symbols(dream_text):
-    text_lower = dream_text.lower()
     found_symbols = {}
-    for symbol, data in DREAM_SYMBOLS.items():
-        pattern = r'\b' + re.escape(symbol) + r'\b'
-        matches = re.findall(pattern, text_lower)
-        if matches:
-            found_symbols[symbol] = {
-                'count': len(matches),
-                'meaning': data['meaning'],
-                'category': data['category'],
-                'associations': data['associations']
-            }
+    for symbol, count in get_symbol_matcher().count(dream_text).items():
+        data = DREAM_SYMBOLS.get(symbol)
+        if data is None:
+            continue
+        found_symbols[symbol] = {
+            'count': count,
+            'meaning': data['meaning'],
+            'category': data['category'],
+            'associations': data['associations']
+        }
     return found_symbols
 
-def get_symbol_frequencies(dream_history):
+# Suffix of the persisted symbol index, kept next to the dream log it indexes
+SYMBOL_INDEX_SUFFIX = ".symbol_index.jsonl"
+
+_symbol_index = None
+
+def symbol_index_path(store_path):
+    """Where the symbol index of the dream log at store_path is kept."""
+    return sidecar_path(store_path, SYMBOL_INDEX_SUFFIX)
+
+class SymbolIndex(DreamTextIndex):
+    """Persisted per-dream symbol counts for the dream history.
+
+    A DreamTextIndex whose header carries the symbol dictionary
+    fingerprint and whose rows are the symbol counts of each dream.
+    History-wide totals are kept in memory, so frequencies and top symbols
+    never re-scan dream text. A dictionary change invalidates the index.
+
+    An index describes one dream log, read in full; see get_symbol_index.
+    """
+
+    NAME = "symbol index"
+    HEADER_KEY = "fingerprint"
+    ROW_KEY = "counts"
+
+    def current_signature(self):
+        return get_symbol_matcher().fingerprint
+
+    def index_text(self, dream_text):
+        return get_symbol_matcher().count(dream_text) if isinstance(dream_text, str) else {}
+
+    def _clear(self):
+        super()._clear()
+        self.totals = Counter()
+
+    def _add_row(self, text_hash, counts):
+        super()._add_row(text_hash, counts)
+        self.totals.update(counts)
+
+    @timed("symbol_index_sync")
+    def sync(self, dream_history):
+        """Bring the index in line with dream_history; see DreamTextIndex.sync_history."""
+        self.sync_history(dream_history)
+
+    def frequencies(self):
+        """Return {symbol: total count} over all indexed dreams."""
+        return {symbol: count for symbol, count in self.totals.items() if count > 0}
+
+    def top_symbols(self, k=5):
+        """Return the k most frequent (symbol, count) pairs."""
+        return heapq.nlargest(k, self.frequencies().items(), key=lambda x: x[1])
+
+def get_symbol_index(store=None):
+    """Return the process-wide symbol index of store, loading it on first use.
+
+    Without a store, the index of the default dream log (DREAM_STORE).
+    """
+    global _symbol_index
+    path = symbol_index_path(store.path if store is not None else DEFAULT_STORE_PATH)
+    if _symbol_index is None or _symbol_index.path != path:
+        _symbol_index = SymbolIndex(path)
+    return _symbol_index
+
+def get_symbol_frequencies(dream_history, index=None):
+    """Return {symbol: total count} over the dreams in dream_history.
+
+    Pass the store's index (get_symbol_index) only when dream_history is
+    the store's full history; other frames, e.g. filtered ones, are
+    counted in memory and leave the persisted index alone.
+    """
     if 'dream' not in dream_history.columns or len(dream_history) == 0:
         return {}
     
-    all_symbols = {}
+    if index is not None:
+        index.sync(dream_history)
+        return index.frequencies()
     
+    matcher = get_symbol_matcher()
+    totals = Counter()
     for dream_text in dream_history['dream']:
         if isinstance(dream_text, str):
-            symbols = identify_symbols(dream_text)
-            for symbol, data in symbols.items():
-                if symbol in all_symbols:
-                    all_symbols[symbol] += data['count']
-                else:
-                    all_symbols[symbol] = data['count']
-    
-    return all_symbols
+            totals.update(matcher.count(dream_text))
+    return {symbol: count for symbol, count in totals.items() if count > 0}
 
 def analyze_dream_symbols(dream_text, personality=None):
-    symbols = identify_symbols(dream_text)
-    
+    return interpret_symbols(identify_symbols(dream_text), personality)
+
+def interpret_symbols(symbols, personality=None):
     if not symbols:
         return {
             'symbols_found': [],
@@ -215,13 +373,16 @@ def analyze_dream_symbols(dream_text, personality=None):
         'recommendations': "\n".join(recommendations)
     }
 
-def generate_symbol_insights(dream_history, personality=None):
-    symbol_frequencies = get_symbol_frequencies(dream_history)
-    
+@timed("symbol_insights")
+def generate_symbol_insights(dream_history, personality=None, index=None):
+    return describe_symbol_insights(get_symbol_frequencies(dream_history, index=index))
+
+def describe_symbol_insights(symbol_frequencies):
+    """Describe the most frequent symbols in {symbol: count} and what their category suggests."""
     if not symbol_frequencies:
         return "No recurring symbols found in your dream history."
     
-    top_symbols = sorted(symbol_frequencies.items(), key=lambda x: x[1], reverse=True)[:5]
+    top_symbols = heapq.nlargest(5, symbol_frequencies.items(), key=lambda x: x[1])
     
     insights = ["Your most common dream symbols:"]
     for symbol, count in top_symbols:
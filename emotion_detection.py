@@ -1,58 +1,14 @@
-import nltk
-from nltk.tokenize import word_tokenize
 import pandas as pd
-import spacy
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+import numpy as np
 import sys
 import os
+import hashlib
+import threading
+from resources import get_lemmatizer, get_stop_words, get_word_tokenizer
+from schema import as_list
+from metrics import timed
 
-# Initialize NLTK resources
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    print("Downloading required NLTK resources...")
-    try:
-        nltk.download('punkt', quiet=True)
-        nltk.download('stopwords', quiet=True)
-        nltk.download('wordnet', quiet=True)
-    except Exception as e:
-        print(f"Error downloading NLTK resources: {e}")
-        print("Some functionality may be limited.")
-
-# Initialize spaCy
-try:
-    nlp = spacy.load("en_core_web_sm")
-except (ImportError, OSError) as e:
-    print(f"Error loading spaCy model: {e}")
-    print("Attempting to download spaCy model...")
-    try:
-        import os
-        os.system(f"{sys.executable} -m spacy download en_core_web_sm")
-        try:
-            nlp = spacy.load("en_core_web_sm")
-            print("Successfully loaded spaCy model.")
-        except Exception as e:
-            print(f"Failed to load spaCy model after download: {e}")
-            nlp = None
-    except Exception as e:
-        print(f"Failed to download spaCy model: {e}")
-        print("Some functionality will be limited.")
-        nlp = None
-
-# Initialize lemmatizer and stop words
-try:
-    lemmatizer = WordNetLemmatizer()
-    STOP_WORDS = set(stopwords.words('english'))
-    # Add dream-specific stop words
-    STOP_WORDS.update(['dream', 'dreams', 'dreamt', 'dreaming', 'saw', 'felt', 'went', 'came', 'seemed', 'appeared'])
-except Exception as e:
-    print(f"Error initializing NLP components: {e}")
-    print("Some functionality may be limited.")
-    lemmatizer = None
-    STOP_WORDS = set()
+# NLTK data is loaded by the resources module on first use
 
 # Emotion lexicon maps words to core emotions
 EMOTION_LEXICON = {
@@ -110,20 +66,206 @@ INTENSITY_MODIFIERS = {
     'profoundly': 1.9, 'mildly': 0.6, 'moderately': 0.8, 'highly': 1.6
 }
 
+_lexicon_fingerprint = None
+
+def lexicon_fingerprint():
+    """Return a hash identifying the current emotion lexicon and modifiers."""
+    global _lexicon_fingerprint
+    if _lexicon_fingerprint is None:
+        content = repr((sorted(EMOTION_LEXICON.items()), sorted(INTENSITY_MODIFIERS.items())))
+        _lexicon_fingerprint = hashlib.sha1(content.encode("utf-8")).hexdigest()
+    return _lexicon_fingerprint
+
+def update_emotion_lexicon(words=None, modifiers=None):
+    """Add words to EMOTION_LEXICON and/or INTENSITY_MODIFIERS."""
+    global _lexicon_fingerprint
+    EMOTION_LEXICON.update(words or {})
+    INTENSITY_MODIFIERS.update(modifiers or {})
+    _lexicon_fingerprint = None
+
 def preprocess_text(text):
     """Preprocess text by tokenizing, removing stopwords, and lemmatizing."""
-    if not isinstance(text, str) or not text.strip() or lemmatizer is None:
+    if not isinstance(text, str) or not text.strip():
+        return []
+    
+    lemmatizer = get_lemmatizer()
+    if lemmatizer is None:
         return []
     
     try:
-        tokens = word_tokenize(text.lower())
-        tokens = [token for token in tokens if token.isalpha() and token not in STOP_WORDS]
+        stop_words = get_stop_words()
+        tokens = get_word_tokenizer()(text.lower())
+        tokens = [token for token in tokens if token.isalpha() and token not in stop_words]
         lemmatized_tokens = [lemmatizer.lemmatize(token) for token in tokens]
         return lemmatized_tokens
     except Exception as e:
         print(f"Error preprocessing text: {e}")
         return []
 
+@timed("emotion_detection")
+def score_emotions(tokens):
+    """Score emotions from already preprocessed tokens."""
+    emotion_counts = {
+        'joy': 0, 'sadness': 0, 'fear': 0, 'anger': 0, 'surprise': 0,
+        'disgust': 0, 'love': 0, 'confusion': 0, 'peace': 0, 'anticipation': 0
+    }
+    
+    current_modifier = 1.0
+    
+    for token in tokens:
+        if token in INTENSITY_MODIFIERS:
+            current_modifier = INTENSITY_MODIFIERS[token]
+            continue
+            
+        if token in EMOTION_LEXICON:
+            emotion = EMOTION_LEXICON[token]
+            emotion_counts[emotion] += current_modifier
+            current_modifier = 1.0
+    
+    total_emotions = sum(emotion_counts.values())
+    if total_emotions > 0:
+        emotion_scores = {emotion: count/total_emotions for emotion, count in emotion_counts.items()}
+    else:
+        emotion_scores = emotion_counts
+    
+    primary_emotions = [emotion for emotion, score in sorted(
+        emotion_scores.items(), key=lambda x: x[1], reverse=True) 
+        if score > 0][:3]  # Get top 3 emotions
+    
+    emotions_str = ", ".join(primary_emotions) if primary_emotions else "neutral"
+    
+    return {
+        'emotion_scores': emotion_scores,
+        'primary_emotions': primary_emotions,
+        'emotions_str': emotions_str
+    }
+
+# Column order of the emotion score matrices
+EMOTIONS = ['joy', 'sadness', 'fear', 'anger', 'surprise', 'disgust', 'love', 'confusion', 'peace', 'anticipation']
+
+class EmotionVocabulary:
+    """Integer ids for lexicon words plus the lexicon compiled into per-id arrays.
+
+    Only emotion words and intensity modifiers get ids of their own; every
+    other token encodes as OTHER_ID, which scores nothing, so the vocabulary
+    stays as small as the lexicon however much text is encoded. Ids never
+    change, so encoded dreams stay valid when the lexicon is updated; only
+    the small per-id arrays are recompiled. emotion_ids[i] is the EMOTIONS
+    column of token i (-1 for none) and modifiers[i] its intensity (0 for none).
+    """
+
+    OTHER_ID = 0
+
+    def __init__(self):
+        self.ids = {}
+        # OTHER_ID stands for every token outside the lexicon
+        self.words = [None]
+        self.emotion_ids = np.empty(0, dtype=np.int8)
+        self.modifiers = np.empty(0, dtype=np.float64)
+        self.fingerprint = None
+        self._lock = threading.Lock()
+
+    def encode(self, tokens):
+        """Return the int32 id array for a token sequence, adding lexicon words as needed."""
+        ids = self.ids
+        encoded = np.empty(len(tokens), dtype=np.int32)
+        with self._lock:
+            for i, token in enumerate(tokens):
+                token_id = ids.get(token)
+                if token_id is None:
+                    if token not in EMOTION_LEXICON and token not in INTENSITY_MODIFIERS:
+                        token_id = self.OTHER_ID
+                    else:
+                        token_id = ids[token] = len(self.words)
+                        self.words.append(token)
+                encoded[i] = token_id
+        return encoded
+
+    def compile(self):
+        """Bring the per-id arrays up to date with the vocabulary and lexicon."""
+        fingerprint = lexicon_fingerprint()
+        with self._lock:
+            if fingerprint == self.fingerprint and len(self.emotion_ids) == len(self.words):
+                return
+            columns = {emotion: i for i, emotion in enumerate(EMOTIONS)}
+            start = 0 if fingerprint != self.fingerprint else len(self.emotion_ids)
+            words = self.words[start:]
+            # Modifiers take precedence over lexicon entries, as in score_emotions
+            modifiers = np.array([INTENSITY_MODIFIERS.get(w, 0.0) for w in words], dtype=np.float64)
+            emotion_ids = np.array([-1 if w in INTENSITY_MODIFIERS else columns.get(EMOTION_LEXICON.get(w), -1)
+                                    for w in words], dtype=np.int8)
+            self.emotion_ids = np.concatenate([self.emotion_ids[:start], emotion_ids])
+            self.modifiers = np.concatenate([self.modifiers[:start], modifiers])
+            self.fingerprint = fingerprint
+
+_vocabulary = EmotionVocabulary()
+
+def get_emotion_vocabulary():
+    return _vocabulary
+
+def encode_tokens(tokens):
+    """Encode preprocessed tokens as vocabulary ids for score_emotions_batch."""
+    return _vocabulary.encode(tokens)
+
+@timed("emotion_detection_batch")
+def score_emotions_batch(token_id_arrays, dtype=np.float32):
+    """Score many encoded dreams at once.
+
+    Returns an (n_dreams, len(EMOTIONS)) matrix of normalized scores matching
+    score_emotions; pass dtype=np.float64 to get its exact values. Only
+    emotion words and modifiers matter, so an emotion word takes the
+    intensity of the preceding such token in the same dream when that token
+    is a modifier, and 1.0 otherwise.
+    """
+    n = len(token_id_arrays)
+    if n == 0:
+        return np.zeros((0, len(EMOTIONS)), dtype=dtype)
+    
+    _vocabulary.compile()
+    lengths = np.fromiter((len(ids) for ids in token_id_arrays), dtype=np.int64, count=n)
+    ids = np.concatenate([np.asarray(ids, dtype=np.int32) for ids in token_id_arrays])
+    docs = np.repeat(np.arange(n), lengths)
+    
+    emotion_ids = _vocabulary.emotion_ids[ids]
+    modifiers = _vocabulary.modifiers[ids]
+    is_modifier = modifiers > 0
+    events = (emotion_ids >= 0) | is_modifier
+    docs, emotion_ids, modifiers, is_modifier = docs[events], emotion_ids[events], modifiers[events], is_modifier[events]
+    
+    weights = np.ones(len(docs))
+    applies = np.zeros(len(docs), dtype=bool)
+    applies[1:] = is_modifier[:-1] & (docs[1:] == docs[:-1])
+    weights[applies] = modifiers[np.flatnonzero(applies) - 1]
+    
+    scored = emotion_ids >= 0
+    counts = np.bincount(docs[scored] * len(EMOTIONS) + emotion_ids[scored], weights=weights[scored],
+                         minlength=n * len(EMOTIONS)).astype(np.float64).reshape(n, len(EMOTIONS))
+    # Summed column by column, in the same order as score_emotions, so scores match exactly
+    totals = np.zeros((n, 1))
+    for column in range(len(EMOTIONS)):
+        totals[:, 0] += counts[:, column]
+    np.divide(counts, totals, out=counts, where=totals > 0)
+    return counts.astype(dtype, copy=False)
+
+def emotion_results(scores):
+    """Convert rows of an emotion score matrix to score_emotions result dicts."""
+    results = []
+    for row in scores.tolist():
+        emotion_scores = dict(zip(EMOTIONS, row))
+        primary_emotions = [emotion for emotion, score in sorted(
+            emotion_scores.items(), key=lambda x: x[1], reverse=True) 
+            if score > 0][:3]
+        results.append({
+            'emotion_scores': emotion_scores,
+            'primary_emotions': primary_emotions,
+            'emotions_str': ", ".join(primary_emotions) if primary_emotions else "neutral"
+        })
+    return results
+
+def detect_emotions_batch(texts):
+    """Score many texts at once; returns an (n_texts, len(EMOTIONS)) float32 matrix."""
+    return score_emotions_batch([encode_tokens(preprocess_text(text)) for text in texts])
+
 def detect_emotions(text):
     """Detect emotions in text using the emotion lexicon."""
     # Default emotion results for error cases
@@ -140,46 +282,48 @@ def detect_emotions(text):
         return default_result
     
     try:
-        tokens = preprocess_text(text)
-        
-        emotion_counts = {
-            'joy': 0, 'sadness': 0, 'fear': 0, 'anger': 0, 'surprise': 0,
-            'disgust': 0, 'love': 0, 'confusion': 0, 'peace': 0, 'anticipation': 0
-        }
-        
-        current_modifier = 1.0
-        
-        for i, token in enumerate(tokens):
-            if token in INTENSITY_MODIFIERS:
-                current_modifier = INTENSITY_MODIFIERS[token]
-                continue
-                
-            if token in EMOTION_LEXICON:
-                emotion = EMOTION_LEXICON[token]
-                emotion_counts[emotion] += current_modifier
-                current_modifier = 1.0
-        
-        total_emotions = sum(emotion_counts.values())
-        if total_emotions > 0:
-            emotion_scores = {emotion: count/total_emotions for emotion, count in emotion_counts.items()}
-        else:
-            emotion_scores = emotion_counts
-        
-        primary_emotions = [emotion for emotion, score in sorted(
-            emotion_scores.items(), key=lambda x: x[1], reverse=True) 
-            if score > 0][:3]  # Get top 3 emotions
-        
-        emotions_str = ", ".join(primary_emotions) if primary_emotions else "neutral"
-        
-        return {
-            'emotion_scores': emotion_scores,
-            'primary_emotions': primary_emotions,
-            'emotions_str': emotions_str
-        }
+        return score_emotions(preprocess_text(text))
     except Exception as e:
         print(f"Error detecting emotions: {e}")
         return default_result
 
+# Number of latest dreams compared against the rest of the history
+RECENT_EMOTION_DREAMS = 3
+
+def count_emotions(emotion_cells):
+    """Count emotions over history cells, skipping dreams with only "neutral"."""
+    from collections import Counter
+    counts = Counter()
+    for emotions in emotion_cells:
+        emotions = as_list(emotions)
+        if emotions != ["neutral"]:
+            counts.update(emotions)
+    return counts
+
+def describe_emotion_patterns(emotion_counts, recent_counts, earlier_counts=None):
+    """Summarize emotion counts over the whole history, its latest dreams and,
+    for longer histories, the dreams before them."""
+    if not emotion_counts:
+        return "No specific emotions detected in your dream records."
+    
+    common_emotions = emotion_counts.most_common(3)
+    recent_common = recent_counts.most_common(2)
+    
+    analysis = f"Your most common dream emotions overall are: {', '.join([e[0] for e in common_emotions])}. "
+    
+    if recent_common:
+        analysis += f"Recently, you've been experiencing more {recent_common[0][0]} in your dreams."
+    
+    if earlier_counts and recent_counts:
+        earlier_most_common = earlier_counts.most_common(1)[0][0]
+        recent_most_common = recent_common[0][0]
+        
+        if earlier_most_common != recent_most_common:
+            analysis += f" There appears to be a shift in your emotional patterns from {earlier_most_common} to {recent_most_common}."
+    
+    return analysis
+
+@timed("emotion_patterns")
 def analyze_emotion_patterns(dream_history):
     """Analyze patterns in emotions across dream history."""
     if not isinstance(dream_history, pd.DataFrame) or len(dream_history) < 3:
@@ -189,51 +333,12 @@ def analyze_emotion_patterns(dream_history):
         return "No emotion data available in dream history."
     
     try:
-        all_emotions = []
-        for emotions_str in dream_history['emotions']:
-            if isinstance(emotions_str, str) and emotions_str != "neutral":
-                emotions = [e.strip() for e in emotions_str.split(',')]
-                all_emotions.extend(emotions)
-        
-        if not all_emotions:
-            return "No specific emotions detected in your dream records."
-        
-        from collections import Counter
-        emotion_counts = Counter(all_emotions)
-        common_emotions = emotion_counts.most_common(3)
-        
-        recent_emotions = []
-        for emotions_str in dream_history['emotions'].tail(3):
-            if isinstance(emotions_str, str) and emotions_str != "neutral":
-                recent_emotions.extend([e.strip() for e in emotions_str.split(',')])
-        
-        recent_emotion_counts = Counter(recent_emotions)
-        recent_common = recent_emotion_counts.most_common(2) if recent_emotions else []
-        
-        analysis = f"Your most common dream emotions overall are: {', '.join([e[0] for e in common_emotions])}. "
-        
-        if recent_common:
-            analysis += f"Recently, you've been experiencing more {recent_common[0][0]} in your dreams."
-        
+        emotions = dream_history['emotions']
+        earlier_counts = None
         if len(dream_history) >= 5:
-            earlier_emotions = []
-            for emotions_str in dream_history['emotions'].head(len(dream_history) - 3):
-                if isinstance(emotions_str, str) and emotions_str != "neutral":
-                    earlier_emotions.extend([e.strip() for e in emotions_str.split(',')])
-            
-            earlier_emotion_counts = Counter(earlier_emotions)
-            
-            if earlier_emotions and recent_emotions and earlier_emotion_counts and recent_emotion_counts:
-                try:
-                    earlier_most_common = earlier_emotion_counts.most_common(1)[0][0]
-                    recent_most_common = recent_emotion_counts.most_common(1)[0][0]
-                    
-                    if earlier_most_common != recent_most_common:
-                        analysis += f" There appears to be a shift in your emotional patterns from {earlier_most_common} to {recent_most_common}."
-                except IndexError:
-                    pass  # Not enough data for this analysis
-        
-        return analysis
+            earlier_counts = count_emotions(emotions.head(len(dream_history) - RECENT_EMOTION_DREAMS))
+        return describe_emotion_patterns(count_emotions(emotions),
+                                         count_emotions(emotions.tail(RECENT_EMOTION_DREAMS)), earlier_counts)
     except Exception as e:
         return f"Error analyzing emotion patterns: {str(e)}"
 
@@ -1,14 +1,39 @@
-import google.generativeai as genai
 import os
-from emotion_detection import detect_emotions
-from dream_symbols import analyze_dream_symbols, generate_symbol_insights
+import time
+import sqlite3
+from nlp_utils import analyze_dream
+from dream_symbols import generate_symbol_insights
+from result_cache import DiskCache, content_key, CACHE_DIR
+from llm_client import AsyncLLMClient, GeminiBackend
+from local_predictor import predict_locally, analyze_patterns_locally
+from metrics import timer, observe, increment
 
 # Hardcoded API key (replace with your actual API key)
 GOOGLE_API_KEY = "YOUR_API_KEY_HERE"
 
+MODEL_NAME = "gemini-pro"
+
+# Responses are cached on disk by model name and prompt
+RESPONSE_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+RESPONSE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Client limits for calls to the generation backend
+LLM_TIMEOUT = 30.0  # seconds per attempt
+LLM_MAX_CONCURRENCY = 4
+LLM_RATE = 1.0  # calls started per second
+LLM_RETRIES = 2
+LLM_DEADLINE = 45.0  # seconds for a whole call, retries included
+
+# "auto" asks the remote model and falls back to the offline predictor when it
+# is unavailable, fails or times out; "local" never leaves the machine and
+# "remote" reports errors instead of falling back
+PREDICTION_BACKEND = os.environ.get("DREAM_PREDICTOR", "auto")
+
 # Initialize the model
 model_initialized = False
 MODEL = None
+_response_cache = None
+_llm_client = None
 
 def initialize_model():
     global model_initialized, MODEL
@@ -17,26 +42,87 @@ def initialize_model():
         return False
     
     try:
+        # Imported here so that importing this module stays cheap
+        import google.generativeai as genai
         genai.configure(api_key=GOOGLE_API_KEY)
-        MODEL = genai.GenerativeModel("gemini-pro")
+        MODEL = genai.GenerativeModel(MODEL_NAME)
         model_initialized = True
         return True
     except Exception as e:
         print(f"Failed to initialize GenAI model: {e}")
         return False
 
-def predict_future_impact(dream_themes, sentiment, personality, dream_text=None, emotions=None, symbols=None):
-    if not model_initialized and not initialize_model():
-        return "Prediction unavailable. Please set the API key in gpt_predictor.py"
+def set_llm_backend(backend, **client_options):
+    """Route generation through backend, e.g. a StubBackend for offline testing."""
+    global _llm_client
+    options = {'max_concurrency': LLM_MAX_CONCURRENCY, 'rate': LLM_RATE,
+               'timeout': LLM_TIMEOUT, 'retries': LLM_RETRIES}
+    options.update(client_options)
+    _llm_client = AsyncLLMClient(backend, **options) if backend is not None else None
+
+def get_llm_client():
+    """Return the client for the configured backend, defaulting to Gemini."""
+    if _llm_client is None:
+        if not model_initialized and not initialize_model():
+            return None
+        set_llm_backend(GeminiBackend(MODEL, name=MODEL_NAME))
+    return _llm_client
+
+def _backend_name():
+    return _llm_client.backend.name if _llm_client is not None else MODEL_NAME
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        try:
+            _response_cache = DiskCache(os.path.join(CACHE_DIR, "responses.sqlite"),
+                                        ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error opening response cache: {e}")
+            return None
+    return _response_cache
+
+def _cached_response(prompt):
+    cache = get_response_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(content_key(_backend_name(), prompt))
+    except sqlite3.Error as e:
+        print(f"Error reading response cache: {e}")
+        return None
+
+def _store_response(prompt, text):
+    cache = get_response_cache()
+    if cache is None:
+        return
+    try:
+        cache.put(content_key(_backend_name(), prompt), text)
+    except sqlite3.Error as e:
+        print(f"Error writing response cache: {e}")
+
+def _generate(prompt, use_cache=True):
+    """Return the backend's response to prompt, or None if no backend is configured."""
+    if PREDICTION_BACKEND == "local":
+        return None
     
-    if dream_text and not emotions:
-        emotion_data = detect_emotions(dream_text)
-        emotions = emotion_data['emotion_scores']
+    if use_cache:
+        cached = _cached_response(prompt)
+        if cached is not None:
+            increment("llm_cache_hits")
+            return cached
     
-    if dream_text and not symbols:
-        symbol_data = analyze_dream_symbols(dream_text, personality)
-        symbols = symbol_data['symbols_found']
-        
+    client = get_llm_client()
+    if client is None:
+        return None
+    
+    increment("llm_calls")
+    with timer("llm_generate"):
+        text = client.generate_sync(prompt, deadline=LLM_DEADLINE)
+    _store_response(prompt, text)
+    return text
+
+def build_prediction_prompt(dream_themes, sentiment, personality, emotions=None, symbols=None, similar_dreams=None):
     prompt_content = f"""
 You are an expert dream analyst with deep knowledge of psychology, symbolism, and predictive analysis.
 
@@ -61,6 +147,14 @@ The user's personality profile:
     if symbols and len(symbols) > 0:
         prompt_content += f"\nSignificant symbols identified: {', '.join(symbols[:5])}\n"
     
+    if similar_dreams:
+        # From similarity.prediction_context: the user's most similar past dreams
+        prompt_content += "\nThe user's most similar past dreams:\n"
+        for similar in similar_dreams:
+            themes = ', '.join(similar.get('themes') or []) or 'none recorded'
+            prompt_content += f"- {similar.get('date') or 'Undated'} (themes: {themes}): {similar.get('excerpt', '')}\n"
+        prompt_content += "Consider whether this dream continues or breaks from these earlier ones.\n"
+    
     prompt_content += """
 
 Based on these details, provide a creative and thoughtful prediction of:
@@ -71,27 +165,145 @@ Based on these details, provide a creative and thoughtful prediction of:
 
 Make your response insightful, personalized, and psychologically sound while avoiding generic interpretations.
     """
+    return prompt_content
+
+def _prediction_inputs(personality, dream_text=None, emotions=None, symbols=None):
+    # Served from the analysis cache when the dream was already analyzed
+    if dream_text and not emotions:
+        emotions = analyze_dream(dream_text).emotions['emotion_scores']
+    
+    if dream_text and not symbols:
+        symbols = analyze_dream(dream_text).symbol_analysis(personality)['symbols_found']
+    
+    return emotions, symbols
+
+def predict_future_impact(dream_themes, sentiment, personality, dream_text=None, emotions=None, symbols=None,
+                          use_cache=True, similar_dreams=None):
+    emotions, symbols = _prediction_inputs(personality, dream_text, emotions, symbols)
+    prompt_content = build_prediction_prompt(dream_themes, sentiment, personality, emotions, symbols, similar_dreams)
     
     try:
-        if not MODEL:
-            return "AI model not initialized. Please check your API key configuration."
-        
-        response = MODEL.generate_content(prompt_content)
-        prediction = response.text.strip()
+        prediction = _generate(prompt_content, use_cache)
+        if prediction is None:
+            if PREDICTION_BACKEND == "remote":
+                return "Prediction unavailable. Please set the API key in gpt_predictor.py"
+            return predict_locally(dream_themes, sentiment, personality, emotions, symbols, similar_dreams)
         return prediction
     
     except Exception as e:
-        return f"Error during prediction: {str(e)}. Please ensure your API key is valid."
+        if PREDICTION_BACKEND == "remote":
+            return f"Error during prediction: {str(e)}. Please ensure your API key is valid."
+        print(f"Prediction failed, using the offline predictor: {type(e).__name__}: {e}")
+        increment("llm_fallbacks")
+        return predict_locally(dream_themes, sentiment, personality, emotions, symbols, similar_dreams)
+
+def predict_future_impact_stream(dream_themes, sentiment, personality, dream_text=None, emotions=None,
+                                 symbols=None, use_cache=True, similar_dreams=None):
+    """Yield the prediction in text chunks as the backend produces them.
 
-def analyze_dream_patterns(dream_history, personality):
-    if not model_initialized and not initialize_model():
-        return "Pattern analysis unavailable. Please set the API key in gpt_predictor.py"
+    Takes the same arguments as predict_future_impact. A cached prediction
+    is yielded whole; a freshly streamed one is cached once complete.
+    """
+    emotions, symbols = _prediction_inputs(personality, dream_text, emotions, symbols)
+    prompt_content = build_prediction_prompt(dream_themes, sentiment, personality, emotions, symbols, similar_dreams)
     
+    if PREDICTION_BACKEND == "local":
+        yield predict_locally(dream_themes, sentiment, personality, emotions, symbols, similar_dreams)
+        return
+    
+    if use_cache:
+        cached = _cached_response(prompt_content)
+        if cached is not None:
+            increment("llm_cache_hits")
+            yield cached
+            return
+    
+    client = get_llm_client()
+    if client is None:
+        if PREDICTION_BACKEND == "remote":
+            yield "Prediction unavailable. Please set the API key in gpt_predictor.py"
+        else:
+            yield predict_locally(dream_themes, sentiment, personality, emotions, symbols, similar_dreams)
+        return
+    
+    chunks = []
+    increment("llm_calls")
+    start = time.perf_counter()
+    try:
+        for chunk in client.stream(prompt_content):
+            if not chunks:
+                observe("llm_first_chunk", time.perf_counter() - start)
+            chunks.append(chunk)
+            yield chunk
+    except Exception as e:
+        increment("llm_stream_errors")
+        # Nothing shown yet, so the offline prediction can stand in for the whole answer
+        if not chunks and PREDICTION_BACKEND != "remote":
+            print(f"Prediction failed, using the offline predictor: {type(e).__name__}: {e}")
+            increment("llm_fallbacks")
+            yield predict_locally(dream_themes, sentiment, personality, emotions, symbols, similar_dreams)
+        else:
+            yield f"\n\nError during prediction: {str(e)}. Please ensure your API key is valid."
+        return
+    
+    observe("llm_stream", time.perf_counter() - start)
+    _store_response(prompt_content, "".join(chunks).strip())
+
+def predict_many(requests, use_cache=True):
+    """Run many predictions concurrently.
+
+    Each request is a dict of predict_future_impact keyword arguments.
+    Cached prompts are answered locally; the rest are sent to the backend
+    together, within the client's concurrency and rate limits. Returns the
+    predictions in request order.
+    """
+    inputs, prompts = [], []
+    for request in requests:
+        emotions, symbols = _prediction_inputs(request['personality'], request.get('dream_text'),
+                                               request.get('emotions'), request.get('symbols'))
+        inputs.append((request['dream_themes'], request['sentiment'], request['personality'], emotions, symbols,
+                       request.get('similar_dreams')))
+        prompts.append(build_prediction_prompt(*inputs[-1]))
+    
+    if PREDICTION_BACKEND == "local":
+        return [predict_locally(*args) for args in inputs]
+    
+    predictions = [_cached_response(prompt) if use_cache else None for prompt in prompts]
+    pending = [i for i, prediction in enumerate(predictions) if prediction is None]
+    increment("llm_cache_hits", len(prompts) - len(pending))
+    if not pending:
+        return predictions
+    
+    client = get_llm_client()
+    if client is None:
+        for i in pending:
+            if PREDICTION_BACKEND == "remote":
+                predictions[i] = "Prediction unavailable. Please set the API key in gpt_predictor.py"
+            else:
+                predictions[i] = predict_locally(*inputs[i])
+        return predictions
+    
+    increment("llm_calls", len(pending))
+    with timer("llm_generate_many"):
+        responses = client.generate_many_sync([prompts[i] for i in pending])
+    for i, response in zip(pending, responses):
+        if isinstance(response, Exception):
+            if PREDICTION_BACKEND == "remote":
+                predictions[i] = f"Error during prediction: {str(response)}. Please ensure your API key is valid."
+            else:
+                increment("llm_fallbacks")
+                predictions[i] = predict_locally(*inputs[i])
+        else:
+            _store_response(prompts[i], response)
+            predictions[i] = response
+    return predictions
+
+def analyze_dream_patterns(dream_history, personality, use_cache=True, symbol_index=None):
     if len(dream_history) < 3:
         return "Need at least 3 dreams to analyze patterns effectively."
     
     try:
-        symbol_insights = generate_symbol_insights(dream_history, personality)
+        symbol_insights = generate_symbol_insights(dream_history, personality, index=symbol_index)
         
         prompt_content = f"""
 You are an expert in dream pattern analysis and psychological insight.
@@ -116,15 +328,20 @@ Based on this information, provide an analysis of:
 Make your analysis insightful, personalized, and psychologically sound.
         """
         
-        if not MODEL:
-            return "AI model not initialized. Please check your API key configuration."
-            
-        response = MODEL.generate_content(prompt_content)
-        analysis = response.text.strip()
+        # An unchanged history produces the same prompt, so it is answered from the cache
+        analysis = _generate(prompt_content, use_cache)
+        if analysis is None:
+            if PREDICTION_BACKEND == "remote":
+                return "Pattern analysis unavailable. Please set the API key in gpt_predictor.py"
+            return analyze_patterns_locally(dream_history, personality, symbol_index)
         return analysis
         
     except Exception as e:
-        return f"Error during pattern analysis: {str(e)}. Please ensure your API key is valid."
-
-# Initialize the model when module is imported
-initialize_model()
\ No newline at end of file
+        if PREDICTION_BACKEND == "remote":
+            return f"Error during pattern analysis: {str(e)}. Please ensure your API key is valid."
+        print(f"Pattern analysis failed, using the offline analysis: {type(e).__name__}: {e}")
+        increment("llm_fallbacks")
+        try:
+            return analyze_patterns_locally(dream_history, personality, symbol_index)
+        except Exception:
+            return f"Error during pattern analysis: {str(e)}. Please ensure your API key is valid."
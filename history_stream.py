@@ -0,0 +1,220 @@
+import os
+import sys
+import math
+import argparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from storage import DreamStore, open_store, DEFAULT_CHUNKSIZE
+from schema import as_list
+from dream_symbols import get_symbol_matcher, describe_symbol_insights
+from emotion_detection import count_emotions, describe_emotion_patterns, RECENT_EMOTION_DREAMS
+from metrics import timed
+
+class HistoryPartial:
+    """Mergeable summary of a contiguous run of dreams from the history.
+
+    Holds symbol, emotion, theme and category counts, the sentiment sum and
+    count, the last sentiment and the emotions of the last few dreams: all
+    that the symbol, emotion and pattern summaries need. Partials are built
+    per chunk, possibly in worker processes, and merged in history order;
+    counts keep the order in which values first appeared, so the merged
+    summaries match the ones computed over the whole DataFrame.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.symbol_counts = Counter()
+        self.emotion_counts = Counter()
+        self.theme_counts = Counter()
+        self.category_counts = Counter()
+        self.sentiment_sum = 0.0
+        self.sentiment_count = 0
+        self.last_sentiment = None
+        # Emotion lists of the latest dreams, oldest first
+        self.recent_emotions = []
+        self.has_dreams = False
+        self.has_emotions = False
+        self.has_categories = False
+
+    @classmethod
+    def from_frame(cls, df):
+        """Summarize one chunk of the history, in either schema layout."""
+        partial = cls()
+        partial.rows = len(df)
+        if partial.rows == 0:
+            return partial
+
+        if 'dream' in df.columns:
+            partial.has_dreams = True
+            matcher = get_symbol_matcher()
+            for dream_text in df['dream']:
+                if isinstance(dream_text, str):
+                    partial.symbol_counts.update(matcher.count(dream_text))
+
+        if 'emotions' in df.columns:
+            partial.has_emotions = True
+            partial.emotion_counts = count_emotions(df['emotions'])
+            partial.recent_emotions = [as_list(value) for value in df['emotions'].tail(RECENT_EMOTION_DREAMS)]
+
+        if 'themes' in df.columns:
+            for themes in df['themes']:
+                partial.theme_counts.update(as_list(themes))
+
+        if 'category' in df.columns:
+            partial.has_categories = True
+            partial.category_counts.update(value for value in df['category'] if isinstance(value, str))
+
+        if 'sentiment' in df.columns:
+            sentiment = pd.to_numeric(df['sentiment'], errors="coerce").astype("float64")
+            partial.sentiment_sum = float(sentiment.sum())
+            partial.sentiment_count = int(sentiment.count())
+            last = sentiment.iloc[-1]
+            partial.last_sentiment = None if math.isnan(last) else float(last)
+        return partial
+
+    def merge(self, other):
+        """Fold in the partial for the dreams that directly follow these ones."""
+        if other.rows == 0:
+            return self
+        self.rows += other.rows
+        self.symbol_counts.update(other.symbol_counts)
+        self.emotion_counts.update(other.emotion_counts)
+        self.theme_counts.update(other.theme_counts)
+        self.category_counts.update(other.category_counts)
+        self.sentiment_sum += other.sentiment_sum
+        self.sentiment_count += other.sentiment_count
+        self.last_sentiment = other.last_sentiment
+        self.recent_emotions = (self.recent_emotions + other.recent_emotions)[-RECENT_EMOTION_DREAMS:]
+        self.has_dreams = self.has_dreams or other.has_dreams
+        self.has_emotions = self.has_emotions or other.has_emotions
+        self.has_categories = self.has_categories or other.has_categories
+        return self
+
+    def sentiment_mean(self):
+        return self.sentiment_sum / self.sentiment_count if self.sentiment_count else float("nan")
+
+    def top_category(self):
+        """Most frequent category, ties broken like DataFrame.mode (smallest value)."""
+        if not self.category_counts:
+            return None
+        most = max(self.category_counts.values())
+        return min(category for category, count in self.category_counts.items() if count == most)
+
+    def symbol_frequencies(self):
+        """Same result as get_symbol_frequencies over the summarized dreams."""
+        return {symbol: count for symbol, count in self.symbol_counts.items() if count > 0}
+
+    def symbol_insights(self):
+        """Same result as generate_symbol_insights over the summarized dreams."""
+        return describe_symbol_insights(self.symbol_frequencies())
+
+    def emotion_patterns(self):
+        """Same result as analyze_emotion_patterns over the summarized dreams."""
+        if self.rows < 3:
+            return "Not enough dream data to analyze emotion patterns."
+        if not self.has_emotions:
+            return "No emotion data available in dream history."
+
+        recent_counts = count_emotions(self.recent_emotions)
+        earlier_counts = None
+        if self.rows >= 5:
+            # The latest dreams' emotions are in the totals as well; Counter
+            # subtraction keeps the totals' order of first appearance
+            earlier_counts = self.emotion_counts - recent_counts
+        return describe_emotion_patterns(self.emotion_counts, recent_counts, earlier_counts)
+
+    def patterns(self):
+        """Same result as the app's analyze_patterns over the summarized dreams."""
+        if self.rows < 2:
+            return "Not enough dream data to analyze patterns."
+        return describe_patterns(self.last_sentiment, self.sentiment_mean(), self.theme_counts,
+                                 self.top_category() if self.has_categories else None)
+
+def describe_patterns(last_sentiment, sentiment_mean, theme_counts, category):
+    """Summarize the sentiment trend, the most common themes and the dominant category."""
+    sentiment_trend = ("increasing" if last_sentiment is not None and last_sentiment > sentiment_mean
+                       else "decreasing")
+    common_themes = theme_counts.most_common(3) or [("unknown", 0)]
+
+    analysis = f"Your dream sentiment is {sentiment_trend}. "
+    analysis += f"Your most common dream themes are: {', '.join([t[0] for t in common_themes])}. "
+    analysis += f"Your dreams most frequently fall into the '{category or 'unknown'}' category."
+    return analysis
+
+def _iter_frames(source, columns, chunksize):
+    if isinstance(source, str):
+        source = open_store(source)
+    if isinstance(source, DreamStore):
+        yield from source.iter_chunks(columns, chunksize)
+    elif isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize]
+    else:
+        yield from source
+
+@timed("history_summary")
+def summarize_history(source, columns=None, chunksize=DEFAULT_CHUNKSIZE, n_process=1):
+    """Summarize the dream history a chunk at a time into one HistoryPartial.
+
+    source is a DreamStore, a dream log path, a DataFrame or any iterable
+    of DataFrame chunks in history order. Only the chunks being summarized
+    are held in memory. With n_process > 1 (None for one per CPU), chunks
+    are summarized in worker processes, map-reduce style, with at most two
+    chunks per worker in flight, and the partials merged in order.
+    """
+    frames = _iter_frames(source, columns, chunksize)
+    total = HistoryPartial()
+    if n_process is None:
+        n_process = os.cpu_count() or 1
+
+    if n_process <= 1:
+        for frame in frames:
+            total.merge(HistoryPartial.from_frame(frame))
+        return total
+
+    with ProcessPoolExecutor(max_workers=n_process) as executor:
+        pending = deque()
+        for frame in frames:
+            pending.append(executor.submit(HistoryPartial.from_frame, frame))
+            if len(pending) >= n_process * 2:
+                total.merge(pending.popleft().result())
+        while pending:
+            total.merge(pending.popleft().result())
+    return total
+
+def stream_symbol_frequencies(source, **options):
+    """get_symbol_frequencies over a dream log read in chunks."""
+    return summarize_history(source, ["dream"], **options).symbol_frequencies()
+
+def stream_symbol_insights(source, **options):
+    """generate_symbol_insights over a dream log read in chunks."""
+    return summarize_history(source, ["dream"], **options).symbol_insights()
+
+def stream_emotion_patterns(source, **options):
+    """analyze_emotion_patterns over a dream log read in chunks."""
+    return summarize_history(source, ["emotions"], **options).emotion_patterns()
+
+def stream_patterns(source, **options):
+    """The app's analyze_patterns over a dream log read in chunks."""
+    return summarize_history(source, ["sentiment", "themes", "category"], **options).patterns()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a dream log a chunk at a time")
+    parser.add_argument("path", nargs="?", default=None, help="Dream log (default: $DREAM_STORE or dream_log.csv)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (0 for one per CPU)")
+    args = parser.parse_args()
+
+    try:
+        summary = summarize_history(open_store(args.path), chunksize=args.chunksize, n_process=args.workers or None)
+    except Exception as e:
+        print(f"Error reading dream log: {e}")
+        sys.exit(1)
+
+    print(f"{summary.rows} dreams\n")
+    print(summary.patterns() + "\n")
+    print(summary.emotion_patterns() + "\n")
+    print(summary.symbol_insights())
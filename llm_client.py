@@ -0,0 +1,367 @@
+import time
+import queue
+import random
+import asyncio
+import hashlib
+import argparse
+import sys
+import threading
+
+class LLMBackend:
+    """Interface for text generation backends used by gpt_predictor.
+
+    Backends implement the blocking generate(); agenerate() runs it in a
+    worker thread unless the backend has a native async call, and stream()
+    yields the whole response as one chunk unless the backend can stream.
+    """
+
+    name = "backend"
+
+    def generate(self, prompt):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt):
+        return await asyncio.to_thread(self.generate, prompt)
+
+    def stream(self, prompt):
+        yield self.generate(prompt)
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through a configured google.generativeai model."""
+
+    def __init__(self, model, name="gemini-pro"):
+        self.model = model
+        self.name = name
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text.strip()
+
+    async def agenerate(self, prompt):
+        if hasattr(self.model, "generate_content_async"):
+            response = await self.model.generate_content_async(prompt)
+            return response.text.strip()
+        return await super().agenerate(prompt)
+
+    def stream(self, prompt):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+class StubBackend(LLMBackend):
+    """In-process stand-in for an LLM, for offline load and latency tests.
+
+    Each call waits latency +/- jitter seconds, fails with probability
+    failure_rate, and otherwise returns a deterministic answer derived from
+    the prompt. When streaming, latency is the wait for the first chunk and
+    every further word arrives chunk_delay seconds after the previous one.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency=0.5, jitter=0.1, failure_rate=0.0, seed=None, chunk_delay=0.02):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.chunk_delay = chunk_delay
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _next_call(self):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.failure_rate
+        return delay, failed
+
+    def _response(self, prompt):
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return (f"1. Stub prediction {digest}: these dream elements may shape upcoming decisions.\n"
+                "2. A recurring subconscious pattern is emerging.\n"
+                "3. The dream highlights both an opportunity and a challenge.\n"
+                "4. Actionable insight: note how this dream relates to today's choices.")
+
+    def generate(self, prompt):
+        delay, failed = self._next_call()
+        time.sleep(delay)
+        if failed:
+            raise RuntimeError("Simulated backend failure")
+        return self._response(prompt)
+
+    async def agenerate(self, prompt):
+        delay, failed = self._next_call()
+        await asyncio.sleep(delay)
+        if failed:
+            raise RuntimeError("Simulated backend failure")
+        return self._response(prompt)
+
+    def stream(self, prompt):
+        delay, failed = self._next_call()
+        time.sleep(delay)
+        if failed:
+            raise RuntimeError("Simulated backend failure")
+        words = self._response(prompt).split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield word if i == len(words) - 1 else word + " "
+
+class TokenBucket:
+    """Token-bucket rate limiter: rate tokens per second, up to capacity.
+
+    The token count is guarded by a thread lock, so one bucket limits
+    callers on any thread or event loop.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Take a token if one is available; otherwise return the seconds until one is."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+class AsyncLLMClient:
+    """Concurrent, rate-limited client in front of an LLMBackend.
+
+    Every call gets a deadline of timeout seconds, at most max_concurrency
+    calls run at once, call starts are limited to rate per second, and
+    failures are retried with exponential backoff and full jitter.
+
+    Calls run on one event loop the client keeps in a background thread,
+    whichever thread or loop they come from, so the concurrency and rate
+    limits hold across all callers sharing the client, e.g. Streamlit
+    sessions or the analysis service's workers. Streams hold a
+    concurrency slot for as long as they run.
+    """
+
+    def __init__(self, backend, max_concurrency=4, rate=1.0, burst=None, timeout=30.0,
+                 retries=2, backoff=1.0, max_backoff=16.0):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _client_loop(self):
+        """Return the client's event loop, starting its thread on first use."""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def _submit(self, coroutine):
+        """Schedule coroutine on the client's loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._client_loop())
+
+    async def generate(self, prompt, timeout=None):
+        """Generate a response to prompt, retrying failures and timeouts."""
+        if asyncio.get_running_loop() is self._client_loop():
+            return await self._generate(prompt, timeout)
+        # Cancelling the wrapper, e.g. on a deadline, cancels the call on the client's loop
+        return await asyncio.wrap_future(self._submit(self._generate(prompt, timeout)))
+
+    async def _generate(self, prompt, timeout=None):
+        timeout = timeout if timeout is not None else self.timeout
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                if self.bucket is not None:
+                    await self.bucket.acquire()
+                try:
+                    return await asyncio.wait_for(self.backend.agenerate(prompt), timeout)
+                except Exception:
+                    if attempt == self.retries:
+                        raise
+                    delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                    await asyncio.sleep(random.uniform(0, delay))
+
+    async def generate_many(self, prompts, timeout=None):
+        """Generate responses for many prompts concurrently, in input order.
+
+        Failed prompts yield the exception instead of a string.
+        """
+        return await asyncio.gather(*(self.generate(prompt, timeout) for prompt in prompts),
+                                    return_exceptions=True)
+
+    def generate_sync(self, prompt, timeout=None, deadline=None):
+        """Blocking wrapper around generate().
+
+        deadline bounds the whole call, retries included, in seconds.
+        """
+        if deadline is None:
+            return self._submit(self._generate(prompt, timeout)).result()
+        return self._submit(asyncio.wait_for(self._generate(prompt, timeout), deadline)).result()
+
+    def generate_many_sync(self, prompts, timeout=None):
+        """Blocking wrapper around generate_many()."""
+        return self._submit(self.generate_many(prompts, timeout)).result()
+
+    def stream(self, prompt, timeout=None):
+        """Yield the response to prompt in chunks as the backend produces them.
+
+        The backend runs in a helper thread; waiting more than timeout seconds
+        for any chunk raises TimeoutError. Failures before the first chunk are
+        retried like generate(); once text has been yielded they are raised.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        for attempt in range(self.retries + 1):
+            self._submit(self._semaphore.acquire()).result()
+            started = False
+            try:
+                if self.bucket is not None:
+                    self._submit(self.bucket.acquire()).result()
+                for chunk in _stream_in_thread(self.backend, prompt, timeout):
+                    started = True
+                    yield chunk
+                return
+            except Exception:
+                if started or attempt == self.retries:
+                    raise
+                # Backs off holding the slot, as generate() does
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                time.sleep(random.uniform(0, delay))
+            finally:
+                # Also reached when the consumer stops iterating early
+                self._client_loop().call_soon_threadsafe(self._semaphore.release)
+
+_STREAM_DONE = object()
+
+def _stream_in_thread(backend, prompt, timeout):
+    chunks = queue.Queue()
+    stopped = threading.Event()
+
+    def producer():
+        try:
+            for chunk in backend.stream(prompt):
+                if stopped.is_set():
+                    return
+                chunks.put(chunk)
+            chunks.put(_STREAM_DONE)
+        except Exception as e:
+            chunks.put(e)
+
+    threading.Thread(target=producer, daemon=True).start()
+    try:
+        while True:
+            try:
+                item = chunks.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No response chunk within {timeout} seconds")
+            if item is _STREAM_DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+
+def load_test(client, requests=100):
+    """Send requests distinct prompts through client and report throughput and latency."""
+    async def timed(prompt):
+        start = time.perf_counter()
+        try:
+            await client.generate(prompt)
+            return time.perf_counter() - start
+        except Exception:
+            return None
+
+    async def run_all():
+        return await asyncio.gather(*(timed(f"load test prompt {i}") for i in range(requests)))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_all())
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r for r in results if r is not None)
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else float("nan")
+
+    return {
+        'requests': requests,
+        'failures': requests - len(latencies),
+        'elapsed': elapsed,
+        'throughput': requests / elapsed if elapsed else 0.0,
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'max': latencies[-1] if latencies else float("nan")
+    }
+
+def stream_benchmark(client, requests=10):
+    """Stream requests prompts one after another and report time to first chunk and to completion."""
+    first_chunk, complete = [], []
+    for i in range(requests):
+        start = time.perf_counter()
+        first = None
+        for _ in client.stream(f"stream benchmark prompt {i}"):
+            if first is None:
+                first = time.perf_counter() - start
+        first_chunk.append(first)
+        complete.append(time.perf_counter() - start)
+
+    def mean(values):
+        values = [v for v in values if v is not None]
+        return sum(values) / len(values) if values else float("nan")
+
+    return {
+        'requests': requests,
+        'first_chunk': mean(first_chunk),
+        'complete': mean(complete)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the LLM client against the stub backend")
+    parser.add_argument("--stream", action="store_true",
+                        help="Measure time to first chunk of streamed responses instead")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Stub delay between streamed chunks")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=20.0, help="Requests started per second")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    backend = StubBackend(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate, seed=0,
+                          chunk_delay=args.chunk_delay)
+    client = AsyncLLMClient(backend, max_concurrency=args.concurrency, rate=args.rate,
+                            burst=args.concurrency, timeout=args.timeout, backoff=0.1)
+
+    if args.stream:
+        report = stream_benchmark(client, min(args.requests, 20))
+        print(f"Requests:          {report['requests']}")
+        print(f"Time to 1st chunk: {report['first_chunk'] * 1000:.0f} ms (mean)")
+        print(f"Time to complete:  {report['complete'] * 1000:.0f} ms (mean)")
+        sys.exit(0)
+
+    report = load_test(client, args.requests)
+
+    print(f"Requests:   {report['requests']} ({report['failures']} failed)")
+    print(f"Elapsed:    {report['elapsed']:.2f} s")
+    print(f"Throughput: {report['throughput']:.1f} req/s")
+    print(f"Latency:    p50 {report['p50'] * 1000:.0f} ms, p95 {report['p95'] * 1000:.0f} ms, "
+          f"max {report['max'] * 1000:.0f} ms")
@@ -0,0 +1,196 @@
+from dream_symbols import DREAM_SYMBOLS, get_symbol_frequencies
+from schema import as_list
+
+# What each dream theme tends to say about upcoming decisions and opportunities
+THEME_INFLUENCES = {
+    'adventure': ("a readiness to try unfamiliar paths", "a new project, trip or role that stretches your comfort zone"),
+    'conflict': ("unresolved tension that may surface in how you negotiate", "a disagreement you have been postponing"),
+    'escape': ("an urge to step away from pressure rather than face it", "a responsibility you have been avoiding"),
+    'loss': ("a wish to hold on to what feels uncertain", "letting go of something that no longer serves you"),
+    'transformation': ("openness to change in how you see yourself", "a transition that is already under way"),
+    'relationships': ("a focus on the people closest to you", "a conversation that could deepen an important bond"),
+    'fear': ("caution that could make you hesitate before committing", "a worry that is smaller once it is named"),
+    'success': ("confidence that can carry you into bigger commitments", "recognition for effort you have already made"),
+    'nature': ("a need to reconnect with basic rhythms and instincts", "time outdoors or away from screens to reset"),
+}
+
+# Subconscious pattern suggested by the strongest emotion
+EMOTION_PATTERNS = {
+    'joy': "Your mind is rehearsing positive outcomes, which often precedes a period of optimism and initiative.",
+    'sadness': "Your subconscious is processing a disappointment or loss that may still be shaping your mood.",
+    'fear': "An anticipatory anxiety pattern is emerging, with your mind preparing for threats it expects in waking life.",
+    'anger': "Suppressed frustration is looking for an outlet, hinting at boundaries that feel crossed.",
+    'surprise': "Your mind is integrating something unexpected, a sign that your assumptions are being updated.",
+    'disgust': "You are rejecting a situation or habit at a deep level, even if you have not acted on it yet.",
+    'anticipation': "Your subconscious is leaning forward, preparing for an event or decision on the horizon.",
+    'confusion': "Mixed signals in your waking life are being sorted through, and clarity is still forming.",
+    'love': "A need for closeness and belonging is prominent, drawing your attention to meaningful connections.",
+    'peace': "Your mind is consolidating a sense of balance, a good base for deliberate decisions.",
+}
+
+# Practical advice for the strongest emotion
+EMOTION_ACTIONS = {
+    'joy': "Write down what felt good in the dream and plan one small step toward it this week.",
+    'sadness': "Give yourself ten quiet minutes to name what you miss, then share it with someone you trust.",
+    'fear': "List the worst case you are bracing for and one concrete action that would make it less likely.",
+    'anger': "Identify the boundary that feels crossed and decide how you will state it calmly.",
+    'surprise': "Revisit one assumption you hold about your current situation and test it with fresh information.",
+    'disgust': "Notice which habit or situation you keep tolerating and set a date to change it.",
+    'anticipation': "Prepare for the upcoming event you are thinking about so the energy turns into readiness.",
+    'confusion': "Separate the decisions in front of you into what you know and what you still need to find out.",
+    'love': "Reach out to someone who matters to you today without waiting for a reason.",
+    'peace': "Protect the routines that are keeping you balanced and use the calm to plan ahead.",
+}
+
+CATEGORY_PATTERNS = {
+    'nature': "processing raw emotions and fundamental life forces",
+    'animals': "instinctual drives asking for attention",
+    'objects': "practical tools and resources for change",
+    'people': "relationships and different aspects of yourself",
+    'actions': "movement and change in your life",
+    'settings': "your current life situation and emotional environment",
+}
+
+def _top_emotions(emotions, n=3):
+    if not emotions:
+        return []
+    return sorted([(e, s) for e, s in emotions.items() if s > 0], key=lambda x: x[1], reverse=True)[:n]
+
+def _symbol_meanings(symbols, n=3):
+    return [(s, DREAM_SYMBOLS[s]['meaning'].lower()) for s in (symbols or []) if s in DREAM_SYMBOLS][:n]
+
+def _personality_note(personality):
+    personality = personality or {}
+    if personality.get('stress', 5) > 7:
+        return "With your high stress level, these elements are likely tied to pressures you are carrying right now."
+    if personality.get('intuition', 5) > personality.get('analytical', 5) + 2:
+        return "Your intuitive style means a gut feeling about this dream is worth trusting."
+    if personality.get('analytical', 5) > personality.get('intuition', 5) + 2:
+        return "Your analytical style will help you map these elements onto specific situations."
+    if personality.get('creativity', 5) > 7:
+        return "Your creativity can turn these images into ideas worth exploring."
+    return "Your balanced approach lets you weigh both the symbolism and the practical side of this dream."
+
+def predict_locally(dream_themes, sentiment, personality, emotions=None, symbols=None, similar_dreams=None):
+    """Build the four-part prediction offline from the dream analysis.
+
+    Uses the same inputs as gpt_predictor.predict_future_impact and only
+    looks up tables, so it answers in well under a millisecond.
+    """
+    themes = [t for t in dream_themes or [] if t in THEME_INFLUENCES]
+    top_emotions = _top_emotions(emotions)
+    meanings = _symbol_meanings(symbols)
+    primary_emotion = top_emotions[0][0] if top_emotions else None
+
+    if sentiment > 0.2:
+        tone = "The dream's positive tone suggests you are approaching upcoming choices with confidence."
+    elif sentiment < -0.2:
+        tone = "The dream's negative tone suggests some hesitation or worry around upcoming choices."
+    else:
+        tone = "The dream's mixed tone suggests you are still weighing your options."
+
+    influence = [tone]
+    for theme in themes[:2]:
+        influence.append(f"The {theme} theme points to {THEME_INFLUENCES[theme][0]}.")
+    influence.append(_personality_note(personality))
+
+    pattern = EMOTION_PATTERNS.get(primary_emotion, "No single emotion dominates, so the dream reads as your mind "
+                                                     "quietly sorting recent experiences.")
+    if meanings:
+        pattern += " Its symbols reinforce this: " + "; ".join(f"{s} ({m})" for s, m in meanings) + "."
+    if similar_dreams:
+        echoed = similar_dreams[0].get('date')
+        pattern += (f" It closely echoes your dream from {echoed}" if echoed else " It closely echoes an earlier dream")
+        pattern += ", so this is a pattern your mind keeps returning to."
+
+    opportunities = [THEME_INFLUENCES[theme][1] for theme in themes[:2]]
+    if opportunities:
+        highlight = "The dream may be highlighting " + " and ".join(opportunities) + "."
+    elif meanings:
+        highlight = f"The {meanings[0][0]} in your dream points to {meanings[0][1]} as an area to watch."
+    else:
+        highlight = "The dream may be highlighting an everyday situation that deserves more attention than it gets."
+    if sentiment < -0.2:
+        highlight += " Treat it as a challenge to prepare for rather than a warning."
+
+    action = EMOTION_ACTIONS.get(primary_emotion, "Keep a short note of this dream and check tomorrow whether "
+                                                  "any of its images show up in your day.")
+
+    return "\n\n".join([
+        "1. Influence on future decisions: " + " ".join(influence),
+        "2. Emerging subconscious patterns: " + pattern,
+        "3. Opportunities and challenges: " + highlight,
+        "4. Actionable insight: " + action,
+    ])
+
+def _split_values(column):
+    counts = {}
+    for value in column:
+        for item in as_list(value):
+            item = item.strip().lower()
+            if item and item not in ('neutral', 'unclassified', 'unknown'):
+                counts[item] = counts.get(item, 0) + 1
+    return sorted(counts.items(), key=lambda x: x[1], reverse=True)
+
+def analyze_patterns_locally(dream_history, personality, symbol_index=None):
+    """Offline counterpart of gpt_predictor.analyze_dream_patterns.
+
+    Reads recurring symbols from the symbol index, plus themes, emotions and
+    sentiment when the history has those columns.
+    """
+    personality = personality or {}
+    frequencies = get_symbol_frequencies(dream_history, index=symbol_index)
+    top_symbols = sorted(frequencies.items(), key=lambda x: x[1], reverse=True)[:3]
+    themes = _split_values(dream_history['themes'])[:3] if 'themes' in dream_history.columns else []
+    emotions = _split_values(dream_history['emotions'])[:3] if 'emotions' in dream_history.columns else []
+
+    recurring = []
+    if top_symbols:
+        recurring.append("Recurring symbols: " + ", ".join(f"{s} ({c} times)" for s, c in top_symbols) + ".")
+    if themes:
+        recurring.append("Recurring themes: " + ", ".join(t for t, _ in themes) + ".")
+    if emotions:
+        recurring.append("Most frequent emotions: " + ", ".join(e for e, _ in emotions) + ".")
+    if not recurring:
+        recurring.append("No strong recurring elements yet; your dreams are varied.")
+
+    waking = []
+    for symbol, _ in top_symbols[:2]:
+        if symbol in DREAM_SYMBOLS:
+            waking.append(f"{symbol} often reflects {DREAM_SYMBOLS[symbol]['meaning'].lower()}")
+    for theme, _ in themes[:1]:
+        if theme in THEME_INFLUENCES:
+            waking.append(f"the {theme} theme suggests {THEME_INFLUENCES[theme][0]}")
+    waking_text = ("In waking life, " + "; ".join(waking) + ".") if waking else \
+        "These dreams likely mirror everyday concerns rather than one dominant issue."
+
+    if 'sentiment' in dream_history.columns and len(dream_history['sentiment'].dropna()) >= 2:
+        sentiment = dream_history['sentiment'].dropna().astype(float)
+        half = len(sentiment) // 2
+        trend = sentiment.iloc[half:].mean() - sentiment.iloc[:half].mean()
+        if trend > 0.1:
+            process = "Your dream sentiment is improving, a sign that you are working through earlier tensions."
+        elif trend < -0.1:
+            process = "Your dream sentiment is declining, which can signal building stress worth addressing."
+        else:
+            process = "Your dream sentiment is stable, suggesting steady emotional processing."
+    else:
+        process = "Your mind appears to be consolidating recent experiences."
+    if emotions and emotions[0][0] in EMOTION_PATTERNS:
+        process += " " + EMOTION_PATTERNS[emotions[0][0]]
+
+    categories = {}
+    for symbol, count in top_symbols:
+        if symbol in DREAM_SYMBOLS:
+            category = DREAM_SYMBOLS[symbol]['category']
+            categories[category] = categories.get(category, 0) + count
+    if categories:
+        dominant = max(categories.items(), key=lambda x: x[1])[0]
+        process += f" The focus on {dominant} symbols points to {CATEGORY_PATTERNS.get(dominant, dominant)}."
+
+    return "\n\n".join([
+        "1. Recurring patterns: " + " ".join(recurring),
+        "2. Connection to waking life: " + waking_text,
+        "3. Psychological processes: " + process,
+        "4. Personality influence: " + _personality_note(personality),
+    ])
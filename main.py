@@ -1,41 +1,57 @@
 import sys
 import os
-
-# Initialize NLTK
-print("Initializing NLTK...")
-try:
-    import nltk
-    nltk.download('vader_lexicon', quiet=True)
-except ImportError:
-    print("Error: NLTK not found. Please install with: pip install nltk")
-    sys.exit(1)
-except Exception as e:
-    print(f"Error initializing NLTK: {e}")
-    print("Some functionality might be limited.")
+import json
+import argparse
+from contextlib import contextmanager
 
 # Import required packages
 try:
     import pandas as pd
     import matplotlib.pyplot as plt
-    from nlp_utils import extract_keywords, analyze_sentiment, extract_dream_themes
-    from gpt_predictor import predict_future_impact, analyze_dream_patterns, initialize_model, GOOGLE_API_KEY
+    from nlp_utils import analyze_dream
+    from gpt_predictor import predict_future_impact_stream, analyze_dream_patterns, initialize_model, GOOGLE_API_KEY
     from personality import get_personality_data, get_personality_profile, get_dream_processing_style
     from visualization import generate_wordcloud, plot_sentiment_over_time, plot_emotion_distribution
-    from emotion_detection import detect_emotions, analyze_emotion_patterns, get_emotion_recommendations
-    from dream_symbols import analyze_dream_symbols, generate_symbol_insights
+    from emotion_detection import analyze_emotion_patterns, get_emotion_recommendations
+    from dream_symbols import get_symbol_index
+    from storage import open_store, DEFAULT_CHUNKSIZE
+    from aggregates import get_aggregates, record_dreams
+    from schema import load_history
+    from metrics import get_metrics, write_metrics
+    from personality import load_personality
+    from batch import read_dream_records, analyze_records, history_entry, detect_format, build_result
+    from service import find_service, ServiceError
+    from search_index import get_search_index, search_dreams
+    from similarity import find_similar_dreams, prediction_context
 except ImportError as e:
     print(f"Error: Required module not found: {e}")
     print("Please install required dependencies using: pip install -r requirements.txt")
     sys.exit(1)
 
-def main():
-    """Main function for the command-line interface of the Future Dream Influence Predictor."""
+def _analyze(dream_text, client):
+    """Analyze dream_text on the running service if there is one, else in this process."""
+    if client is not None:
+        try:
+            return client.analyze(dream_text)
+        except (OSError, ValueError, ServiceError) as e:
+            print(f"Analysis service failed, analyzing locally: {e}")
+    return build_result({}, analyze_dream(dream_text).to_dict(), None)
+
+def main(service_url=None, use_service=True):
+    """Main function for the command-line interface of the Future Dream Influence Predictor.
+    
+    When an analysis service is running (see service.py), dreams are analyzed
+    and predicted there, with its models already loaded.
+    """
     print("=== Future Dream Influence Predictor ===\n")
     
+    client = find_service(service_url) if use_service else None
+    if client is not None:
+        print(f"Using the analysis service at {client.url}\n")
     # Check API key for GPT features
-    if GOOGLE_API_KEY == "YOUR_API_KEY_HERE":
+    elif GOOGLE_API_KEY == "YOUR_API_KEY_HERE":
         print("Warning: API key not configured.")
-        print("Generative AI features will be disabled.")
+        print("Predictions will come from the offline predictor instead of Gemini.")
         print("To enable these features, set your API key in gpt_predictor.py\n")
     else:
         # Initialize model if API key is available
@@ -49,17 +65,16 @@ def main():
             return
 
         print("\nAnalyzing your dream...")
-        themes = extract_keywords(dream_text)
-        sentiment_scores = analyze_sentiment(dream_text)
-        compound_sentiment = sentiment_scores.get('compound', 0)
-        dream_themes = extract_dream_themes(dream_text)
+        result = _analyze(dream_text, client)
+        themes = result['keywords']
+        sentiment_scores = result['sentiment_scores']
+        compound_sentiment = result['sentiment']
+        dream_themes = result['themes']
 
-        emotions = detect_emotions(dream_text)
-        primary_emotions = emotions['primary_emotions']
-        emotion_scores = emotions['emotion_scores']
+        primary_emotions = result['primary_emotions']
+        emotion_scores = result['emotions']
 
-        symbol_analysis = analyze_dream_symbols(dream_text)
-        symbols_found = symbol_analysis['symbols_found']
+        symbols_found = result['symbols']
 
         print("\n=== Dream Analysis ===")
         print("\nExtracted Dream Themes:", ", ".join(themes) if themes else "No specific themes detected")
@@ -75,7 +90,7 @@ def main():
         if symbols_found:
             print("\nSignificant Dream Symbols:", ", ".join(symbols_found[:5]))
             print("\nSymbol Interpretation:")
-            print(symbol_analysis['interpretation'])
+            print(result['symbol_interpretation'])
 
         print("\nGenerating word cloud of dream themes...")
         try:
@@ -100,15 +115,38 @@ def main():
             print(f"Error during personality assessment: {e}")
             personality = {"intuition": 5, "stress": 5, "creativity": 5, "analytical": 5}
 
+        # Found before the dream is saved, so it does not match itself
+        similar_dreams = []
+        try:
+            similar_dreams = prediction_context(find_similar_dreams(open_store(), themes, symbols_found,
+                                                                    primary_emotions))
+        except Exception as e:
+            print(f"Error finding similar dreams: {e}")
+        if similar_dreams:
+            print("\n=== Dreams Like This One ===\n")
+            for similar in similar_dreams:
+                print(f"{similar['date'] or 'Undated'} ({similar['similarity']:.0%} similar): {similar['excerpt']}")
+
         print("\n=== Future Influence Prediction ===\n")
         try:
-            if GOOGLE_API_KEY != "YOUR_API_KEY_HERE":
-                prediction = predict_future_impact(dream_themes, compound_sentiment, personality, 
-                                            dream_text=dream_text, emotions=emotion_scores, 
-                                            symbols=symbols_found)
+            prediction = None
+            if client is not None:
+                try:
+                    prediction = client.predict(dream_themes=dream_themes, sentiment=compound_sentiment,
+                                                personality=personality, dream=dream_text,
+                                                emotions=emotion_scores, symbols=symbols_found,
+                                                similar_dreams=similar_dreams)
+                except (OSError, ValueError, ServiceError) as e:
+                    print(f"Prediction service failed, predicting locally: {e}")
+            if prediction is not None:
                 print(prediction)
             else:
-                print("Future prediction is disabled. Configure your API key in gpt_predictor.py")
+                # Print the prediction as it arrives instead of after the full response
+                for chunk in predict_future_impact_stream(dream_themes, compound_sentiment, personality, 
+                                                          dream_text=dream_text, emotions=emotion_scores, 
+                                                          symbols=symbols_found, similar_dreams=similar_dreams):
+                    print(chunk, end="", flush=True)
+                print()
         except Exception as e:
             print(f"Error generating prediction: {e}")
 
@@ -118,61 +156,55 @@ def main():
             print(recommendations)
             
             print("\n=== Symbol-Based Recommendations ===\n")
-            print(symbol_analysis['recommendations'])
+            print(result['symbol_recommendations'])
         except Exception as e:
             print(f"Error generating recommendations: {e}")
 
         # Save dream to history
         try:
-            log_entry = {"date": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+            log_entry = {"date": pd.Timestamp.now().floor("s"),
                         "dream": dream_text,
-                        "themes": ", ".join(themes) if themes else "",
+                        "themes": list(themes),
                         "sentiment": compound_sentiment,
-                        "emotions": emotions['emotions_str'],
-                        "symbols": ", ".join(symbols_found) if symbols_found else ""}
-            try:
-                dream_log = pd.read_csv("dream_log.csv")
-                dream_log = pd.concat([dream_log, pd.DataFrame([log_entry])], ignore_index=True)
-            except (FileNotFoundError, pd.errors.EmptyDataError):
-                dream_log = pd.DataFrame([log_entry])
-            
-            dream_log.to_csv("dream_log.csv", index=False)
+                        "emotions": primary_emotions or ["neutral"],
+                        "symbols": list(symbols_found)}
+            store = open_store()
+            record_dreams(store, [log_entry], views=[get_search_index(store)])
+            get_symbol_index(store).add_dream(dream_text)
             print("\nDream saved to history log.")
         except Exception as e:
             print(f"Error saving dream to history: {e}")
 
         # Historical analysis
         try:
-            if os.path.exists("dream_log.csv"):
-                dream_log = pd.read_csv("dream_log.csv")
-                if len(dream_log) > 1:
-                    print("\n=== Dream History Analysis ===\n")
-                    print("Plotting sentiment over time...")
-                    fig = plot_sentiment_over_time(dream_log)
-                    plt.show()
+            store = open_store()
+            dream_log = load_history(store)
+            if len(dream_log) > 1:
+                print("\n=== Dream History Analysis ===\n")
+                print("Plotting sentiment over time...")
+                fig = plot_sentiment_over_time(dream_log)
+                plt.show()
+                
+                if len(dream_log) >= 3:
+                    try:
+                        pattern_analysis = analyze_dream_patterns(dream_log, personality,
+                                                                  symbol_index=get_symbol_index(store))
+                        print("\nDream Pattern Analysis:")
+                        print(pattern_analysis)
+                    except Exception as e:
+                        print(f"Error analyzing dream patterns: {e}")
                     
-                    if len(dream_log) >= 3:
+                    if 'emotions' in dream_log.columns:
                         try:
-                            if GOOGLE_API_KEY != "YOUR_API_KEY_HERE":
-                                pattern_analysis = analyze_dream_patterns(dream_log, personality)
-                                print("\nDream Pattern Analysis:")
-                                print(pattern_analysis)
-                            else:
-                                print("\nDream pattern analysis requires API key configuration.")
+                            emotion_analysis = analyze_emotion_patterns(dream_log)
+                            print("\nEmotion Pattern Analysis:")
+                            print(emotion_analysis)
+                            
+                            fig = plot_emotion_distribution(dream_log, aggregates=get_aggregates(open_store()))
+                            if fig:
+                                plt.show()
                         except Exception as e:
-                            print(f"Error analyzing dream patterns: {e}")
-                        
-                        if 'emotions' in dream_log.columns:
-                            try:
-                                emotion_analysis = analyze_emotion_patterns(dream_log)
-                                print("\nEmotion Pattern Analysis:")
-                                print(emotion_analysis)
-                                
-                                fig = plot_emotion_distribution(dream_log)
-                                if fig:
-                                    plt.show()
-                            except Exception as e:
-                                print(f"Error analyzing emotion patterns: {e}")
+                            print(f"Error analyzing emotion patterns: {e}")
         except Exception as e:
             print(f"Error analyzing dream history: {e}")
         
@@ -184,5 +216,163 @@ def main():
         print(f"\nUnexpected error: {e}")
         print("Please try again or check the application files.")
 
+@contextmanager
+def _results_stdout():
+    """Yield a stream writing to the real stdout while fd 1 points at stderr.
+
+    The analysis modules report problems with print(), also from worker
+    processes; moving those to stderr keeps the JSONL on stdout clean.
+    """
+    sys.stdout.flush()
+    original = os.dup(1)
+    results = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)
+    try:
+        yield results
+    finally:
+        results.close()
+        sys.stdout.flush()
+        os.dup2(original, 1)
+        os.close(original)
+
+def _save_entries(entries):
+    """Append entries to the dream history and its indexes."""
+    store = open_store()
+    record_dreams(store, entries, views=[get_search_index(store)])
+    get_symbol_index(store).add_dreams([entry['dream'] for entry in entries])
+
+def run_batch(args):
+    """Analyze every dream in args.input and stream one JSON result per line.
+
+    Nothing is plotted or asked interactively. With --save, analyzed dreams
+    are appended to the dream history in bulk writes of DEFAULT_CHUNKSIZE
+    entries, so memory stays flat on large imports; an interrupted import
+    keeps the chunks already written.
+    """
+    personality = {"intuition": 5, "stress": 5, "creativity": 5, "analytical": 5}
+    if args.personality:
+        try:
+            personality = load_personality(args.personality)
+        except (OSError, ValueError) as e:
+            print(f"Error reading personality file: {e}", file=sys.stderr)
+            return 2
+    
+    fmt = detect_format(args.input, args.format)
+    try:
+        source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    except OSError as e:
+        print(f"Error opening input: {e}", file=sys.stderr)
+        return 2
+    run_date = pd.Timestamp.now().floor("s")
+    entries = []
+    analyzed = failed = saved = 0
+    save_error = None
+    
+    try:
+        with (_results_stdout() if args.output in (None, "-") else open(args.output, "w", encoding="utf-8")) as output:
+            records = read_dream_records(source, fmt)
+            for record, result in analyze_records(records, personality, n_process=args.workers,
+                                                  batch_size=args.batch_size, predict=args.predict):
+                output.write(json.dumps(result, default=str) + "\n")
+                if 'error' in result:
+                    failed += 1
+                    continue
+                analyzed += 1
+                if args.save and save_error is None:
+                    entries.append(history_entry(record, result, run_date))
+                    if len(entries) >= DEFAULT_CHUNKSIZE:
+                        try:
+                            _save_entries(entries)
+                            saved += len(entries)
+                        except Exception as e:
+                            save_error = e
+                        entries = []
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    
+    print(f"Analyzed {analyzed} dreams ({failed} skipped)", file=sys.stderr)
+    
+    if args.save and entries and save_error is None:
+        try:
+            _save_entries(entries)
+            saved += len(entries)
+        except Exception as e:
+            save_error = e
+    if saved:
+        print(f"Saved {saved} dreams to the dream history.", file=sys.stderr)
+    if save_error is not None:
+        print(f"Error saving dreams to history: {save_error}", file=sys.stderr)
+        return 1
+    return 0
+
+def run_search(args):
+    """Print the dreams that best match args.query, best first."""
+    try:
+        store = open_store()
+        history = load_history(store, columns=["date", "dream"])
+        results = search_dreams(history, args.query, k=args.limit, index=get_search_index(store))
+    except Exception as e:
+        print(f"Error searching dream history: {e}", file=sys.stderr)
+        return 1
+    
+    if len(results) == 0:
+        print("No dreams match your search.")
+        return 0
+    for _, row in results.iterrows():
+        date = row['date'].strftime("%Y-%m-%d") if pd.notna(row['date']) else "undated"
+        dream = row['dream'] if isinstance(row['dream'], str) else ""
+        dream = dream if len(dream) <= 200 else dream[:197] + "..."
+        print(f"{row['score']:6.2f}  {date}  {dream}")
+    return 0
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Future Dream Influence Predictor")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print the time spent in each analysis stage when done")
+    parser.add_argument("--metrics-file",
+                        help="Also write the stage timings to this file (Prometheus for .prom, JSON otherwise)")
+    parser.add_argument("--service", help="URL of the analysis service (default: $DREAM_SERVICE_URL or "
+                        "http://127.0.0.1:8765)")
+    parser.add_argument("--no-service", action="store_true",
+                        help="Analyze in this process even when an analysis service is running")
+    commands = parser.add_subparsers(dest="command")
+    
+    batch_parser = commands.add_parser("batch", help="Analyze many dreams from a JSONL or CSV file without prompts")
+    batch_parser.add_argument("input", nargs="?", default="-",
+                              help="JSONL or CSV file with a 'dream' field per record ('-' for stdin)")
+    batch_parser.add_argument("--format", choices=["jsonl", "csv"], help="Input format (default: from extension)")
+    batch_parser.add_argument("--output", "-o", help="Write JSONL results here instead of stdout")
+    batch_parser.add_argument("--personality", help="JSON file of personality trait scores (1-10)")
+    batch_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    batch_parser.add_argument("--batch-size", type=int, default=64, help="Dreams per worker chunk")
+    batch_parser.add_argument("--predict", action="store_true", help="Add a future-influence prediction per dream")
+    batch_parser.add_argument("--save", action="store_true",
+                              help="Append the analyzed dreams to the dream history in bulk writes")
+    
+    search_parser = commands.add_parser("search", help="Search the dream history")
+    search_parser.add_argument("query", help='Words to search for; quote "exact phrases"')
+    search_parser.add_argument("--limit", "-n", type=int, default=10, help="Number of dreams to show")
+    args = parser.parse_args()
+
+    status = 0
+    try:
+        if args.command == "batch":
+            status = run_batch(args)
+        elif args.command == "search":
+            status = run_search(args)
+        else:
+            main(args.service, not args.no_service)
+    finally:
+        # Batch results go to stdout, so the report goes to stderr
+        report = sys.stderr if args.command == "batch" else sys.stdout
+        if args.profile:
+            print("\n=== Profile ===\n", file=report)
+            print(get_metrics().format_summary(), file=report)
+        if args.metrics_file:
+            try:
+                write_metrics(args.metrics_file)
+                print(f"\nMetrics written to {args.metrics_file}", file=report)
+            except OSError as e:
+                print(f"Error writing metrics: {e}", file=report)
+    sys.exit(status)
\ No newline at end of file
@@ -0,0 +1,206 @@
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds, in seconds, of the stage duration histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = "dream"
+
+class Histogram:
+    """Bucketed distribution of durations, with their count, sum and maximum."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the overflow (+Inf) bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate the q-quantile by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': self.max,
+            'buckets': dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts))
+        }
+
+class MetricsRegistry:
+    """Per-stage duration histograms and event counters for one process.
+
+    Stages are timed with timer() or the timed() decorator; counters count
+    events such as cache hits or fallbacks. Everything is kept in memory
+    and can be exported as JSON or in the Prometheus text format. Worker
+    processes started by analyze_dreams_batch keep their own registries.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.started = time.time()
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, event, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + amount
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the enclosed block as stage; failures also count as stage_errors."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment(f"{stage}_errors")
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'since': self.started,
+                'stages': {stage: histogram.snapshot() for stage, histogram in sorted(self.stages.items())},
+                'counters': dict(sorted(self.counters.items()))
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [f"# HELP {name} Time spent in each dream analysis stage.",
+                 f"# TYPE {name} histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self.stages.items()):
+                label = _label(stage)
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{label}"}} {histogram.sum!r}')
+                lines.append(f'{name}_count{{stage="{label}"}} {histogram.count}')
+
+            events = f"{METRIC_PREFIX}_events_total"
+            lines += [f"# HELP {events} Number of times each event occurred.",
+                      f"# TYPE {events} counter"]
+            for event, count in sorted(self.counters.items()):
+                lines.append(f'{events}{{event="{_label(event)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def summary_rows(self):
+        """One row per stage, slowest total first, for tables and reports."""
+        rows = []
+        for stage, data in self.to_dict()['stages'].items():
+            rows.append({
+                'stage': stage,
+                'calls': data['count'],
+                'total_ms': data['sum'] * 1000,
+                'mean_ms': data['mean'] * 1000,
+                'p95_ms': data['p95'] * 1000,
+                'max_ms': data['max'] * 1000
+            })
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def format_summary(self):
+        rows = self.summary_rows()
+        if not rows:
+            return "No stages were timed."
+        lines = [f"{'stage':<32}{'calls':>7}{'total ms':>11}{'mean ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for row in rows:
+            lines.append(f"{row['stage']:<32}{row['calls']:>7}{row['total_ms']:>11.1f}{row['mean_ms']:>10.2f}"
+                         f"{row['p95_ms']:>10.2f}{row['max_ms']:>10.2f}")
+        counters = self.to_dict()['counters']
+        if counters:
+            lines.append("")
+            lines += [f"{event:<32}{count:>7}" for event, count in counters.items()]
+        return "\n".join(lines)
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+_registry = MetricsRegistry()
+
+def get_metrics():
+    """Return the process-wide metrics registry."""
+    return _registry
+
+def timer(stage):
+    """Context manager timing the enclosed block as stage."""
+    return _registry.timer(stage)
+
+def timed(stage=None):
+    """Decorator timing every call of the function as stage (default: its name)."""
+    def decorate(function):
+        name = stage or function.__name__
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with _registry.timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def observe(stage, seconds):
+    _registry.observe(stage, seconds)
+
+def increment(event, amount=1):
+    _registry.increment(event, amount)
+
+def export_json():
+    return _registry.to_json()
+
+def export_prometheus():
+    return _registry.to_prometheus()
+
+def write_metrics(path):
+    """Write the metrics to path, in Prometheus format for .prom/.txt files and JSON otherwise."""
+    text = export_prometheus() if path.endswith((".prom", ".txt")) else export_json()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def reset_metrics():
+    _registry.reset()
@@ -1,213 +1,376 @@
 import os
 import sys
-try:
-    import spacy
-    from nltk.sentiment import SentimentIntensityAnalyzer
-    from nltk.tokenize import word_tokenize
-    from nltk.corpus import stopwords
-    from nltk.stem import WordNetLemmatizer
-    import nltk
-    from collections import Counter
-except ImportError as e:
-    print(f"Error: Required module not found: {e}")
-    print("Please install required dependencies using: pip install -r requirements.txt")
-    sys.exit(1)
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from importlib import metadata
+import numpy as np
 
 # Import application-specific modules
 try:
-    from emotion_detection import detect_emotions
-    from dream_symbols import identify_symbols
+    from emotion_detection import (score_emotions, score_emotions_batch, emotion_results, encode_tokens,
+                                   lexicon_fingerprint)
+    from dream_symbols import identify_symbols, interpret_symbols, get_symbol_matcher
+    from resources import get_nlp, get_sentiment_analyzer, get_lemmatizer, get_stop_words, get_word_tokenizer, SPACY_MODEL
+    from result_cache import ResultCache, content_key, CACHE_DIR
+    from metrics import timer, increment
 except ImportError as e:
     print(f"Error: Application module not found: {e}")
     print("Please ensure all application files are in the same directory.")
     sys.exit(1)
 
-# Initialize NLTK resources
-def initialize_nltk():
-    required_resources = [
-        'vader_lexicon',
-        'tokenizers/punkt',
-        'corpora/stopwords',
-        'corpora/wordnet'
-    ]
-    
-    for resource in required_resources:
-        try:
-            nltk.data.find(resource)
-        except LookupError:
-            print(f"Downloading NLTK resource: {resource}")
-            try:
-                nltk.download(resource.split('/')[-1], quiet=True)
-                print(f"Successfully downloaded {resource.split('/')[-1]}")
-            except Exception as e:
-                print(f"Error downloading {resource}: {e}")
-                print("Some functionality might be limited.")
-
-# Initialize spaCy
-def initialize_spacy():
-    try:
-        return spacy.load("en_core_web_sm")
-    except OSError:
-        print("Downloading spaCy English model...")
-        try:
-            os.system("python -m spacy download en_core_web_sm")
-            return spacy.load("en_core_web_sm")
-        except Exception as e:
-            print(f"Error downloading spaCy model: {e}")
-            print("Text processing capabilities will be limited.")
-            return None
-
-# Initialize resources
-initialize_nltk()
-try:
-    nlp = initialize_spacy()
-    sia = SentimentIntensityAnalyzer()
-    lemmatizer = WordNetLemmatizer()
-except Exception as e:
-    print(f"Error initializing NLP components: {e}")
-    print("Some functionality may be limited.")
-    nlp = None
-    sia = None
-    lemmatizer = None
-
-# Define stop words with dream-specific additions
-try:
-    STOP_WORDS = set(stopwords.words('english'))
-    STOP_WORDS.update(['dream', 'dreams', 'dreamt', 'dreaming', 'saw', 'felt', 'went', 'came', 'seemed', 'appeared'])
-except Exception as e:
-    print(f"Error loading stop words: {e}")
-    STOP_WORDS = set(['dream', 'dreams', 'dreamt', 'dreaming', 'saw', 'felt', 'went', 'came'])
+# NLP models and NLTK data are loaded by the resources module on first use
 
 def preprocess_text(text):
     """Preprocess text by tokenizing, removing stopwords, and lemmatizing."""
     if not isinstance(text, str) or not text.strip():
         return []
     
+    lemmatizer = get_lemmatizer()
     if not lemmatizer:
         return text.lower().split() if text else []
     
     try:
-        tokens = word_tokenize(text.lower())
-        tokens = [token for token in tokens if token.isalpha() and token not in STOP_WORDS]
+        stop_words = get_stop_words()
+        tokens = get_word_tokenizer()(text.lower())
+        tokens = [token for token in tokens if token.isalpha() and token not in stop_words]
         lemmatized_tokens = [lemmatizer.lemmatize(token) for token in tokens]
         return lemmatized_tokens
     except Exception as e:
         print(f"Error preprocessing text: {e}")
         return []
 
-def extract_keywords(text):
-    """Extract important keywords from text using spaCy."""
-    if not nlp or not isinstance(text, str) or not text.strip():
-        return ["analysis", "unavailable"]
-    
-    try:
-        doc = nlp(text)
-        keywords = []
-        for token in doc:
-            if token.pos_ in ["NOUN", "VERB", "ADJ"] and not token.is_stop:
-                lemma = token.lemma_.lower()
-                if len(lemma) > 2 and lemma not in STOP_WORDS:
-                    keywords.append(lemma)
-        
-        for ent in doc.ents:
-            if ent.label_ in ["PERSON", "LOC", "GPE", "FAC"]:
-                keywords.append(ent.text.lower())
-        
-        for chunk in doc.noun_chunks:
-            if len(chunk.text.split()) > 1:
-                keywords.append(chunk.text.lower())
+# High-level dream themes and the keywords that signal them
+DREAM_THEMES = {
+    'adventure': ['travel', 'journey', 'explore', 'discover', 'quest', 'adventure'],
+    'conflict': ['fight', 'argue', 'battle', 'struggle', 'conflict', 'war'],
+    'escape': ['run', 'flee', 'escape', 'avoid', 'hide', 'chase'],
+    'loss': ['lose', 'lost', 'missing', 'gone', 'disappear', 'search'],
+    'transformation': ['change', 'transform', 'grow', 'evolve', 'become', 'metamorphosis'],
+    'relationships': ['friend', 'family', 'love', 'partner', 'relationship', 'connection'],
+    'fear': ['afraid', 'fear', 'terror', 'scary', 'horror', 'nightmare'],
+    'success': ['achieve', 'accomplish', 'win', 'success', 'victory', 'triumph']
+}
+
+class DreamAnalysis:
+    """Analyze a dream once and derive every result from the shared parse.
+
+    The spaCy parse, the NLTK token stream, VADER scores, emotion scores and
+    the symbol scan are each computed at most once, on first use, and reused
+    by every result that needs them.
+    """
+
+    def __init__(self, text, doc=None, polarity=None, emotions=None, symbols=None, results=None):
+        self.text = text if isinstance(text, str) else ""
+        self.is_empty = not self.text.strip()
+        # Set when a model was unavailable or a step failed; such results aren't cached
+        self.degraded = False
         
-        keyword_counts = Counter(keywords)
-        sorted_keywords = sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)
+        # Seed results that were already computed elsewhere, e.g. by nlp.pipe or the cache
+        precomputed = dict(results or {})
+        precomputed.update({'doc': doc, 'polarity': polarity, 'emotions': emotions, 'symbols': symbols})
+        for name, value in precomputed.items():
+            if value is not None:
+                self.__dict__[name] = value
+
+    @cached_property
+    def doc(self):
+        if self.is_empty:
+            return None
+        nlp = get_nlp()
+        if not nlp:
+            return None
+        with timer("spacy_parse"):
+            return nlp(self.text)
+
+    @cached_property
+    def tokens(self):
+        with timer("tokenize"):
+            return preprocess_text(self.text)
+
+    @cached_property
+    def polarity(self):
+        if self.is_empty:
+            return None
+        sia = get_sentiment_analyzer()
+        if not sia:
+            return None
+        with timer("vader"):
+            return sia.polarity_scores(self.text)
+
+    @cached_property
+    def emotions(self):
+        try:
+            return score_emotions(self.tokens)
+        except Exception as e:
+            print(f"Error detecting emotions: {e}")
+            self.degraded = True
+            return score_emotions([])
+
+    @cached_property
+    def symbols(self):
+        if self.is_empty:
+            return {}
+        try:
+            return identify_symbols(self.text)
+        except Exception as e:
+            print(f"Error processing symbols: {e}")
+            self.degraded = True
+            return {}
+
+    @cached_property
+    def keywords(self):
+        if self.is_empty or not get_nlp():
+            self.degraded = True
+            return ["analysis", "unavailable"]
         
-        # Return unique keywords, limit to top 15
-        unique_keywords = list(dict.fromkeys([k[0] for k in sorted_keywords]))
-        return unique_keywords[:15] if unique_keywords else ["no", "keywords", "found"]
-    except Exception as e:
-        print(f"Error extracting keywords: {e}")
-        return ["analysis", "error"]
+        try:
+            doc = self.doc
+            stop_words = get_stop_words()
+            keywords = []
+            for token in doc:
+                if token.pos_ in ["NOUN", "VERB", "ADJ"] and not token.is_stop:
+                    lemma = token.lemma_.lower()
+                    if len(lemma) > 2 and lemma not in stop_words:
+                        keywords.append(lemma)
+            
+            for ent in doc.ents:
+                if ent.label_ in ["PERSON", "LOC", "GPE", "FAC"]:
+                    keywords.append(ent.text.lower())
+            
+            for chunk in doc.noun_chunks:
+                if len(chunk.text.split()) > 1:
+                    keywords.append(chunk.text.lower())
+            
+            keyword_counts = Counter(keywords)
+            sorted_keywords = sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)
+            
+            # Return unique keywords, limit to top 15
+            unique_keywords = list(dict.fromkeys([k[0] for k in sorted_keywords]))
+            return unique_keywords[:15] if unique_keywords else ["no", "keywords", "found"]
+        except Exception as e:
+            print(f"Error extracting keywords: {e}")
+            self.degraded = True
+            return ["analysis", "error"]
 
-def analyze_sentiment(text):
-    """Analyze sentiment of text using VADER."""
-    default_result = {"compound": 0, "pos": 0, "neu": 0, "neg": 0}
-    
-    if not sia or not isinstance(text, str) or not text.strip():
-        return default_result
-    
-    try:
-        scores = sia.polarity_scores(text)
+    @cached_property
+    def sentiment(self):
+        default_result = {"compound": 0, "pos": 0, "neu": 0, "neg": 0}
         
-        if nlp:
-            doc = nlp(text)
-            intensity_words = [token.text for token in doc if token.pos_ == "ADV" and token.dep_ == "advmod"]
-            intensity_score = len(intensity_words) / len(doc) if len(doc) > 0 else 0
-            scores['intensity'] = intensity_score
-        else:
-            scores['intensity'] = 0
+        if self.is_empty or not get_sentiment_analyzer():
+            self.degraded = True
+            return default_result
         
         try:
-            emotions = detect_emotions(text)
+            scores = dict(self.polarity)
+            
+            doc = self.doc
+            if doc is not None:
+                intensity_words = [token.text for token in doc if token.pos_ == "ADV" and token.dep_ == "advmod"]
+                scores['intensity'] = len(intensity_words) / len(doc) if len(doc) > 0 else 0
+            else:
+                scores['intensity'] = 0
+            
+            emotions = self.emotions
             scores['emotions'] = emotions['emotions_str']
             scores['primary_emotion'] = emotions['primary_emotions'][0] if emotions['primary_emotions'] else 'neutral'
+            
+            return scores
         except Exception as e:
-            print(f"Error detecting emotions: {e}")
-            scores['emotions'] = "neutral"
-            scores['primary_emotion'] = "neutral"
-        
-        return scores
-    except Exception as e:
-        print(f"Error analyzing sentiment: {e}")
-        return default_result
+            print(f"Error analyzing sentiment: {e}")
+            self.degraded = True
+            return default_result
 
-def extract_dream_themes(text):
-    """Extract high-level themes from dream text."""
-    if not nlp or not isinstance(text, str) or not text.strip():
-        return ["unknown"]
-    
-    try:
-        keywords = extract_keywords(text)
+    @cached_property
+    def themes(self):
+        if self.is_empty or not get_nlp():
+            self.degraded = True
+            return ["unknown"]
         
         try:
-            symbols = identify_symbols(text)
-            symbol_categories = {}
+            keywords = self.keywords
             
-            for symbol, data in symbols.items():
+            symbol_categories = {}
+            for symbol, data in self.symbols.items():
                 category = data['category']
-                if category in symbol_categories:
-                    symbol_categories[category] += 1
-                else:
-                    symbol_categories[category] = 1
+                symbol_categories[category] = symbol_categories.get(category, 0) + 1
+            
+            matched_themes = []
+            for theme, related_words in DREAM_THEMES.items():
+                if any(keyword in related_words for keyword in keywords):
+                    matched_themes.append(theme)
+            
+            if symbol_categories:
+                top_category = max(symbol_categories.items(), key=lambda x: x[1])[0]
+                if top_category == 'nature' and 'nature' not in matched_themes:
+                    matched_themes.append('nature')
+                elif top_category == 'people' and 'relationships' not in matched_themes:
+                    matched_themes.append('relationships')
+            
+            if not matched_themes and keywords:
+                matched_themes = keywords[:3]
+            
+            return matched_themes if matched_themes else ["unclassified"]
         except Exception as e:
-            print(f"Error processing symbols: {e}")
-            symbol_categories = {}
-        
-        themes = {
-            'adventure': ['travel', 'journey', 'explore', 'discover', 'quest', 'adventure'],
-            'conflict': ['fight', 'argue', 'battle', 'struggle', 'conflict', 'war'],
-            'escape': ['run', 'flee', 'escape', 'avoid', 'hide', 'chase'],
-            'loss': ['lose', 'lost', 'missing', 'gone', 'disappear', 'search'],
-            'transformation': ['change', 'transform', 'grow', 'evolve', 'become', 'metamorphosis'],
-            'relationships': ['friend', 'family', 'love', 'partner', 'relationship', 'connection'],
-            'fear': ['afraid', 'fear', 'terror', 'scary', 'horror', 'nightmare'],
-            'success': ['achieve', 'accomplish', 'win', 'success', 'victory', 'triumph']
+            print(f"Error extracting dream themes: {e}")
+            self.degraded = True
+            return ["unknown"]
+
+    def symbol_analysis(self, personality=None):
+        """Interpret the symbols found in the dream for the given personality."""
+        return interpret_symbols(self.symbols, personality)
+
+    def to_dict(self):
+        """Return every derived result as a plain, picklable dict."""
+        return {
+            'keywords': self.keywords,
+            'themes': self.themes,
+            'sentiment': self.sentiment,
+            'emotions': self.emotions,
+            'symbols': self.symbols
         }
-        
-        matched_themes = []
-        for theme, related_words in themes.items():
-            if any(keyword in related_words for keyword in keywords):
-                matched_themes.append(theme)
-        
-        if symbol_categories:
-            top_category = max(symbol_categories.items(), key=lambda x: x[1])[0]
-            if top_category == 'nature' and 'nature' not in matched_themes:
-                matched_themes.append('nature')
-            elif top_category == 'people' and 'relationships' not in matched_themes:
-                matched_themes.append('relationships')
-        
-        if not matched_themes and keywords:
-            matched_themes = keywords[:3]
-        
-        return matched_themes if matched_themes else ["unclassified"]
+
+# Bump when a change to this module alters analysis results
+ANALYSIS_VERSION = "1"
+
+# Limits of the on-disk analysis cache, matching the response cache
+ANALYSIS_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+ANALYSIS_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+_analysis_cache = None
+_package_versions = None
+
+def _model_versions():
+    """Versions of the packages and models behind the analysis, read without loading them."""
+    global _package_versions
+    if _package_versions is None:
+        versions = []
+        for package in ("spacy", SPACY_MODEL, "nltk"):
+            try:
+                versions.append(f"{package}={metadata.version(package)}")
+            except metadata.PackageNotFoundError:
+                versions.append(f"{package}=missing")
+        _package_versions = ";".join(versions)
+    return _package_versions
+
+def analysis_cache_key(text):
+    """Key a dream by its normalized text and the versions of everything that scores it."""
+    normalized = " ".join(text.split()) if isinstance(text, str) else ""
+    return content_key(normalized, ANALYSIS_VERSION, _model_versions(),
+                       lexicon_fingerprint(), get_symbol_matcher().content_fingerprint)
+
+def get_analysis_cache():
+    """Return the process-wide analysis result cache."""
+    global _analysis_cache
+    if _analysis_cache is None:
+        _analysis_cache = ResultCache(os.path.join(CACHE_DIR, "analysis.sqlite"),
+                                      ttl=ANALYSIS_CACHE_TTL, max_bytes=ANALYSIS_CACHE_MAX_BYTES)
+    return _analysis_cache
+
+def analysis_cache_stats():
+    """Return hit/miss counters of the analysis cache."""
+    return get_analysis_cache().stats()
+
+def analyze_dream(text, use_cache=True):
+    """Return a DreamAnalysis for text, served from the result cache when possible."""
+    if not use_cache or not isinstance(text, str) or not text.strip():
+        return DreamAnalysis(text)
+    
+    cache = get_analysis_cache()
+    key = analysis_cache_key(text)
+    results = cache.get(key)
+    if results is not None:
+        increment("analysis_cache_hits")
+        return DreamAnalysis(text, results=results)
+    increment("analysis_cache_misses")
+    
+    analysis = DreamAnalysis(text)
+    results = analysis.to_dict()
+    if not analysis.degraded:
+        cache.put(key, results)
+    return analysis
+
+def extract_keywords(text):
+    """Extract important keywords from text using spaCy."""
+    return analyze_dream(text).keywords
+
+def analyze_sentiment(text):
+    """Analyze sentiment of text using VADER."""
+    return analyze_dream(text).sentiment
+
+def extract_dream_themes(text):
+    """Extract high-level themes from dream text."""
+    return analyze_dream(text).themes
+
+def _analyze_chunk(texts, batch_size):
+    """Analyze a chunk of dreams in one process, parsing them with nlp.pipe."""
+    nlp = get_nlp()
+    if nlp:
+        try:
+            with timer("spacy_parse_batch"):
+                docs = list(nlp.pipe(texts, batch_size=batch_size))
+        except Exception as e:
+            print(f"Error parsing dream batch: {e}")
+            docs = [None] * len(texts)
+    else:
+        docs = [None] * len(texts)
+    
+    analyses = [DreamAnalysis(text, doc=doc) for text, doc in zip(texts, docs)]
+    
+    # Score the whole chunk's emotions in one vectorized pass
+    try:
+        scores = score_emotions_batch([encode_tokens(analysis.tokens) for analysis in analyses], dtype=np.float64)
+        for analysis, emotions in zip(analyses, emotion_results(scores)):
+            analysis.__dict__.setdefault('emotions', emotions)
     except Exception as e:
-        print(f"Error extracting dream themes: {e}")
-        return ["unknown"]
\ No newline at end of file
+        print(f"Error detecting emotions: {e}")
+    
+    return [analysis.to_dict() for analysis in analyses]
+
+def _iter_chunks(texts, size):
+    chunk = []
+    for text in texts:
+        chunk.append(text if isinstance(text, str) else "")
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_analyze_dreams(texts, n_process=None, batch_size=64):
+    """Analyze dreams from any iterable, yielding result dicts in input order.
+
+    Texts are consumed lazily in chunks of batch_size and at most two chunks
+    per worker are in flight, so memory stays bounded for large inputs.
+    """
+    if n_process is None:
+        n_process = os.cpu_count() or 1
+    
+    if n_process <= 1:
+        for chunk in _iter_chunks(texts, batch_size):
+            yield from _analyze_chunk(chunk, batch_size)
+        return
+    
+    with ProcessPoolExecutor(max_workers=n_process) as executor:
+        pending = deque()
+        for chunk in _iter_chunks(texts, batch_size):
+            pending.append(executor.submit(_analyze_chunk, chunk, batch_size))
+            if len(pending) >= n_process * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def analyze_dreams_batch(texts, n_process=None, batch_size=64):
+    """Analyze many dreams across worker processes.
+
+    Each worker streams its share of the texts through spaCy's nlp.pipe and
+    scores sentiment, emotions and symbols locally. Results are dicts with
+    keywords, themes, sentiment, emotions and symbols, in input order.
+    """
+    texts = list(texts)
+    if n_process is None:
+        n_process = os.cpu_count() or 1
+    # Not worth starting worker processes for a single chunk
+    if len(texts) <= batch_size:
+        n_process = 1
+    return list(iter_analyze_dreams(texts, n_process=n_process, batch_size=batch_size))
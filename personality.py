@@ -1,3 +1,9 @@
+import json
+
+# Traits asked by get_personality_data, and the value assumed when one is missing
+PERSONALITY_TRAITS = ["intuition", "stress", "creativity", "analytical", "emotional", "routine"]
+DEFAULT_TRAIT = 5
+
 def get_personality_data():
     print("Please answer the following questions on a scale from 1 (low) to 10 (high):")
     intuition = input("How much do you rely on intuition for decision-making? ")
@@ -18,6 +24,23 @@ def get_personality_data():
     
     return personality
 
+def load_personality(path):
+    """Read a personality profile from a JSON file of trait scores from 1 to 10.
+
+    Missing traits default to 5; scores outside 1-10 or not numbers raise ValueError.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("personality file must contain a JSON object of trait scores")
+    
+    personality = {trait: DEFAULT_TRAIT for trait in PERSONALITY_TRAITS}
+    for trait, value in data.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 1 <= value <= 10:
+            raise ValueError(f"{trait} must be a number from 1 to 10, got {value!r}")
+        personality[trait] = int(value)
+    return personality
+
 def get_personality_profile(personality):
     profile = "Personality Profile:\n\n"
     
@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import subprocess
+from metrics import observe
+
+# Resources are created on first use and shared by every module in the process
+_resources = {}
+_lock = threading.RLock()
+
+# Seconds spent creating each resource, for startup-time diagnostics
+LOAD_TIMES = {}
+
+SPACY_MODEL = "en_core_web_sm"
+
+# NLTK data packages and where nltk.data.find looks for them
+NLTK_DATA_PATHS = {
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'vader_lexicon': 'sentiment/vader_lexicon.zip',
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet'
+}
+
+DREAM_STOP_WORDS = ['dream', 'dreams', 'dreamt', 'dreaming', 'saw', 'felt', 'went', 'came', 'seemed', 'appeared']
+
+def _get(name, loader):
+    """Return the named resource, creating it with loader exactly once."""
+    if name in _resources:
+        return _resources[name]
+    with _lock:
+        if name not in _resources:
+            start = time.perf_counter()
+            _resources[name] = loader()
+            LOAD_TIMES[name] = time.perf_counter() - start
+            observe(f"load_{name}", LOAD_TIMES[name])
+    return _resources[name]
+
+def ensure_nltk_data(name):
+    """Make sure an NLTK data package is available, downloading it if needed."""
+    def load():
+        import nltk
+        try:
+            nltk.data.find(NLTK_DATA_PATHS.get(name, name))
+            return True
+        except LookupError:
+            print(f"Downloading NLTK resource: {name}")
+            try:
+                return bool(nltk.download(name, quiet=True))
+            except Exception as e:
+                print(f"Error downloading {name}: {e}")
+                print("Some functionality might be limited.")
+                return False
+    return _get(f"nltk:{name}", load)
+
+def get_nlp():
+    """Return the process-wide spaCy pipeline, or None if it can't be loaded."""
+    def load():
+        try:
+            import spacy
+        except ImportError as e:
+            print(f"Error: Required module not found: {e}")
+            return None
+        try:
+            return spacy.load(SPACY_MODEL)
+        except OSError:
+            print("Downloading spaCy English model...")
+            try:
+                subprocess.check_call([sys.executable, "-m", "spacy", "download", SPACY_MODEL])
+                return spacy.load(SPACY_MODEL)
+            except Exception as e:
+                print(f"Error downloading spaCy model: {e}")
+                print("Text processing capabilities will be limited.")
+                return None
+    return _get("spacy", load)
+
+def get_sentiment_analyzer():
+    """Return the VADER sentiment analyzer, or None if it can't be loaded."""
+    def load():
+        ensure_nltk_data('vader_lexicon')
+        try:
+            from nltk.sentiment import SentimentIntensityAnalyzer
+            return SentimentIntensityAnalyzer()
+        except Exception as e:
+            print(f"Error initializing sentiment analyzer: {e}")
+            return None
+    return _get("vader", load)
+
+def get_lemmatizer():
+    """Return the WordNet lemmatizer, or None if it can't be loaded."""
+    def load():
+        ensure_nltk_data('wordnet')
+        try:
+            from nltk.stem import WordNetLemmatizer
+            return WordNetLemmatizer()
+        except Exception as e:
+            print(f"Error initializing lemmatizer: {e}")
+            return None
+    return _get("lemmatizer", load)
+
+def get_word_tokenizer():
+    """Return NLTK's word_tokenize, making sure the punkt models are present."""
+    def load():
+        ensure_nltk_data('punkt')
+        # Recent NLTK releases read the punkt models from punkt_tab
+        ensure_nltk_data('punkt_tab')
+        from nltk.tokenize import word_tokenize
+        return word_tokenize
+    return _get("tokenizer", load)
+
+def get_stop_words():
+    """Return English stop words plus dream-specific ones."""
+    def load():
+        ensure_nltk_data('stopwords')
+        try:
+            from nltk.corpus import stopwords
+            stop_words = set(stopwords.words('english'))
+        except Exception as e:
+            print(f"Error loading stop words: {e}")
+            stop_words = set()
+        stop_words.update(DREAM_STOP_WORDS)
+        return stop_words
+    return _get("stop_words", load)
+
+def measure_startup(modules=("nlp_utils", "emotion_detection", "dream_symbols", "gpt_predictor",
+                             "visualization", "storage")):
+    """Time a cold import of each module, and the first load of each model.
+
+    Every measurement runs in a fresh interpreter so nothing is shared
+    between them. Returns {name: seconds}.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    probes = {f"import {module}": f"import {module}" for module in modules}
+    probes["load spacy"] = "import resources; resources.get_nlp()"
+    probes["load vader"] = "import resources; resources.get_sentiment_analyzer()"
+
+    timings = {}
+    for name, statement in probes.items():
+        code = (f"import time; start = time.perf_counter(); {statement}; "
+                f"print(time.perf_counter() - start)")
+        try:
+            output = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True,
+                                    text=True, check=True).stdout
+            timings[name] = float(output.strip().splitlines()[-1])
+        except (subprocess.CalledProcessError, ValueError, IndexError) as e:
+            print(f"Error measuring {name}: {e}")
+    return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure module import and model load times")
+    parser.add_argument("--max-import", type=float, default=None,
+                        help="Exit with an error if any module import takes longer (seconds)")
+    args = parser.parse_args()
+
+    timings = measure_startup()
+    for name, seconds in timings.items():
+        print(f"{name:<28} {seconds * 1000:9.1f} ms")
+
+    slow = [name for name, seconds in timings.items()
+            if name.startswith("import") and args.max_import is not None and seconds > args.max_import]
+    if slow:
+        print(f"Imports slower than {args.max_import}s: {', '.join(slow)}")
+        sys.exit(1)
@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Directory holding the on-disk cache tiers
+CACHE_DIR = os.environ.get("DREAM_CACHE_DIR", ".dream_cache")
+
+def content_key(*parts):
+    """Hash the given strings into a cache key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class LRUCache:
+    """Bounded in-memory mapping that evicts the least recently used key."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class DiskCache:
+    """String values keyed by string keys in an SQLite file.
+
+    Entries older than ttl seconds are treated as missing. When max_entries
+    or max_bytes is set, the oldest entries are evicted on write to stay
+    within the limit.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=None, max_bytes=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_created_at ON cache(created_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl is not None and time.time() - row[1] > self.ttl:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+        return row[0] if row else None
+
+    def put(self, key, value):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+                         (key, value, time.time()))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        if self.ttl is not None:
+            conn.execute("DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl,))
+        if self.max_entries is not None:
+            conn.execute("""
+                DELETE FROM cache WHERE key IN (
+                    SELECT key FROM cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )""", (self.max_entries,))
+        if self.max_bytes is not None:
+            # Keep the newest entries whose combined size fits in max_bytes
+            conn.execute("""
+                DELETE FROM cache WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(LENGTH(value)) OVER (ORDER BY created_at DESC) AS running
+                        FROM cache
+                    ) WHERE running > ?
+                )""", (self.max_bytes,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+class ResultCache:
+    """Two-tier cache for JSON-serializable results.
+
+    Lookups try a bounded in-memory LRU first, then an optional SQLite file
+    whose entries expire after ttl seconds and are evicted beyond max_bytes.
+    Values are stored as JSON, so every hit returns a fresh copy that callers
+    may modify freely. Hits and misses are counted per tier.
+    """
+
+    def __init__(self, disk_path=None, max_entries=1024, ttl=None, max_bytes=None):
+        self.memory = LRUCache(max_entries)
+        self.disk = None
+        if disk_path:
+            try:
+                self.disk = DiskCache(disk_path, ttl=ttl, max_bytes=max_bytes)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Error opening result cache at {disk_path}, using memory only: {e}")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return json.loads(value)
+
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error as e:
+                print(f"Error reading result cache: {e}")
+                value = None
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.put(key, value)
+                return json.loads(value)
+
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        value = json.dumps(result)
+        self.memory.put(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, value)
+            except sqlite3.Error as e:
+                print(f"Error writing result cache: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the number of entries held in memory."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            'memory_entries': len(self.memory)
+        }
@@ -0,0 +1,110 @@
+import sys
+import numpy as np
+import pandas as pd
+
+# Optional: Arrow list columns are far more compact than Python lists
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Version 1 is the original layout: every column a string, lists comma-joined.
+# Version 2 parses dates, stores sentiment as float32, categories as a pandas
+# categorical and themes/emotions/symbols as list columns (Arrow list<string>
+# when pyarrow is installed, Python lists otherwise).
+SCHEMA_VERSION = 2
+
+LIST_COLUMNS = ["themes", "emotions", "symbols"]
+CATEGORY_COLUMNS = ["category"]
+
+def as_list(value):
+    """Return a history cell as a list of names, whichever schema it came from.
+
+    Lists and arrays are returned as lists; comma-joined strings are split
+    and stripped; missing values become an empty list.
+    """
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(",")] if value else []
+    if isinstance(value, (tuple, np.ndarray)):
+        return list(value)
+    return []
+
+def _parse_list(value):
+    # Interned so that the many repeats of a theme share one string object
+    return [sys.intern(item) for item in as_list(value) if item]
+
+def _list_column(lists, index):
+    if pa is not None and hasattr(pd, "ArrowDtype"):
+        list_type = pa.list_(pa.string())
+        return pd.Series(pa.array(lists, type=list_type), index=index, dtype=pd.ArrowDtype(list_type))
+    return pd.Series(lists, index=index, dtype=object)
+
+def _parse_dates(column):
+    try:
+        return pd.to_datetime(column, errors="coerce", format="mixed")
+    except (TypeError, ValueError):
+        # pandas < 2.0 has no format="mixed" but infers per element
+        return pd.to_datetime(column, errors="coerce")
+
+def is_typed(df):
+    return df.attrs.get("schema_version") == SCHEMA_VERSION
+
+def to_typed(df):
+    """Convert a history frame in the legacy string layout to the typed schema.
+
+    Missing columns are added with typed defaults. Frames that are already
+    typed are returned unchanged.
+    """
+    if is_typed(df):
+        return df
+    df = df.copy()
+    if "date" in df.columns:
+        df["date"] = _parse_dates(df["date"])
+    if "sentiment" in df.columns:
+        df["sentiment"] = pd.to_numeric(df["sentiment"], errors="coerce").astype("float32")
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].where(df[col].notna() & (df[col] != ""), None).astype("category")
+    for col in LIST_COLUMNS:
+        if col in df.columns:
+            df[col] = _list_column([_parse_list(value) for value in df[col]], df.index)
+    df.attrs["schema_version"] = SCHEMA_VERSION
+    return df
+
+def _format_date(value):
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        value = pd.Timestamp(value)
+        if pd.isna(value):
+            return None
+        # Dreams saved from the CLI carry a time of day; the app only a date
+        if value == value.normalize():
+            return value.strftime("%Y-%m-%d")
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+def to_legacy(df):
+    """Convert a typed (or mixed) history frame to the string layout the stores persist."""
+    df = df.copy()
+    if "date" in df.columns:
+        df["date"] = pd.Series([_format_date(value) for value in df["date"]], index=df.index, dtype=object)
+    if "sentiment" in df.columns:
+        df["sentiment"] = pd.to_numeric(df["sentiment"], errors="coerce").astype("float64")
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(object)
+    for col in LIST_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.Series([", ".join(value) if isinstance(value, (list, tuple, np.ndarray)) else value
+                                 for value in df[col]], index=df.index, dtype=object)
+    df.attrs.pop("schema_version", None)
+    return df
+
+def load_history(store, columns=None):
+    """Load the dream history from store in the typed schema."""
+    return to_typed(store.load(columns=columns))
+
+def query_history(store, start_date=None, end_date=None, category=None, columns=None):
+    """Query the store and return the matching dreams in the typed schema."""
+    return to_typed(store.query(start_date=start_date, end_date=end_date, category=category, columns=columns))
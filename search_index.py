@@ -0,0 +1,248 @@
+import re
+import sys
+import math
+import hashlib
+from array import array
+
+import numpy as np
+
+from nlp_utils import preprocess_text
+from metrics import timed
+from storage import DEFAULT_STORE_PATH, sidecar_path
+from dream_index import DreamTextIndex
+
+# Suffix of the persisted search index, kept next to the dream log it indexes
+SEARCH_INDEX_SUFFIX = ".search_index.jsonl"
+
+# BM25 term frequency saturation and document length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Quoted phrases or single words
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+# Positions are packed with their document into one integer for phrase matching
+POSITION_BITS = 20
+
+_search_index = None
+
+def search_index_path(store_path):
+    """Where the search index of the dream log at store_path is kept."""
+    return sidecar_path(store_path, SEARCH_INDEX_SUFFIX)
+
+def _to_numpy(values, dtype):
+    # A copy, so no view keeps the growing array's buffer exported
+    return np.frombuffer(values, dtype=dtype).copy()
+
+def _tokenizer_fingerprint():
+    # Identifies how preprocess_text currently tokenizes, which depends on the
+    # NLTK data available; tokens from one setup are useless to queries made
+    # in another, so a change rebuilds the index
+    tokens = preprocess_text("The wolves were running through dark forests")
+    return hashlib.sha1(" ".join(tokens).encode("utf-8")).hexdigest()[:16]
+
+def parse_query(query):
+    """Split a query into its terms and its quoted phrases, preprocessed like the dreams.
+
+    Returns (terms, phrases): the unique terms to rank by, and one term list
+    per phrase of two or more terms, which results must contain in order.
+    """
+    terms, phrases = [], []
+    for phrase, word in QUERY_PATTERN.findall(query or ""):
+        tokens = preprocess_text(phrase if phrase else word)
+        if len(tokens) > 1 and phrase:
+            phrases.append(tokens)
+        terms.extend(token for token in tokens if token not in terms)
+    return terms, phrases
+
+class _Postings:
+    """Documents containing one term, with the term's positions in each."""
+
+    __slots__ = ("docs", "offsets", "positions")
+
+    def __init__(self):
+        self.docs = array("i")
+        self.offsets = array("q", [0])
+        self.positions = array("i")
+
+    def add(self, doc, positions):
+        self.docs.append(doc)
+        self.positions.extend(positions)
+        self.offsets.append(len(self.positions))
+
+class SearchIndex(DreamTextIndex):
+    """Persisted positional inverted index over the dream texts, ranked with BM25.
+
+    Dreams are tokenized by nlp_utils.preprocess_text; each term keeps the
+    dreams it occurs in and its positions there, so quoted phrases can be
+    matched. The file is a DreamTextIndex, like the symbol index: a header
+    naming the tokenizer, then the tokens of one dream per line, and dreams
+    are identified by their position in the history. The index is rebuilt
+    if the history no longer extends it or the tokenizer changed.
+
+    An index with a path describes one dream log, read in full; see
+    get_search_index. Like the timeline, it records the store version it
+    describes: record_dreams folds new dreams in, and sync() only re-reads
+    the store when it changed without the index, so queries never scan
+    the history. With path None it is kept in memory only, e.g. for
+    sync_history over a filtered frame.
+    """
+
+    NAME = "search index"
+    HEADER_KEY = "tokenizer"
+    ROW_KEY = "tokens"
+
+    def current_signature(self):
+        return _tokenizer_fingerprint()
+
+    def index_text(self, dream_text):
+        return preprocess_text(dream_text)
+
+    def _clear(self):
+        super()._clear()
+        # Unknown until the next sync, e.g. after another process rewrote the file
+        self.store_version = None
+        self.lengths = array("i")
+        self.total_length = 0
+        self.postings = {}
+
+    def _add_row(self, text_hash, tokens):
+        # Interned so that the many repeats of a term share one string object
+        tokens = [sys.intern(token) for token in tokens]
+        doc = len(self.hashes)
+        super()._add_row(text_hash, tokens)
+        self.lengths.append(len(tokens))
+        self.total_length += len(tokens)
+
+        positions = {}
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, []).append(position)
+        for term, term_positions in positions.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _Postings()
+            postings.add(doc, term_positions)
+
+    def add_entries(self, entries, store_version=None):
+        """Index newly stored entries (dicts keyed by history column)."""
+        with self._lock:
+            self.add_dreams([entry.get('dream') for entry in entries])
+            self.store_version = store_version
+
+    def rebuild(self, store):
+        """Bring the index in line with the store's dreams, indexing only new ones when it can."""
+        with self._lock:
+            store_version = store.version()
+            self.sync_history(store.load(columns=["dream"]))
+            self.store_version = store_version
+
+    def reset(self, store_version=None):
+        """Empty the index, e.g. when the dream history is cleared."""
+        with self._lock:
+            super().reset()
+            self.store_version = store_version
+
+    @timed("search_index_sync")
+    def sync(self, store):
+        """Re-read the store if it changed without the index."""
+        with self._lock:
+            if self.store_version is None or self.store_version != store.version():
+                self.rebuild(store)
+        return self
+
+    def _phrase_counts(self, phrase):
+        """Return (docs, occurrences) of a phrase, from the terms' packed positions."""
+        matches = None
+        for offset, term in enumerate(phrase):
+            postings = self.postings.get(term)
+            if postings is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+            docs = _to_numpy(postings.docs, np.int32).astype(np.int64)
+            counts = np.diff(_to_numpy(postings.offsets, np.int64))
+            positions = _to_numpy(postings.positions, np.int32).astype(np.int64)
+            # Where the phrase would start for this occurrence of its offset-th term
+            keys = (np.repeat(docs, counts) << POSITION_BITS) + positions - offset
+            matches = keys if matches is None else np.intersect1d(matches, keys, assume_unique=True)
+        docs, occurrences = np.unique(matches >> POSITION_BITS, return_counts=True)
+        return docs, occurrences
+
+    @timed("search")
+    def search(self, query, k=10):
+        """Return the k dreams that best match query, best first, as (position, score) pairs.
+
+        Dreams are ranked with BM25 over the query terms; every quoted
+        phrase must appear in a result, and its occurrences add to the score
+        as a term of its own would.
+        """
+        terms, phrases = parse_query(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            n = len(self.hashes)
+            if n == 0:
+                return []
+            lengths = _to_numpy(self.lengths, np.int32)
+            average_length = self.total_length / n or 1.0
+            norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length)
+
+            def bm25(docs, frequencies):
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                return idf * frequencies * (BM25_K1 + 1) / (frequencies + norms[docs])
+
+            scores = np.zeros(n)
+            for term in terms:
+                postings = self.postings.get(term)
+                if postings is None:
+                    continue
+                docs = _to_numpy(postings.docs, np.int32)
+                frequencies = np.diff(_to_numpy(postings.offsets, np.int64))
+                scores[docs] += bm25(docs, frequencies)
+
+            matched = scores > 0
+            for phrase in phrases:
+                docs, occurrences = self._phrase_counts(phrase)
+                in_phrase = np.zeros(n, dtype=bool)
+                in_phrase[docs] = True
+                matched &= in_phrase
+                if len(docs):
+                    scores[docs] += bm25(docs, occurrences)
+
+        candidates = np.flatnonzero(matched)
+        if len(candidates) > k:
+            # Everything scoring at least the k-th best, so ties at the cut are kept
+            threshold = np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k]
+            candidates = candidates[scores[candidates] >= threshold]
+        # Ties go to the earlier dream
+        ranked = sorted(candidates, key=lambda doc: (-scores[doc], doc))[:k]
+        return [(int(doc), float(scores[doc])) for doc in ranked]
+
+def get_search_index(store=None):
+    """Return the process-wide search index of store, synced with it, loading it on first use.
+
+    Without a store, the index of the default dream log (DREAM_STORE), unsynced.
+    """
+    global _search_index
+    path = search_index_path(store.path if store is not None else DEFAULT_STORE_PATH)
+    if _search_index is None or _search_index.path != path:
+        _search_index = SearchIndex(path)
+    if store is not None:
+        _search_index.sync(store)
+    return _search_index
+
+def search_dreams(dream_history, query, k=10, index=None):
+    """Search dream_history for query; returns the matching rows, best first, with a 'score' column.
+
+    index is the store's index (get_search_index) when dream_history is the
+    store's full history, and is used as is; other frames are indexed in
+    memory.
+    """
+    if index is None:
+        index = SearchIndex()
+        index.sync_history(dream_history)
+    results = index.search(query, k)
+    # The history may lag the index if another process appended meanwhile
+    results = [(position, score) for position, score in results if position < len(dream_history)]
+    matches = dream_history.iloc[[position for position, _ in results]].copy()
+    matches['score'] = [score for _, score in results]
+    return matches
@@ -0,0 +1,357 @@
+import os
+import sys
+import json
+import math
+import time
+import signal
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from nlp_utils import analyze_dream, iter_analyze_dreams
+from resources import get_nlp, get_sentiment_analyzer, get_lemmatizer, get_stop_words, get_word_tokenizer
+from gpt_predictor import predict_future_impact, initialize_model, GOOGLE_API_KEY
+from batch import build_result, add_predictions
+from storage import open_store
+from aggregates import get_aggregates
+from metrics import timer, increment, export_prometheus
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Where the CLI looks for a running service
+SERVICE_URL = os.environ.get("DREAM_SERVICE_URL", f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE = 32  # requests allowed to wait for a worker before new ones get 503
+REQUEST_TIMEOUT = 60.0  # seconds a request may wait for its result
+MAX_BODY_BYTES = 16 * 1024 * 1024
+MAX_BATCH = 1000
+
+DEFAULT_PERSONALITY = {"intuition": 5, "stress": 5, "creativity": 5, "analytical": 5}
+
+class ServiceError(Exception):
+    """An error answered with the given HTTP status."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+def _personality(payload):
+    personality = payload.get('personality') or DEFAULT_PERSONALITY
+    if not isinstance(personality, dict):
+        raise ServiceError(400, "personality must be an object of trait scores")
+    return personality
+
+def _dream(payload, field="dream"):
+    text = payload.get(field)
+    if not isinstance(text, str) or not text.strip():
+        raise ServiceError(400, f"'{field}' must be a non-empty string")
+    return text
+
+class AnalysisService:
+    """The analysis pipeline, loaded once and shared by every request.
+
+    Work runs on a pool of worker threads. At most workers + queue_size
+    requests are admitted at a time, each counting until its work ends,
+    even after the request timed out; beyond that requests are refused
+    with 503 so callers back off instead of piling up. close() stops admitting
+    requests and waits for the admitted ones to finish.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE, timeout=REQUEST_TIMEOUT):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dream-worker")
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._history_lock = threading.Lock()
+        self.in_flight = 0
+        self.draining = False
+        self.started = time.time()
+        self.store = open_store()
+
+    def preload(self):
+        """Load the models and warm the pipeline so the first request is fast."""
+        with timer("service_preload"):
+            get_nlp()
+            get_sentiment_analyzer()
+            get_lemmatizer()
+            get_stop_words()
+            get_word_tokenizer()
+            if GOOGLE_API_KEY and GOOGLE_API_KEY != "YOUR_API_KEY_HERE":
+                initialize_model()
+            analyze_dream("I dreamt I was flying over calm water.", use_cache=False).to_dict()
+
+    def submit(self, function, *args):
+        """Run function on the pool and return its result, or raise ServiceError."""
+        if self.draining:
+            raise ServiceError(503, "service is shutting down")
+        if not self._slots.acquire(blocking=False):
+            increment("service_rejected")
+            raise ServiceError(503, "service is busy, retry shortly", {"Retry-After": "1"})
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self.executor.submit(function, *args)
+        except RuntimeError:
+            self._release()
+            raise ServiceError(503, "service is shutting down")
+        # The slot is held until the work itself ends, not just the wait for
+        # it: a timed-out request still occupies its worker
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Only stops work that has not started yet
+            future.cancel()
+            raise ServiceError(504, f"request took longer than {self.timeout:g} seconds")
+
+    def _release(self, future=None):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def status(self):
+        return {
+            'status': "draining" if self.draining else "ok",
+            'uptime': time.time() - self.started,
+            'workers': self.workers,
+            'capacity': self.capacity,
+            'in_flight': self.in_flight
+        }
+
+    def analyze(self, payload):
+        text = _dream(payload)
+        personality = payload.get('personality')
+        with timer("service_analyze"):
+            return build_result(payload, analyze_dream(text).to_dict(), personality)
+
+    def analyze_batch(self, payload):
+        dreams = payload.get('dreams')
+        if not isinstance(dreams, list) or not dreams:
+            raise ServiceError(400, "'dreams' must be a non-empty list")
+        if len(dreams) > MAX_BATCH:
+            raise ServiceError(413, f"at most {MAX_BATCH} dreams per batch")
+        records = [dict(dream) if isinstance(dream, dict) else {'dream': dream} for dream in dreams]
+        for i, record in enumerate(records):
+            record.setdefault('id', i)
+            _dream(record)
+        personality = payload.get('personality')
+
+        with timer("service_analyze_batch"):
+            # Models are already loaded here, so the batch runs in this worker
+            analyses = iter_analyze_dreams([record['dream'] for record in records], n_process=1)
+            results = [build_result(record, analysis, personality) for record, analysis in zip(records, analyses)]
+            if payload.get('predict'):
+                add_predictions(results, _personality(payload))
+        return {'results': results}
+
+    def predict(self, payload):
+        personality = _personality(payload)
+        dream_text = payload.get('dream')
+        themes = payload.get('dream_themes')
+        sentiment = payload.get('sentiment')
+        if themes is None or sentiment is None:
+            analysis = analyze_dream(_dream(payload))
+            themes = analysis.themes if themes is None else themes
+            sentiment = analysis.sentiment.get('compound', 0) if sentiment is None else sentiment
+        with timer("service_predict"):
+            prediction = predict_future_impact(themes, float(sentiment), personality, dream_text=dream_text,
+                                               emotions=payload.get('emotions'), symbols=payload.get('symbols'),
+                                               similar_dreams=payload.get('similar_dreams'))
+        return {'prediction': prediction}
+
+    def history_stats(self, payload=None):
+        with self._history_lock:
+            aggregates = get_aggregates(self.store)
+            dates, daily = aggregates.daily_sentiment()
+            sentiment_mean = aggregates.sentiment_mean()
+            return {
+                'dreams': aggregates.total,
+                'sentiment_mean': None if math.isnan(sentiment_mean) else sentiment_mean,
+                'top_emotions': aggregates.emotion_counts.most_common(5),
+                'top_themes': aggregates.theme_counts.most_common(5),
+                'categories': dict(aggregates.category_counts),
+                'top_category': aggregates.top_category(),
+                'recent_sentiments': aggregates.recent_sentiments(5),
+                'first_date': dates[0] if dates else None,
+                'last_date': dates[-1] if dates else None
+            }
+
+    def close(self):
+        """Refuse new requests and wait for the admitted ones to finish."""
+        self.draining = True
+        self.executor.shutdown(wait=True)
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "DreamAnalysis/1.0"
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = {
+        ("POST", "/analyze"): "analyze",
+        ("POST", "/analyze/batch"): "analyze_batch",
+        ("POST", "/predict"): "predict",
+        ("GET", "/history/stats"): "history_stats",
+    }
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        service = self.server.service
+        path = self.path.split("?", 1)[0].rstrip("/") or "/"
+        start = time.perf_counter()
+        try:
+            if method == "GET" and path == "/health":
+                return self._send(200, service.status())
+            if method == "GET" and path == "/metrics":
+                return self._send(200, export_prometheus(), content_type="text/plain; version=0.0.4")
+            name = self.ROUTES.get((method, path))
+            if name is None:
+                raise ServiceError(404, f"no route for {method} {path}")
+            payload = self._read_json() if method == "POST" else {}
+            self._send(200, service.submit(getattr(service, name), payload))
+        except ServiceError as e:
+            self._send(e.status, {'error': str(e)}, headers=e.headers)
+        except Exception as e:
+            print(f"Error handling {method} {path}: {type(e).__name__}: {e}", file=sys.stderr)
+            self._send(500, {'error': f"{type(e).__name__}: {e}"})
+        finally:
+            increment(f"service_requests_{path.strip('/').replace('/', '_') or 'root'}")
+            if self.server.verbose:
+                print(f"{method} {path} {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            raise ServiceError(400, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise ServiceError(413, "request body too large")
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            raise ServiceError(400, f"invalid JSON: {e}")
+        if not isinstance(payload, dict):
+            raise ServiceError(400, "request body must be a JSON object")
+        return payload
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        data = (body if isinstance(body, str) else json.dumps(body, default=str)).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Requests are logged by _dispatch when verbose
+        pass
+
+class AnalysisServer(ThreadingHTTPServer):
+    """HTTP front end of an AnalysisService; handler threads wait on the service's pool."""
+
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, address, service, verbose=False):
+        super().__init__(address, _Handler)
+        self.service = service
+        self.verbose = verbose
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE,
+          timeout=REQUEST_TIMEOUT, verbose=False):
+    """Run the service until SIGINT or SIGTERM, then drain in-flight requests and exit."""
+    service = AnalysisService(workers, queue_size, timeout)
+    print("Loading analysis models...", file=sys.stderr)
+    start = time.perf_counter()
+    service.preload()
+    print(f"Models loaded in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    server = AnalysisServer((host, port), service, verbose)
+
+    def stop(signum, frame):
+        print("Shutting down, finishing in-flight requests...", file=sys.stderr)
+        service.draining = True
+        # shutdown() waits for serve_forever, so it can't run on the serving thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"Dream analysis service listening on http://{host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
+    print("Service stopped.", file=sys.stderr)
+
+class ServiceClient:
+    """Minimal JSON client for a running analysis service."""
+
+    def __init__(self, url=SERVICE_URL, timeout=REQUEST_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path, payload=None, timeout=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method="POST" if data else "GET",
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', e.reason)
+            except ValueError:
+                message = e.reason
+            raise ServiceError(e.code, message)
+
+    def is_available(self, timeout=0.25):
+        """Whether a service answers at self.url; never raises."""
+        try:
+            return self._request("/health", timeout=timeout).get('status') == "ok"
+        except (OSError, ValueError, ServiceError):
+            return False
+
+    def analyze(self, dream, personality=None):
+        return self._request("/analyze", {'dream': dream, 'personality': personality})
+
+    def analyze_batch(self, dreams, personality=None, predict=False):
+        return self._request("/analyze/batch", {'dreams': dreams, 'personality': personality,
+                                                'predict': predict})['results']
+
+    def predict(self, **request):
+        return self._request("/predict", request)['prediction']
+
+    def history_stats(self):
+        return self._request("/history/stats")
+
+def find_service(url=None):
+    """Return a ServiceClient for a running service, or None if none answers."""
+    client = ServiceClient(url or SERVICE_URL)
+    return client if client.is_available() else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve dream analysis over HTTP/JSON with preloaded models")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Requests processed at once")
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE,
+                        help="Requests allowed to wait for a worker before new ones are refused with 503")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="Seconds before a request gets 504")
+    parser.add_argument("--verbose", action="store_true", help="Log every request with its latency")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.queue, args.timeout, args.verbose)
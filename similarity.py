@@ -0,0 +1,278 @@
+import zlib
+import threading
+import numpy as np
+import pandas as pd
+
+from schema import as_list, load_history
+from emotion_detection import EMOTION_LEXICON
+from metrics import timed
+
+# Buckets that keywords and symbols are hashed into
+HASH_DIM = 512
+
+# Core emotions, each with a dimension of its own after the hashed terms
+EMOTIONS = sorted(set(EMOTION_LEXICON.values()))
+
+# Share of the similarity carried by keywords and symbols; emotions carry the rest
+TERM_WEIGHT = 0.75
+
+# IDF weights are recomputed once the history has grown by this fraction
+IDF_REFRESH = 0.1
+
+# Histories at least this large are searched with the approximate index by default
+APPROXIMATE_MIN_SIZE = 50000
+
+# Approximate searches score every dream on a random projection of its vector
+# to SKETCH_DIM dimensions, then rerank the best RERANK_CANDIDATES exactly
+SKETCH_DIM = 128
+RERANK_CANDIDATES = 2000
+
+# Past dreams less similar than this are not worth showing
+MIN_SIMILARITY = 0.2
+
+_similarity_index = None
+
+def hash_terms(keywords, symbols):
+    """Return {bucket: count} for a dream's keywords and symbols."""
+    counts = {}
+    for prefix, values in (("k", keywords), ("s", symbols)):
+        for value in values or []:
+            if not isinstance(value, str) or not value.strip():
+                continue
+            # crc32 rather than hash(), which changes between processes
+            bucket = zlib.crc32(f"{prefix}:{value.strip().lower()}".encode("utf-8")) % HASH_DIM
+            counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+def emotion_vector(emotions):
+    """Return the emotion part of a dream vector, from emotion names or {emotion: score}."""
+    vector = np.zeros(len(EMOTIONS), dtype=np.float32)
+    scores = emotions if isinstance(emotions, dict) else {emotion: 1.0 for emotion in as_list(emotions)}
+    for emotion, score in scores.items():
+        if emotion in EMOTIONS and score > 0:
+            vector[EMOTIONS.index(emotion)] = score
+    return vector
+
+def _append_rows(array, start, rows):
+    """Write rows at position start of array, growing it geometrically when full.
+
+    Growing by doubling means a run of single inserts copies the array rarely.
+    """
+    end = start + len(rows)
+    if len(array) < end:
+        grown = np.zeros((max(end, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+        grown[:start] = array[:start]
+        array = grown
+    array[start:end] = rows
+    return array
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+class SimilarityIndex:
+    """Unit-length dream vectors in a NumPy matrix, for top-k cosine search.
+
+    A dream's vector is the hashed TF-IDF of its keywords (the history's
+    "themes") and symbols, concatenated with its emotions. Each part is
+    normalized and weighted by TERM_WEIGHT before the whole is normalized.
+    Searches are one matrix-vector product, or, for large histories, an
+    exact rerank of the best candidates on a random projection (sketch) of
+    the matrix, a quarter of its size.
+
+    Inserts only vectorize the new dreams, with the current IDF weights;
+    those are recomputed, and every vector with them, once the history
+    grows by IDF_REFRESH. Like the timeline, the index records the store
+    version it describes and sync() rebuilds it if the store changed
+    without it. Rows are dreams in history order.
+    """
+
+    def __init__(self, history=None):
+        self._lock = threading.RLock()
+        self.store_version = None
+        self._projection_matrix = None
+        self._clear()
+        if history is not None:
+            self._insert(history)
+
+    def _clear(self):
+        self.size = 0
+        self._terms = []
+        self._emotions = np.zeros((0, len(EMOTIONS)), dtype=np.float32)
+        self._document_frequency = np.zeros(HASH_DIM)
+        self._idf = np.ones(HASH_DIM)
+        self._idf_size = 0
+        self._matrix = np.zeros((0, HASH_DIM + len(EMOTIONS)), dtype=np.float32)
+        self._sketch = None
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def matrix(self):
+        return self._matrix[:self.size]
+
+    def _vectors(self, terms, emotions):
+        """Vectorize dreams from their hashed terms and emotion vectors, with the current IDF."""
+        tfidf = np.zeros((len(terms), HASH_DIM), dtype=np.float32)
+        for row, counts in enumerate(terms):
+            if counts:
+                buckets = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                tfidf[row, buckets] = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        tfidf *= self._idf.astype(np.float32)
+        vectors = np.hstack([_normalize_rows(tfidf) * np.sqrt(TERM_WEIGHT),
+                             _normalize_rows(emotions) * np.sqrt(1 - TERM_WEIGHT)])
+        return _normalize_rows(vectors)
+
+    def _refresh(self):
+        # Smoothed IDF, as in scikit-learn's TfidfTransformer
+        self._idf = np.log((1 + self.size) / (1 + self._document_frequency)) + 1
+        self._idf_size = self.size
+        self._matrix = self._vectors(self._terms, self._emotions[:self.size])
+        self._sketch = None
+
+    def _insert(self, entries):
+        entries = pd.DataFrame(entries)
+        if len(entries) == 0:
+            return
+        terms = [hash_terms(as_list(keywords), as_list(symbols)) for keywords, symbols in zip(
+            entries['themes'] if 'themes' in entries.columns else [None] * len(entries),
+            entries['symbols'] if 'symbols' in entries.columns else [None] * len(entries))]
+        emotions = np.array([emotion_vector(value) for value in (
+            entries['emotions'] if 'emotions' in entries.columns else [None] * len(entries))],
+            dtype=np.float32).reshape(len(entries), len(EMOTIONS))
+
+        with self._lock:
+            for counts in terms:
+                self._document_frequency[list(counts)] += 1
+            self._terms.extend(terms)
+            start = self.size
+            self._emotions = _append_rows(self._emotions, start, emotions)
+            self.size += len(terms)
+
+            if self.size >= self._idf_size * (1 + IDF_REFRESH):
+                self._refresh()
+                return
+
+            vectors = self._vectors(terms, emotions)
+            self._matrix = _append_rows(self._matrix, start, vectors)
+            if self._sketch is not None:
+                self._sketch = _append_rows(self._sketch, start, vectors @ self._projection())
+
+    def _projection(self):
+        if self._projection_matrix is None:
+            # Fixed seed, so the sketch and the queries are projected alike
+            projection = np.random.default_rng(0).standard_normal((self._matrix.shape[1], SKETCH_DIM))
+            self._projection_matrix = (projection / np.sqrt(SKETCH_DIM)).astype(np.float32)
+        return self._projection_matrix
+
+    def add_entries(self, entries, store_version=None):
+        """Fold newly stored entries (dicts keyed by history column) into the index."""
+        with self._lock:
+            self._insert(list(entries))
+            self.store_version = store_version
+
+    def rebuild(self, store):
+        """Re-vectorize every dream in the store."""
+        with self._lock:
+            store_version = store.version()
+            self._clear()
+            self._insert(store.load(columns=["themes", "emotions", "symbols"]))
+            self.store_version = store_version
+
+    def reset(self, store_version=None):
+        """Empty the index, e.g. when the dream history is cleared."""
+        with self._lock:
+            self._clear()
+            self.store_version = store_version
+
+    def sync(self, store):
+        """Rebuild the index if the store changed without it."""
+        with self._lock:
+            if self.store_version is None or self.store_version != store.version():
+                self.rebuild(store)
+        return self
+
+    def vectorize(self, keywords, symbols=None, emotions=None):
+        """Return the vector of a dream that is not in the index, e.g. one just analyzed."""
+        with self._lock:
+            return self._vectors([hash_terms(keywords, symbols)], emotion_vector(emotions or [])[None, :])[0]
+
+    @timed("similarity_search")
+    def search(self, vector, k=5, approximate=None, exclude=()):
+        """Return the k most similar dreams as (position, cosine similarity) pairs, best first.
+
+        approximate defaults to True for histories of APPROXIMATE_MIN_SIZE
+        dreams or more; its results are exact similarities, but a true
+        neighbour is occasionally missed. exclude lists positions to skip.
+        """
+        with self._lock:
+            if self.size == 0 or not vector.any():
+                return []
+            if approximate is None:
+                approximate = self.size >= APPROXIMATE_MIN_SIZE
+            n_candidates = max(RERANK_CANDIDATES, 10 * (k + len(exclude)))
+
+            if approximate and self.size > n_candidates:
+                if self._sketch is None:
+                    self._sketch = self.matrix @ self._projection()
+                estimates = self._sketch[:self.size] @ (vector @ self._projection())
+                candidates = np.argpartition(-estimates, n_candidates - 1)[:n_candidates]
+                scores = self._matrix[candidates] @ vector
+            else:
+                candidates = np.arange(self.size)
+                scores = self.matrix @ vector
+
+        if len(exclude):
+            keep = ~np.isin(candidates, list(exclude))
+            candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > k:
+            # Everything scoring at least the k-th best, so ties at the cut are kept
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            keep = scores >= threshold
+            candidates, scores = candidates[keep], scores[keep]
+        # Ties go to the earlier dream
+        order = np.lexsort((candidates, -scores))[:k]
+        return [(int(candidates[i]), float(scores[i])) for i in order]
+
+def get_similarity_index(store=None):
+    """Return the process-wide similarity index, synced with store when one is given."""
+    global _similarity_index
+    if _similarity_index is None:
+        _similarity_index = SimilarityIndex()
+    if store is not None:
+        _similarity_index.sync(store)
+    return _similarity_index
+
+def find_similar_dreams(store, keywords, symbols=None, emotions=None, k=3, history=None,
+                        min_similarity=MIN_SIMILARITY):
+    """Return the past dreams most like a newly analyzed one, best first, with a 'similarity' column.
+
+    history is the store's dream history, in its order; it is loaded when
+    not given. Dreams less similar than min_similarity are left out.
+    """
+    index = get_similarity_index(store)
+    results = index.search(index.vectorize(keywords, symbols, emotions), k)
+    results = [(position, score) for position, score in results if score >= min_similarity]
+    if history is None:
+        history = load_history(store, columns=["date", "dream", "themes", "sentiment", "category"])
+    # The history may lag the index if another process appended meanwhile
+    results = [(position, score) for position, score in results if position < len(history)]
+    similar = history.iloc[[position for position, _ in results]].copy()
+    similar['similarity'] = [score for _, score in results]
+    return similar
+
+def prediction_context(similar_dreams, excerpt_length=160):
+    """Summarize similar past dreams as JSON-ready dicts for the prediction prompt."""
+    context = []
+    for _, row in similar_dreams.iterrows():
+        date = pd.Timestamp(row['date']) if pd.notna(row.get('date')) else None
+        dream = row.get('dream') if isinstance(row.get('dream'), str) else ""
+        context.append({
+            'date': date.strftime("%Y-%m-%d") if date is not None else None,
+            'themes': list(as_list(row.get('themes')))[:5],
+            'sentiment': None if pd.isna(row.get('sentiment')) else round(float(row.get('sentiment')), 3),
+            'excerpt': dream if len(dream) <= excerpt_length else dream[:excerpt_length - 3] + "...",
+            'similarity': round(float(row['similarity']), 3)
+        })
+    return context
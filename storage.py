@@ -0,0 +1,582 @@
+import os
+import sys
+import glob
+import json
+import time
+import sqlite3
+import tempfile
+import datetime
+import argparse
+from contextlib import contextmanager
+import pandas as pd
+from schema import to_legacy
+from metrics import timed
+
+# Optional columnar backend
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+HISTORY_COLUMNS = ["date", "dream", "themes", "sentiment", "category", "emotions", "symbols"]
+
+# Everything but the dream text, which is all most analytics pages need
+SUMMARY_COLUMNS = [col for col in HISTORY_COLUMNS if col != "dream"]
+
+# Where the dream log lives; a .db/.sqlite path selects the SQLite backend
+DEFAULT_STORE_PATH = os.environ.get("DREAM_STORE", "dream_log.csv")
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+PARQUET_EXTENSIONS = (".parquet",)
+
+# Rows per chunk when the log is read in pieces with iter_chunks
+DEFAULT_CHUNKSIZE = 10000
+
+def _ensure_columns(df, columns=None):
+    """Add any missing history columns with blank defaults."""
+    for col in columns or HISTORY_COLUMNS:
+        if col not in df.columns:
+            df[col] = "" if col != "sentiment" else 0.0
+    return df
+
+def _day_bounds(start_date=None, end_date=None):
+    """Turn inclusive start/end days into [start, end) date strings."""
+    start = end = None
+    if start_date is not None:
+        start = pd.Timestamp(start_date).strftime("%Y-%m-%d")
+    if end_date is not None:
+        end = (pd.Timestamp(end_date) + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+    return start, end
+
+def _entries_frame(entries):
+    # Entries may use the typed schema (lists, timestamps); the stores persist strings
+    df = to_legacy(pd.DataFrame(list(entries)))
+    for col in HISTORY_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    return df[HISTORY_COLUMNS]
+
+class DreamStore:
+    """Interface shared by the dream log storage backends."""
+
+    def load(self, columns=None):
+        """Return the dream history as a DataFrame, optionally only some columns."""
+        raise NotImplementedError
+
+    def iter_chunks(self, columns=None, chunksize=DEFAULT_CHUNKSIZE):
+        """Yield the dream history as DataFrames of at most chunksize rows, in order.
+
+        Backends override this to read one chunk at a time, so a pass over
+        the whole log never holds more than a chunk in memory.
+        """
+        df = self.load(columns)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+    def append_many(self, entries):
+        """Append dream entries (dicts keyed by HISTORY_COLUMNS) in one write.
+
+        Returns (before, after): the store version just before and just
+        after this write. before is None when the store cannot tell that
+        nothing else changed it in between, e.g. another process appending
+        at the same moment; views derived from the store then rebuild
+        rather than add the entries to a version they never saw.
+        """
+        raise NotImplementedError
+
+    def append(self, entry):
+        """Append a single dream entry; returns the versions like append_many."""
+        return self.append_many([entry])
+
+    def clear(self):
+        """Delete every dream in the log."""
+        raise NotImplementedError
+
+    @timed("store_query")
+    def query(self, start_date=None, end_date=None, category=None, columns=None):
+        """Return dreams between two days (inclusive) and in a category."""
+        df = self.load()
+        start, end = _day_bounds(start_date, end_date)
+        dates = df["date"].astype(str)
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= dates >= start
+        if end is not None:
+            mask &= dates < end
+        if category is not None:
+            mask &= df["category"] == category
+        return df.loc[mask, columns or HISTORY_COLUMNS].copy()
+
+    def categories(self):
+        """Return the distinct dream categories in the log."""
+        return list(self.load(columns=["category"])["category"].dropna().unique())
+
+    def count(self):
+        """Return the number of dreams in the log."""
+        return len(self.load(columns=["date"]))
+
+    def version(self):
+        """Return a value that changes whenever dreams are appended or cleared.
+
+        Cheap to call, so callers can use it to key caches of derived results.
+        """
+        raise NotImplementedError
+
+class CSVDreamStore(DreamStore):
+    """The original dream_log.csv format.
+
+    Appends add rows to the end of the file instead of rewriting it, as long
+    as the file's header already has the expected columns.
+    """
+
+    def __init__(self, path="dream_log.csv"):
+        self.path = path
+
+    @timed("store_load")
+    def load(self, columns=None):
+        try:
+            if columns:
+                df = pd.read_csv(self.path, usecols=lambda col: col in columns)
+            else:
+                df = pd.read_csv(self.path)
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            return pd.DataFrame(columns=columns or HISTORY_COLUMNS)
+        return _ensure_columns(df, columns)
+
+    def iter_chunks(self, columns=None, chunksize=DEFAULT_CHUNKSIZE):
+        try:
+            reader = pd.read_csv(self.path, usecols=(lambda col: col in columns) if columns else None,
+                                 chunksize=chunksize)
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            return
+        with reader:
+            for chunk in reader:
+                yield _ensure_columns(chunk, columns)
+
+    def _header(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return f.readline().strip().split(",")
+        except FileNotFoundError:
+            return None
+
+    def _stat(self):
+        try:
+            return os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+    @timed("store_append")
+    def append_many(self, entries):
+        new_rows = _entries_frame(entries)
+        if len(new_rows) == 0:
+            version = self.version()
+            return version, version
+
+        header = self._header()
+        if header is None:
+            data = new_rows.to_csv(index=False).encode("utf-8")
+            if self._create(data):
+                after = self._stat()
+                return (self._version(None) if after.st_size == len(data) else None), self._version(after)
+            # Another writer created the log first; append after its header
+            header = self._header()
+
+        before = self._stat()
+        if header == HISTORY_COLUMNS:
+            data, mode, start = new_rows.to_csv(header=False, index=False), "ab", before.st_size
+        elif header == [""]:
+            data, mode, start = new_rows.to_csv(index=False), "wb", 0
+        else:
+            # Legacy column layout: rewrite once in the current layout
+            df = pd.concat([self.load(), new_rows], ignore_index=True)
+            df[HISTORY_COLUMNS].to_csv(self.path, index=False)
+            return None, self.version()
+
+        data = data.encode("utf-8")
+        with open(self.path, mode) as f:
+            f.write(data)
+        after = self._stat()
+        # Appends are O_APPEND writes: if the file grew by exactly our rows,
+        # nobody else wrote to it between the two stats
+        unchanged = after is not None and after.st_size == start + len(data)
+        return (self._version(before) if unchanged else None), self._version(after)
+
+    def _create(self, data):
+        """Create the log holding data, unless it exists; returns whether it was created.
+
+        data is written to a temporary file first and linked into place, so
+        other writers never see the new log without its header.
+        """
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.link(tmp_path, self.path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def clear(self):
+        pd.DataFrame(columns=HISTORY_COLUMNS).to_csv(self.path, index=False)
+
+    @staticmethod
+    def _version(stat):
+        return f"{stat.st_mtime_ns}-{stat.st_size}" if stat is not None else "0"
+
+    def version(self):
+        # Every append or rewrite changes the file's size or modification time
+        return self._version(self._stat())
+
+class SQLiteDreamStore(DreamStore):
+    """Dream log in an embedded SQLite database.
+
+    Appends are transactional inserts, so concurrent app sessions and CLI
+    runs cannot overwrite each other's dreams. Date and category filters
+    are answered from indexes.
+    """
+
+    def __init__(self, path="dream_log.db"):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dreams (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date TEXT NOT NULL,
+                    dream TEXT,
+                    themes TEXT,
+                    sentiment REAL,
+                    category TEXT,
+                    emotions TEXT,
+                    symbols TEXT
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_dreams_date ON dreams(date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_dreams_category ON dreams(category)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        # A connection per operation keeps the store safe to share across threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _select(self, where="", params=(), columns=None):
+        columns = ", ".join(col for col in HISTORY_COLUMNS if col in (columns or HISTORY_COLUMNS))
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                f"SELECT {columns} FROM dreams {where} ORDER BY id", conn, params=params)
+
+    def iter_chunks(self, columns=None, chunksize=DEFAULT_CHUNKSIZE):
+        columns = ", ".join(col for col in HISTORY_COLUMNS if col in (columns or HISTORY_COLUMNS))
+        with self._connect() as conn:
+            yield from pd.read_sql_query(
+                f"SELECT {columns} FROM dreams ORDER BY id", conn, chunksize=chunksize)
+
+    @timed("store_load")
+    def load(self, columns=None):
+        return self._select(columns=columns)
+
+    def _bump_version(self, conn):
+        conn.execute("INSERT INTO meta (key, value) VALUES ('version', 1) "
+                     "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+
+    @timed("store_append")
+    def append_many(self, entries):
+        df = _entries_frame(entries)
+        df = df.astype(object).where(df.notna(), None)
+        rows = [tuple(row) for row in df.itertuples(index=False)]
+        if not rows:
+            version = self.version()
+            return version, version
+
+        placeholders = ", ".join("?" for _ in HISTORY_COLUMNS)
+        with self._connect() as conn:
+            # Takes the write lock first, so both versions are read in the
+            # same transaction as the insert
+            conn.execute("BEGIN IMMEDIATE")
+            before = self._read_version(conn)
+            conn.executemany(
+                f"INSERT INTO dreams ({', '.join(HISTORY_COLUMNS)}) VALUES ({placeholders})", rows)
+            self._bump_version(conn)
+            return before, self._read_version(conn)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM dreams")
+            self._bump_version(conn)
+
+    @timed("store_query")
+    def query(self, start_date=None, end_date=None, category=None, columns=None):
+        start, end = _day_bounds(start_date, end_date)
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("date < ?")
+            params.append(end)
+        if category is not None:
+            conditions.append("category = ?")
+            params.append(category)
+
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        return self._select(where, params, columns)
+
+    def categories(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT category FROM dreams WHERE category IS NOT NULL AND category != ''"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM dreams").fetchone()[0]
+
+    def _read_version(self, conn):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def version(self):
+        # Bumped in the same transaction as every append and clear
+        with self._connect() as conn:
+            return self._read_version(conn)
+
+class ParquetDreamStore(DreamStore):
+    """Columnar dream log: a directory of zstd-compressed Parquet part files.
+
+    Reads are memory-mapped and only decode the requested columns, so pages
+    that never show dream text never pay for it. Each append writes a small
+    part file; once there are many, they are compacted into one.
+
+    A compacted part lists the parts it replaces in its metadata and is
+    renamed into place in one step, so from then on readers skip the old
+    parts whether or not they have been deleted yet: a crash mid-compaction
+    never duplicates rows. Readers open every part before reading any, and
+    look again if a concurrent compaction deleted one first.
+    """
+
+    COMPACT_THRESHOLD = 64
+
+    # Parquet metadata key of the parts a compacted part replaces
+    REPLACES_KEY = b"dream_log.replaces"
+
+    # Times a reader looks again for the parts after one disappeared
+    READ_ATTEMPTS = 5
+
+    def __init__(self, path="dream_log.parquet"):
+        if pa is None:
+            raise ImportError("The Parquet dream log requires pyarrow: pip install pyarrow")
+        self.path = path
+        self.schema = pa.schema([
+            ("date", pa.string()),
+            ("dream", pa.string()),
+            ("themes", pa.string()),
+            ("sentiment", pa.float64()),
+            ("category", pa.string()),
+            ("emotions", pa.string()),
+            ("symbols", pa.string())
+        ])
+        # Part files never change once written, so what they replace is cached by name
+        self._replaced_by = {}
+        os.makedirs(path, exist_ok=True)
+
+    def _files(self):
+        return sorted(glob.glob(os.path.join(self.path, "part-*.parquet")))
+
+    def _replaces(self, part):
+        name = os.path.basename(part)
+        if not name.endswith("-compact.parquet"):
+            return ()
+        if name not in self._replaced_by:
+            metadata = pq.read_schema(part).metadata or {}
+            self._replaced_by[name] = tuple(json.loads(metadata.get(self.REPLACES_KEY, b"[]")))
+        return self._replaced_by[name]
+
+    def _scan(self):
+        """Return (live parts in append order, names of parts compacted away)."""
+        files = self._files()
+        replaced = set()
+        for part in files:
+            replaced.update(self._replaces(part))
+        return [part for part in files if os.path.basename(part) not in replaced], replaced
+
+    def _retry(self, function):
+        # A concurrent compaction may delete a part between listing and opening it;
+        # the compacted part that replaces it is already in place by then
+        for attempt in range(self.READ_ATTEMPTS):
+            try:
+                return function()
+            except FileNotFoundError:
+                if attempt == self.READ_ATTEMPTS - 1:
+                    raise
+
+    def _parts(self):
+        return self._retry(lambda: self._scan()[0])
+
+    def _open_parts(self):
+        """Memory-map every live part; mapped parts stay readable if deleted afterwards."""
+        return self._retry(lambda: [pa.memory_map(part) for part in self._scan()[0]])
+
+    def _read(self, columns=None, filters=None):
+        columns = [col for col in HISTORY_COLUMNS if col in (columns or HISTORY_COLUMNS)]
+        tables = [pq.read_table(source, columns=columns, filters=filters) for source in self._open_parts()]
+        if not tables:
+            return pd.DataFrame(columns=columns)
+        return pa.concat_tables(tables).to_pandas()
+
+    def iter_chunks(self, columns=None, chunksize=DEFAULT_CHUNKSIZE):
+        columns = [col for col in HISTORY_COLUMNS if col in (columns or HISTORY_COLUMNS)]
+        for source in self._open_parts():
+            for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
+
+    def _write_part(self, table, name):
+        tmp_path = os.path.join(self.path, name + ".tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def _remove(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+
+    @timed("store_load")
+    def load(self, columns=None):
+        return self._read(columns)
+
+    @timed("store_append")
+    def append_many(self, entries):
+        df = _entries_frame(entries)
+        if len(df) == 0:
+            version = self.version()
+            return version, version
+        df["sentiment"] = pd.to_numeric(df["sentiment"], errors="coerce")
+        for col in HISTORY_COLUMNS:
+            if col != "sentiment":
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        before = self._parts()
+        # Nanosecond timestamps keep part files in append order when sorted
+        name = f"part-{time.time_ns():020d}.parquet"
+        self._write_part(table, name)
+        after = self._parts()
+        unchanged = after == sorted(before + [os.path.join(self.path, name)])
+
+        if len(after) > self.COMPACT_THRESHOLD:
+            self.compact()
+            # Compaction renames the parts, so derived views resync from it
+            unchanged = False
+        return (self._version(before) if unchanged else None), self.version()
+
+    def compact(self):
+        """Merge all live part files into one, then delete the parts it replaces."""
+        def merge():
+            parts, replaced = self._scan()
+            return parts, replaced, [pa.memory_map(part) for part in parts]
+        parts, replaced, sources = self._retry(merge)
+        if len(parts) < 2:
+            self._remove(replaced)
+            return
+        table = pa.concat_tables([pq.read_table(source) for source in sources])
+        # Everything the merged parts replaced too, so the old parts of an
+        # interrupted compaction stay hidden once their compacted part is merged
+        replaces = sorted(replaced | {os.path.basename(part) for part in parts})
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               self.REPLACES_KEY: json.dumps(replaces).encode("utf-8")})
+        # Sorts just before the newest merged part, so later appends stay after it
+        name = os.path.basename(parts[-1]).replace(".parquet", "-compact.parquet")
+        # The rename in _write_part is the commit point; removing the parts after it is only cleanup
+        self._write_part(table, name)
+        self._remove(part for part in replaces if part != name)
+
+    def clear(self):
+        self._remove(os.path.basename(part) for part in self._files())
+
+    @timed("store_query")
+    def query(self, start_date=None, end_date=None, category=None, columns=None):
+        start, end = _day_bounds(start_date, end_date)
+        filters = []
+        if start is not None:
+            filters.append(("date", ">=", start))
+        if end is not None:
+            filters.append(("date", "<", end))
+        if category is not None:
+            filters.append(("category", "==", category))
+        return self._read(columns, filters or None)
+
+    def count(self):
+        return sum(pq.ParquetFile(source).metadata.num_rows for source in self._open_parts())
+
+    @staticmethod
+    def _version(parts):
+        parts = [os.path.basename(part) for part in parts]
+        return ",".join(parts) if parts else "0"
+
+    def version(self):
+        # Part file names are unique timestamps, so any append, compaction or clear changes the set
+        return self._version(self._parts())
+
+def sidecar_path(store_path, suffix):
+    """Path of a file derived from the dream log at store_path, kept next to it."""
+    return (store_path or DEFAULT_STORE_PATH).rstrip("/\\") + suffix
+
+def open_store(path=None):
+    """Open the dream log at path, choosing the backend from its extension."""
+    path = path or DEFAULT_STORE_PATH
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        return SQLiteDreamStore(path)
+    if path.lower().rstrip("/").endswith(PARQUET_EXTENSIONS):
+        return ParquetDreamStore(path)
+    return CSVDreamStore(path)
+
+def migrate_store(source_path="dream_log.csv", target_path="dream_log.db", overwrite=False):
+    """Copy a dream log into another backend in a single bulk append.
+
+    Returns the number of dreams migrated. A target that already holds
+    dreams is left alone unless overwrite is set.
+    """
+    target = open_store(target_path)
+    if target.count() > 0:
+        if not overwrite:
+            print(f"{target_path} already contains dreams; use overwrite to replace them.")
+            return 0
+        target.clear()
+
+    df = open_store(source_path).load()
+    target.append_many(df.to_dict("records"))
+    return len(df)
+
+def migrate_csv_to_sqlite(csv_path="dream_log.csv", db_path="dream_log.db", overwrite=False):
+    """Copy an existing CSV dream log into an SQLite store in one transaction."""
+    return migrate_store(csv_path, db_path, overwrite=overwrite)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dream log storage tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser(
+        "migrate", help="Copy the dream log to another backend (.db for SQLite, .parquet for Parquet)")
+    migrate_parser.add_argument("source_path", nargs="?", default="dream_log.csv")
+    migrate_parser.add_argument("target_path", nargs="?", default="dream_log.db")
+    migrate_parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        migrated = migrate_store(args.source_path, args.target_path, overwrite=args.overwrite)
+        print(f"Migrated {migrated} dreams to {args.target_path}.")
+        print(f"Set DREAM_STORE={args.target_path} to use the migrated dream log.")
+    except Exception as e:
+        print(f"Error migrating dream log: {e}")
+        sys.exit(1)
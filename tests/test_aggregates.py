@@ -0,0 +1,98 @@
+import os
+
+import pandas as pd
+import pytest
+
+import aggregates
+from aggregates import DreamAggregates, record_dreams, get_aggregates
+from storage import open_store
+from timeline import DreamTimeline
+
+def _entry(i, emotion="joy"):
+    return {"date": pd.Timestamp("2024-01-01") + pd.Timedelta(days=i), "dream": f"Dream number {i}",
+            "themes": ["water", f"theme{i}"], "sentiment": 0.25 * i, "category": "pleasant",
+            "emotions": [emotion], "symbols": ["water"]}
+
+@pytest.fixture(params=["dream_log.csv", "dream_log.db", "dream_log.parquet"])
+def store_path(request, tmp_path):
+    return str(tmp_path / request.param)
+
+@pytest.fixture(autouse=True)
+def fresh_aggregates(tmp_path, monkeypatch):
+    monkeypatch.setattr(aggregates, "_aggregates", DreamAggregates(str(tmp_path / "aggregates.json")))
+
+def test_append_reports_the_versions_around_its_write(store_path):
+    store = open_store(store_path)
+    store.append_many([_entry(0)])
+    version = store.version()
+    before, after = store.append_many([_entry(1), _entry(2)])
+    assert before == version
+    assert after == store.version() != version
+    assert store.append_many([]) == (after, after)
+
+def test_record_dreams_adds_entries_without_rebuilding(store_path, monkeypatch):
+    store = open_store(store_path)
+    record_dreams(store, [_entry(0)])
+    timeline = DreamTimeline()
+    timeline.sync(store)
+
+    rebuilds = []
+    for view in (get_aggregates(), timeline):
+        monkeypatch.setattr(view, "rebuild", lambda store, view=view: rebuilds.append(view))
+    totals = record_dreams(store, [_entry(1, "fear")], views=[timeline])
+    assert rebuilds == []
+    assert totals.total == 2
+    assert totals.emotion_counts == {"joy": 1, "fear": 1}
+    assert totals.store_version == timeline.store_version == store.version()
+    assert len(timeline) == 2
+
+def test_record_dreams_counts_dreams_appended_by_another_process(store_path):
+    store = open_store(store_path)
+    record_dreams(store, [_entry(0)])
+    timeline = DreamTimeline()
+    timeline.sync(store)
+
+    # Another process appends after this one synced and before it appends
+    open_store(store_path).append_many([_entry(1, "fear")])
+    totals = record_dreams(store, [_entry(2, "anger")], views=[timeline])
+
+    assert totals.total == 3
+    assert totals.emotion_counts == {"joy": 1, "fear": 1, "anger": 1}
+    assert totals.store_version == store.version()
+    assert len(timeline) == 3
+    assert list(timeline.frame["dream"]) == ["Dream number 0", "Dream number 1", "Dream number 2"]
+
+def test_aggregates_match_a_rebuild(store_path):
+    store = open_store(store_path)
+    for i in range(6):
+        record_dreams(store, [_entry(i, ["joy", "fear", "peace"][i % 3])])
+    incremental = get_aggregates()
+    rebuilt = DreamAggregates(incremental.path + ".rebuilt")
+    rebuilt.rebuild(store)
+    for name in ("total", "emotion_counts", "theme_counts", "category_counts", "sentiment_count", "daily"):
+        assert getattr(incremental, name) == getattr(rebuilt, name)
+    assert incremental.sentiment_sum == pytest.approx(rebuilt.sentiment_sum)
+
+def test_undated_dreams_stay_out_of_daily_rollups(tmp_path):
+    totals = DreamAggregates(str(tmp_path / "totals.json"))
+    undated = [dict(_entry(i), date=date) for i, date in enumerate([None, pd.NaT, ""], start=3)]
+    totals.add_entries([_entry(0), _entry(1), _entry(2)] + undated)
+    assert totals.total == 6 and totals.sentiment_count == 6
+    assert sorted(totals.daily) == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert DreamAggregates(totals.path).daily == totals.daily
+
+    visualization = pytest.importorskip("visualization")
+    assert visualization.create_dream_dashboard(None, aggregates=totals) is not None
+
+def test_each_store_keeps_its_own_totals(tmp_path):
+    first = open_store(str(tmp_path / "first" / "dream_log.csv"))
+    second = open_store(str(tmp_path / "second.db"))
+    (tmp_path / "first").mkdir()
+    record_dreams(first, [_entry(0), _entry(1)])
+    record_dreams(second, [_entry(2)])
+
+    assert get_aggregates(first).total == 2
+    assert get_aggregates(second).total == 1
+    assert os.path.exists(aggregates.aggregates_path(first.path))
+    assert os.path.dirname(aggregates.aggregates_path(first.path)) == str(tmp_path / "first")
+    assert DreamAggregates(aggregates.aggregates_path(second.path)).total == 1
@@ -0,0 +1,63 @@
+import copy
+
+import pytest
+
+from dream_symbols import DREAM_SYMBOLS, update_symbol_dictionary, get_symbol_matcher
+import nlp_utils
+from nlp_utils import analysis_cache_key
+from result_cache import ResultCache
+
+DREAM = "I was swimming in deep water while a snake watched me."
+
+@pytest.fixture
+def symbols():
+    original = copy.deepcopy(DREAM_SYMBOLS)
+    yield
+    update_symbol_dictionary(original, replace=True)
+
+def test_key_is_stable_and_normalizes_whitespace():
+    assert analysis_cache_key(DREAM) == analysis_cache_key(DREAM)
+    assert analysis_cache_key("  " + DREAM.replace(" ", "\n  ")) == analysis_cache_key(DREAM)
+    assert analysis_cache_key(DREAM) != analysis_cache_key(DREAM + " Then I woke up.")
+
+@pytest.mark.parametrize("field, value", [
+    ("meaning", "A changed meaning"),
+    ("category", "changed"),
+    ("associations", ["changed"]),
+])
+def test_key_changes_when_an_existing_symbol_changes(symbols, field, value):
+    before = analysis_cache_key(DREAM)
+    symbol = next(iter(DREAM_SYMBOLS))
+    update_symbol_dictionary({symbol: dict(DREAM_SYMBOLS[symbol], **{field: value})})
+    assert analysis_cache_key(DREAM) != before
+
+def test_symbol_index_fingerprint_only_tracks_names(symbols):
+    before = get_symbol_matcher().fingerprint
+    symbol = next(iter(DREAM_SYMBOLS))
+    update_symbol_dictionary({symbol: dict(DREAM_SYMBOLS[symbol], meaning="A changed meaning")})
+    assert get_symbol_matcher().fingerprint == before
+    update_symbol_dictionary({"lighthouse": {"meaning": "guidance", "category": "place", "associations": []}})
+    assert get_symbol_matcher().fingerprint != before
+
+def test_persisted_results_are_not_reused_after_a_dictionary_update(symbols, tmp_path):
+    path = str(tmp_path / "analysis.sqlite")
+    ResultCache(path).put(analysis_cache_key(DREAM), {'symbols': {'water': {'meaning': "old"}}})
+    assert ResultCache(path).get(analysis_cache_key(DREAM)) is not None
+
+    update_symbol_dictionary({"water": dict(DREAM_SYMBOLS["water"], meaning="A changed meaning")})
+    assert ResultCache(path).get(analysis_cache_key(DREAM)) is None
+
+def test_disk_tier_is_bounded(tmp_path):
+    cache = ResultCache(str(tmp_path / "analysis.sqlite"), ttl=3600, max_bytes=1000)
+    for i in range(50):
+        cache.put(f"dream {i}", {'text': "x" * 90})
+    assert 0 < len(cache.disk) <= 10
+    # The newest results are the ones kept
+    assert ResultCache(cache.disk.path).get("dream 49") is not None
+    assert ResultCache(cache.disk.path).get("dream 0") is None
+
+def test_analysis_cache_uses_the_disk_limits(tmp_path, monkeypatch):
+    monkeypatch.setattr(nlp_utils, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(nlp_utils, "_analysis_cache", None)
+    disk = nlp_utils.get_analysis_cache().disk
+    assert (disk.ttl, disk.max_bytes) == (nlp_utils.ANALYSIS_CACHE_TTL, nlp_utils.ANALYSIS_CACHE_MAX_BYTES)
@@ -0,0 +1,62 @@
+import argparse
+
+import pytest
+
+import main
+import aggregates
+import search_index
+import storage
+
+DREAMS = [f"dream number {i} about water" for i in range(7)]
+
+def _analyze(records, personality, **options):
+    for record in records:
+        if not record.get('dream'):
+            yield record, {'error': "missing dream text"}
+            continue
+        yield record, {'dream': record['dream'], 'keywords': ["water"], 'sentiment': 0.5,
+                       'primary_emotions': ["joy"], 'symbols': ["water"]}
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(aggregates, "_aggregates", None)
+    monkeypatch.setattr(search_index, "_search_index", None)
+    monkeypatch.setattr(main, "analyze_records", _analyze)
+    monkeypatch.setattr(main, "DEFAULT_CHUNKSIZE", 3)
+    path = str(tmp_path / "dream_log.csv")
+    monkeypatch.setattr(main, "open_store", lambda: storage.open_store(path))
+    return storage.open_store(path)
+
+def _run(tmp_path, dreams):
+    source = tmp_path / "dreams.jsonl"
+    source.write_text("".join(f'{{"dream": "{dream}"}}\n' for dream in dreams), encoding="utf-8")
+    args = argparse.Namespace(input=str(source), format=None, output=str(tmp_path / "results.jsonl"),
+                              personality=None, workers=None, batch_size=64, predict=False, save=True)
+    return main.run_batch(args)
+
+def test_save_writes_in_chunks(tmp_path, monkeypatch, store):
+    writes = []
+    append_many = storage.CSVDreamStore.append_many
+    monkeypatch.setattr(storage.CSVDreamStore, "append_many",
+                        lambda self, entries: writes.append(len(entries)) or append_many(self, entries))
+
+    assert _run(tmp_path, DREAMS[:4] + [""] + DREAMS[4:]) == 0
+    assert writes == [3, 3, 1]
+    assert list(store.load()['dream']) == DREAMS
+    assert aggregates.get_aggregates(store).total == len(DREAMS)
+
+def test_save_error_stops_saving(tmp_path, monkeypatch, store):
+    append_many = storage.CSVDreamStore.append_many
+    calls = []
+
+    def failing(self, entries):
+        calls.append(len(entries))
+        if len(calls) == 2:
+            raise OSError("disk full")
+        return append_many(self, entries)
+
+    monkeypatch.setattr(storage.CSVDreamStore, "append_many", failing)
+    assert _run(tmp_path, DREAMS) == 1
+    assert calls == [3, 3]
+    assert list(store.load()['dream']) == DREAMS[:3]
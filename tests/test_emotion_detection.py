@@ -0,0 +1,54 @@
+import random
+
+import numpy as np
+import pytest
+
+import emotion_detection
+from emotion_detection import (EMOTIONS, EmotionVocabulary, emotion_results, encode_tokens,
+                               get_emotion_vocabulary, score_emotions, score_emotions_batch,
+                               update_emotion_lexicon)
+
+FILLER = ["house", "walk", "door", "blue", "friend", "road", "light", "sky"]
+
+@pytest.fixture
+def lexicon(monkeypatch):
+    monkeypatch.setattr(emotion_detection, "EMOTION_LEXICON", dict(emotion_detection.EMOTION_LEXICON))
+    monkeypatch.setattr(emotion_detection, "INTENSITY_MODIFIERS", dict(emotion_detection.INTENSITY_MODIFIERS))
+    monkeypatch.setattr(emotion_detection, "_lexicon_fingerprint", None)
+
+def _dreams(count, seed=0):
+    rng = random.Random(seed)
+    words = (list(emotion_detection.EMOTION_LEXICON) + list(emotion_detection.INTENSITY_MODIFIERS)
+             + FILLER * 4)
+    return [[rng.choice(words) for _ in range(rng.randrange(0, 30))] for _ in range(count)]
+
+def test_batch_scores_match_scalar_scores():
+    dreams = _dreams(300) + [[], ["very"], ["very", "house", "happy"], ["very", "extremely", "sad"]]
+    scores = score_emotions_batch([encode_tokens(tokens) for tokens in dreams], dtype=np.float64)
+    assert scores.shape == (len(dreams), len(EMOTIONS))
+    for tokens, result in zip(dreams, emotion_results(scores)):
+        expected = score_emotions(tokens)
+        assert result['emotion_scores'] == expected['emotion_scores']
+        assert result['primary_emotions'] == expected['primary_emotions']
+
+def test_vocabulary_holds_only_lexicon_words():
+    vocabulary = EmotionVocabulary()
+    encoded = vocabulary.encode(["happy", "token", "very", "another", "happy"])
+    assert encoded.tolist() == [1, vocabulary.OTHER_ID, 2, vocabulary.OTHER_ID, 1]
+    vocabulary.encode([f"word{i}" for i in range(10000)])
+    assert vocabulary.words == [None, "happy", "very"]
+
+    lexicon_size = len(emotion_detection.EMOTION_LEXICON) + len(emotion_detection.INTENSITY_MODIFIERS)
+    for tokens in _dreams(200, seed=1):
+        encode_tokens(tokens + [f"unseen{i}" for i in range(20)])
+    assert len(get_emotion_vocabulary().words) <= lexicon_size + 1
+
+def test_lexicon_update_reaches_batch_scores(lexicon):
+    tokens = ["very", "glimmer", "house"]
+    before = score_emotions_batch([encode_tokens(tokens)], dtype=np.float64)
+    assert not before.any()
+
+    update_emotion_lexicon(words={'glimmer': 'joy'})
+    after = score_emotions_batch([encode_tokens(tokens)], dtype=np.float64)
+    assert emotion_results(after)[0]['emotion_scores'] == score_emotions(tokens)['emotion_scores']
+    assert after[0, EMOTIONS.index('joy')] == 1.0
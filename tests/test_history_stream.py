@@ -0,0 +1,19 @@
+import pandas as pd
+import pytest
+
+from dream_symbols import generate_symbol_insights, get_symbol_frequencies
+from emotion_detection import analyze_emotion_patterns
+from history_stream import (stream_emotion_patterns, stream_symbol_frequencies,
+                            stream_symbol_insights)
+
+HISTORY = pd.DataFrame({
+    'dream': ["water and fire", "a snake in the water", "falling from a tree", None,
+              "the house by the water", "fire on the mountain", "flying over water"],
+    'emotions': [["joy"], ["fear"], ["fear", "sadness"], ["neutral"], ["joy"], ["anger"], ["joy", "peace"]],
+})
+
+@pytest.mark.parametrize("chunksize", [1, 3, 100])
+def test_chunked_summaries_match_whole_frame(chunksize):
+    assert stream_symbol_frequencies(HISTORY, chunksize=chunksize) == get_symbol_frequencies(HISTORY)
+    assert stream_symbol_insights(HISTORY, chunksize=chunksize) == generate_symbol_insights(HISTORY)
+    assert stream_emotion_patterns(HISTORY, chunksize=chunksize) == analyze_emotion_patterns(HISTORY)
@@ -0,0 +1,131 @@
+import time
+import asyncio
+import threading
+
+from llm_client import AsyncLLMClient, LLMBackend, TokenBucket
+
+class CountingBackend(LLMBackend):
+    """Records how many calls run at once."""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def _leave(self):
+        with self._lock:
+            self.active -= 1
+
+    async def agenerate(self, prompt):
+        self._enter()
+        try:
+            await asyncio.sleep(self.latency)
+            return prompt
+        finally:
+            self._leave()
+
+    def stream(self, prompt):
+        self._enter()
+        try:
+            time.sleep(self.latency)
+            yield prompt
+        finally:
+            self._leave()
+
+def _run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_concurrency_limit_holds_across_threads():
+    backend = CountingBackend()
+    client = AsyncLLMClient(backend, max_concurrency=2, rate=None)
+    results = {}
+    _run_threads(lambda i: results.__setitem__(i, client.generate_sync(f"prompt {i}")), 8)
+    assert results == {i: f"prompt {i}" for i in range(8)}
+    assert backend.peak == 2
+
+def test_concurrency_limit_covers_streams_and_calls_from_other_loops():
+    backend = CountingBackend()
+    client = AsyncLLMClient(backend, max_concurrency=2, rate=None)
+
+    def call(i):
+        if i % 2:
+            assert "".join(client.stream(f"prompt {i}")) == f"prompt {i}"
+        else:
+            assert asyncio.run(client.generate(f"prompt {i}")) == f"prompt {i}"
+
+    _run_threads(call, 8)
+    assert backend.calls == 8
+    assert backend.peak == 2
+
+def test_abandoned_stream_releases_its_slot():
+    backend = CountingBackend(latency=0)
+    client = AsyncLLMClient(backend, max_concurrency=1, rate=None, timeout=1)
+    stream = client.stream("first")
+    next(stream)
+    stream.close()
+    assert client.generate_sync("second", deadline=1) == "second"
+
+def test_rate_limit_holds_across_threads():
+    backend = CountingBackend(latency=0)
+    client = AsyncLLMClient(backend, max_concurrency=8, rate=20, burst=1)
+    start = time.monotonic()
+    _run_threads(lambda i: client.generate_sync(f"prompt {i}"), 6)
+    # One token up front, then one every 50 ms
+    assert time.monotonic() - start >= 0.2
+
+def test_token_bucket_is_thread_safe():
+    bucket = TokenBucket(rate=0.001, capacity=100)
+    taken = []
+    _run_threads(lambda i: taken.extend(1 for _ in range(50) if not bucket._take()), 8)
+    assert len(taken) == 100
+
+def test_deadline_cancels_the_call():
+    backend = CountingBackend(latency=5)
+    client = AsyncLLMClient(backend, max_concurrency=1, rate=None, retries=0)
+    try:
+        client.generate_sync("slow", deadline=0.1)
+    except (TimeoutError, asyncio.TimeoutError):
+        pass
+    else:
+        raise AssertionError("expected a timeout")
+    # The cancelled call gave its slot back
+    backend.latency = 0
+    assert client.generate_sync("fast", deadline=1) == "fast"
+
+class FailingOnceBackend(CountingBackend):
+    """Fails the first stream before any chunk, then streams normally."""
+
+    def stream(self, prompt):
+        self._enter()
+        try:
+            if self.calls == 1:
+                raise RuntimeError("first attempt fails")
+            yield prompt
+        finally:
+            self._leave()
+
+def test_stream_backs_off_only_before_a_retry():
+    client = AsyncLLMClient(CountingBackend(latency=0), max_concurrency=1, rate=None, backoff=5, max_backoff=5)
+    start = time.monotonic()
+    assert "".join(client.stream("done")) == "done"
+    stream = client.stream("closed early")
+    next(stream)
+    stream.close()
+    assert time.monotonic() - start < 1
+
+    backend = FailingOnceBackend(latency=0)
+    client = AsyncLLMClient(backend, max_concurrency=1, rate=None, backoff=0.01)
+    assert "".join(client.stream("retried")) == "retried"
+    assert backend.calls == 2
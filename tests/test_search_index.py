@@ -0,0 +1,126 @@
+import re
+import math
+import random
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+import search_index
+from search_index import BM25_B, BM25_K1, SearchIndex, get_search_index, search_dreams
+import aggregates
+from aggregates import record_dreams
+from storage import open_store
+
+WORDS = ["water", "fire", "forest", "wolf", "house", "door", "flying", "falling", "mother", "dark",
+         "light", "river", "stairs", "school", "train", "ocean"]
+
+@pytest.fixture(autouse=True)
+def tokenizer(monkeypatch):
+    # NLTK data may be missing; any deterministic tokenizer will do
+    monkeypatch.setattr(search_index, "preprocess_text",
+                        lambda text: re.findall(r"[a-z]+", text.lower()) if isinstance(text, str) else [])
+    monkeypatch.setattr(search_index, "_search_index", None)
+
+def _dreams(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randrange(1, 25))) for _ in range(count)]
+
+def _history(dreams):
+    return pd.DataFrame({'dream': dreams})
+
+def _brute_force(dreams, terms):
+    """BM25 of every dream for the query terms, computed directly."""
+    tokens = [search_index.preprocess_text(dream) for dream in dreams]
+    n = len(tokens)
+    average_length = sum(map(len, tokens)) / n
+    scores = [0.0] * n
+    for term in terms:
+        containing = sum(1 for doc in tokens if term in doc)
+        idf = math.log(1 + (n - containing + 0.5) / (containing + 0.5))
+        for i, doc in enumerate(tokens):
+            frequency = Counter(doc)[term]
+            if frequency:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / average_length)
+                scores[i] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+    return scores
+
+@pytest.mark.parametrize("query", ["water", "dark forest wolf", "ocean train stairs mother", "unicorn"])
+def test_ranking_matches_brute_force_bm25(query):
+    dreams = _dreams(300)
+    results = search_dreams(_history(dreams), query, k=10)
+    scores = _brute_force(dreams, query.split())
+    expected = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: (-scores[i], i))[:10]
+    assert list(results.index) == expected
+    assert list(results['score']) == pytest.approx([scores[i] for i in expected])
+
+def test_phrase_results_contain_the_phrase():
+    dreams = _dreams(300, seed=1)
+    results = search_dreams(_history(dreams), '"dark forest" water', k=50)
+    assert len(results) > 0
+    assert all(re.search(r"\bdark forest\b", dream) for dream in results['dream'])
+    expected = sum(1 for dream in dreams if re.search(r"\bdark forest\b", dream))
+    assert len(results) == min(50, expected)
+
+def test_incremental_sync_matches_rebuild(tmp_path):
+    dreams = _dreams(200, seed=2)
+    index = SearchIndex(str(tmp_path / "index.jsonl"))
+    for size in (1, 50, 51, 200):
+        index.sync_history(_history(dreams[:size]))
+    fresh = SearchIndex()
+    fresh.sync_history(_history(dreams))
+    reloaded = SearchIndex(index.path)
+    for query in ("water fire", '"falling stairs"', "mother"):
+        assert index.search(query, 20) == fresh.search(query, 20) == reloaded.search(query, 20)
+
+def test_rewritten_history_rebuilds_index(tmp_path):
+    dreams = _dreams(50, seed=3)
+    index = SearchIndex(str(tmp_path / "index.jsonl"))
+    index.sync_history(_history(dreams))
+    # Same last dream, different earlier ones
+    changed = ["unicorn"] + dreams[1:]
+    index.sync_history(_history(changed))
+    assert list(search_dreams(_history(changed), "unicorn", index=index).index) == [0]
+
+def test_other_frames_leave_the_store_index_alone(tmp_path):
+    store = open_store(str(tmp_path / "dream_log.csv"))
+    dreams = _dreams(40, seed=4)
+    index = get_search_index(store)
+    index.sync_history(_history(dreams))
+    with open(index.path, "rb") as f:
+        before = f.read()
+
+    subset = _history(dreams).iloc[10:20]
+    assert set(search_dreams(subset, "water").index) <= set(range(10, 20))
+    with open(index.path, "rb") as f:
+        assert f.read() == before
+
+    other = open_store(str(tmp_path / "dream_log.db"))
+    assert get_search_index(other).path != index.path
+    assert len(get_search_index(other)) == 0
+
+def test_store_index_follows_record_dreams_without_scanning_on_queries(tmp_path, monkeypatch):
+    monkeypatch.setattr(aggregates, "_aggregates", aggregates.DreamAggregates(str(tmp_path / "totals.json")))
+    store = open_store(str(tmp_path / "dream_log.csv"))
+    dreams = _dreams(60, seed=5)
+    store.append_many([{'dream': dream} for dream in dreams[:20]])
+    index = get_search_index(store)
+    assert len(index) == 20 and index.store_version == store.version()
+
+    record_dreams(store, [{'dream': dream} for dream in dreams[20:40]], views=[index])
+    # Appended by another process, without the index
+    store.append_many([{'dream': dream} for dream in dreams[40:]])
+
+    history = store.load(columns=["dream"])
+    reference = SearchIndex()
+    reference.sync_history(history)
+    index = get_search_index(store)
+    assert len(index) == 60
+
+    def scan(*args):
+        raise AssertionError("queries must not re-read the history")
+
+    monkeypatch.setattr(index, "sync_history", scan)
+    for query in ("water fire", '"dark forest" mother'):
+        results = search_dreams(history, query, index=get_search_index(store))
+        assert list(zip(results.index, results['score'])) == reference.search(query)
@@ -0,0 +1,57 @@
+import time
+import threading
+
+import pytest
+
+from service import AnalysisService, ServiceError
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("DREAM_STORE", raising=False)
+    service = AnalysisService(workers=1, queue_size=0, timeout=0.1)
+    yield service
+    service.close()
+
+def test_full_service_refuses_requests(service):
+    release = threading.Event()
+    waiting = threading.Thread(target=lambda: service.submit(release.wait))
+    waiting.start()
+    time.sleep(0.02)
+    with pytest.raises(ServiceError) as error:
+        service.submit(lambda: "never run")
+    assert error.value.status == 503
+    release.set()
+    waiting.join()
+
+def test_timed_out_work_keeps_its_slot_until_it_ends(service):
+    release = threading.Event()
+    with pytest.raises(ServiceError) as error:
+        service.submit(release.wait)
+    assert error.value.status == 504
+
+    # The timed-out work still occupies the only worker
+    assert service.in_flight == 1
+    with pytest.raises(ServiceError) as error:
+        service.submit(lambda: "too soon")
+    assert error.value.status == 503
+
+    release.set()
+    deadline = time.monotonic() + 1
+    while service.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert service.submit(lambda: "ok") == "ok"
+    assert service.in_flight == 0
+
+def test_failed_work_releases_its_slot(service):
+    def fail():
+        raise ValueError("bad input")
+    with pytest.raises(ValueError):
+        service.submit(fail)
+    assert service.submit(lambda: "ok") == "ok"
+
+def test_closed_service_refuses_requests(service):
+    service.close()
+    with pytest.raises(ServiceError) as error:
+        service.submit(lambda: "late")
+    assert error.value.status == 503
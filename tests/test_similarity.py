@@ -0,0 +1,91 @@
+import random
+
+import numpy as np
+import pytest
+
+import similarity
+from similarity import EMOTIONS, SimilarityIndex, find_similar_dreams
+from storage import open_store
+
+THEMES = [f"theme{i}" for i in range(60)]
+SYMBOLS = ["water", "fire", "snake", "house", "door", "tree", "mountain", "flying"]
+
+def _entries(count, seed=0):
+    rng = random.Random(seed)
+    return [{'date': f"2024-01-{1 + i % 28:02d}", 'dream': f"dream {i}",
+             'themes': rng.sample(THEMES, rng.randrange(1, 6)),
+             'symbols': rng.sample(SYMBOLS, rng.randrange(0, 3)),
+             'emotions': rng.sample(EMOTIONS, rng.randrange(1, 3)),
+             'sentiment': 0.0} for i in range(count)]
+
+def _exact(index, vector, k, exclude=()):
+    scores = index.matrix @ vector
+    ranked = [i for i in np.lexsort((np.arange(len(scores)), -scores)) if i not in exclude]
+    return [int(i) for i in ranked[:k]]
+
+def test_search_matches_brute_force():
+    index = SimilarityIndex(_entries(500))
+    for entry in _entries(20, seed=1):
+        vector = index.vectorize(entry['themes'], entry['symbols'], entry['emotions'])
+        results = index.search(vector, k=5, approximate=False)
+        assert [position for position, _ in results] == _exact(index, vector, 5)
+        assert [score for _, score in results] == pytest.approx(
+            [float(index.matrix[position] @ vector) for position, _ in results], abs=1e-6)
+
+def test_vectors_are_unit_length_and_a_dream_finds_itself():
+    entries = _entries(200, seed=2)
+    index = SimilarityIndex(entries)
+    np.testing.assert_allclose(np.linalg.norm(index.matrix, axis=1), 1.0, rtol=1e-5)
+    vector = index.vectorize(entries[7]['themes'], entries[7]['symbols'], entries[7]['emotions'])
+    position, score = index.search(vector, k=1)[0]
+    assert score == pytest.approx(1.0, abs=1e-5)
+    assert index.matrix[position] @ vector == pytest.approx(1.0, abs=1e-5)
+
+def test_exclude_skips_positions():
+    index = SimilarityIndex(_entries(300, seed=3))
+    vector = index.matrix[10].copy()
+    results = index.search(vector, k=5, exclude=[10])
+    assert 10 not in [position for position, _ in results]
+    assert [position for position, _ in results] == _exact(index, vector, 5, exclude={10})
+
+def test_incremental_inserts_match_bulk_after_idf_refresh():
+    entries = _entries(400, seed=4)
+    incremental = SimilarityIndex()
+    for start in range(0, len(entries), 37):
+        incremental.add_entries(entries[start:start + 37])
+    bulk = SimilarityIndex(entries)
+    assert len(incremental) == len(bulk) == len(entries)
+    # Between refreshes new dreams use the IDF weights of the last one
+    incremental._refresh()
+    np.testing.assert_allclose(incremental.matrix, bulk.matrix, atol=1e-6)
+
+def test_approximate_search_recall(monkeypatch):
+    monkeypatch.setattr(similarity, "RERANK_CANDIDATES", 200)
+    index = SimilarityIndex(_entries(5000, seed=5))
+    hits = total = 0
+    for entry in _entries(30, seed=6):
+        vector = index.vectorize(entry['themes'], entry['symbols'], entry['emotions'])
+        results = index.search(vector, k=5, approximate=True)
+        exact = set(_exact(index, vector, 5))
+        hits += len(exact & {position for position, _ in results})
+        total += len(exact)
+        # Scores of the candidates found are exact
+        for position, score in results:
+            assert score == pytest.approx(float(index.matrix[position] @ vector), abs=1e-6)
+    assert hits / total >= 0.9
+
+def test_find_similar_dreams_follows_the_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(similarity, "_similarity_index", None)
+    store = open_store(str(tmp_path / "dream_log.csv"))
+    entries = _entries(50, seed=7)
+    store.append_many(entries)
+    target = entries[20]
+    similar = find_similar_dreams(store, target['themes'], target['symbols'], target['emotions'], k=3)
+    assert similar.iloc[0]['dream'] == target['dream']
+    assert list(similar['similarity']) == sorted(similar['similarity'], reverse=True)
+    assert (similar['similarity'] >= similarity.MIN_SIMILARITY).all()
+
+    # Dreams appended elsewhere are picked up on the next search
+    store.append_many([dict(target, dream="appended elsewhere", themes=["unique theme"])])
+    similar = find_similar_dreams(store, ["unique theme"], k=1, min_similarity=0)
+    assert list(similar['dream']) == ["appended elsewhere"]
@@ -0,0 +1,146 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import storage
+from storage import open_store, migrate_store, ParquetDreamStore, HISTORY_COLUMNS
+from schema import to_typed
+
+def _entries(n, start=0):
+    return [{"date": f"2024-01-{i % 28 + 1:02d}", "dream": f"Dream number {i}", "themes": "water, night",
+             "sentiment": 0.25 * (i % 5) - 0.5, "category": ["pleasant", "nightmare"][i % 2],
+             "emotions": "joy", "symbols": "water"} for i in range(start, start + n)]
+
+def _dreams(store):
+    return list(store.load(columns=["dream"])["dream"])
+
+@pytest.fixture(params=["dream_log.csv", "dream_log.db", "dream_log.parquet"])
+def store(request, tmp_path):
+    return open_store(str(tmp_path / request.param))
+
+def test_round_trip(store):
+    assert len(store.load()) == 0
+    store.append_many(_entries(5))
+    store.append(_entries(1, start=5)[0])
+    df = store.load()
+    assert list(df.columns) == HISTORY_COLUMNS
+    assert list(df["dream"]) == [f"Dream number {i}" for i in range(6)]
+    assert store.count() == 6
+    assert sorted(store.categories()) == ["nightmare", "pleasant"]
+
+def test_iter_chunks_matches_load(store):
+    store.append_many(_entries(7))
+    store.append_many(_entries(4, start=7))
+    chunks = list(store.iter_chunks(columns=["dream", "sentiment"], chunksize=3))
+    assert all(len(chunk) <= 3 for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True),
+                                  store.load(columns=["dream", "sentiment"]), check_dtype=False)
+
+def test_query_filters_days_inclusively(store):
+    store.append_many(_entries(10))
+    rows = store.query(start_date="2024-01-03", end_date="2024-01-05", category="nightmare")
+    assert list(rows["dream"]) == ["Dream number 3"]
+
+def test_version_changes_on_append_and_clear(store):
+    versions = [store.version()]
+    store.append_many(_entries(2))
+    versions.append(store.version())
+    store.clear()
+    versions.append(store.version())
+    assert versions[0] != versions[1] != versions[2]
+    assert len(store.load()) == 0
+
+@pytest.mark.parametrize("target", ["dream_log.db", "dream_log.parquet", "copy.csv"])
+def test_migrate_store_keeps_every_dream(tmp_path, target):
+    source = open_store(str(tmp_path / "dream_log.csv"))
+    source.append_many(_entries(12))
+    target_path = str(tmp_path / target)
+    assert migrate_store(source.path, target_path) == 12
+    pd.testing.assert_frame_equal(to_typed(open_store(target_path).load()), to_typed(source.load()))
+
+    # A target with dreams is left alone unless overwritten
+    assert migrate_store(source.path, target_path) == 0
+    assert migrate_store(source.path, target_path, overwrite=True) == 12
+    assert open_store(target_path).count() == 12
+
+def test_csv_legacy_layout_is_rewritten_on_append(tmp_path):
+    path = tmp_path / "dream_log.csv"
+    pd.DataFrame({"date": ["2024-01-01"], "dream": ["Old dream"], "themes": ["sea"],
+                  "sentiment": [0.5], "category": ["pleasant"]}).to_csv(path, index=False)
+    store = open_store(str(path))
+    before, _ = store.append_many(_entries(1))
+    assert before is None
+    assert _dreams(store) == ["Old dream", "Dream number 0"]
+    assert list(pd.read_csv(path).columns) == HISTORY_COLUMNS
+
+def test_csv_concurrent_first_appends_keep_every_row(tmp_path, monkeypatch):
+    store = open_store(str(tmp_path / "dream_log.csv"))
+
+    # "Another process" creates the log after this writer found it missing
+    link = os.link
+    def create_first(src, dst):
+        monkeypatch.setattr(storage.os, "link", link)
+        open_store(store.path).append_many(_entries(2))
+        return link(src, dst)
+    monkeypatch.setattr(storage.os, "link", create_first)
+    store.append_many(_entries(3, start=2))
+
+    assert _dreams(store) == [f"Dream number {i}" for i in range(5)]
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+@pytest.fixture
+def parquet(tmp_path, monkeypatch):
+    monkeypatch.setattr(ParquetDreamStore, "COMPACT_THRESHOLD", 4)
+    return open_store(str(tmp_path / "dream_log.parquet"))
+
+def test_compaction_keeps_rows_in_order(parquet):
+    for i in range(11):
+        parquet.append_many(_entries(1, start=i))
+    assert len(parquet._parts()) <= ParquetDreamStore.COMPACT_THRESHOLD
+    assert _dreams(parquet) == [f"Dream number {i}" for i in range(11)]
+    assert parquet.count() == 11
+
+def test_interrupted_compaction_does_not_duplicate_rows(parquet, monkeypatch):
+    for i in range(3):
+        parquet.append_many(_entries(1, start=i))
+    # Crash after the compacted part is in place, before the old parts are deleted
+    monkeypatch.setattr(ParquetDreamStore, "_remove", lambda self, names: None)
+    parquet.compact()
+    assert len(parquet._files()) == 4
+    assert _dreams(parquet) == [f"Dream number {i}" for i in range(3)]
+    monkeypatch.undo()
+
+    # A later compaction merges the compacted part and still hides, then removes, the old ones
+    parquet.append_many(_entries(1, start=3))
+    parquet.compact()
+    assert len(parquet._files()) == 1
+    assert _dreams(parquet) == [f"Dream number {i}" for i in range(4)]
+
+def test_readers_survive_a_concurrent_compaction(parquet, monkeypatch):
+    for i in range(3):
+        parquet.append_many(_entries(1, start=i))
+    expected = [f"Dream number {i}" for i in range(3)]
+
+    # Compact from "another process" after the reader listed the parts, before it opened them
+    memory_map = pa.memory_map
+    state = {'compacted': False}
+    def compact_first(path, *args, **kwargs):
+        if not state['compacted']:
+            state['compacted'] = True
+            monkeypatch.setattr(storage.pa, "memory_map", memory_map)
+            open_store(parquet.path).compact()
+        return memory_map(path, *args, **kwargs)
+    monkeypatch.setattr(storage.pa, "memory_map", compact_first)
+    assert _dreams(parquet) == expected
+    assert state['compacted']
+
+    # A reader that already opened its parts keeps reading after they are deleted
+    parquet.append_many(_entries(1, start=3))
+    chunks = parquet.iter_chunks(columns=["dream"], chunksize=1)
+    first = next(chunks)
+    open_store(parquet.path).compact()
+    rest = list(chunks)
+    assert list(pd.concat([first] + rest)["dream"]) == expected + ["Dream number 3"]
+    assert os.listdir(parquet.path) == [os.path.basename(parquet._parts()[0])]
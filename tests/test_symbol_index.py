@@ -0,0 +1,74 @@
+import os
+import copy
+
+import pandas as pd
+import pytest
+
+from dream_symbols import (DREAM_SYMBOLS, SymbolIndex, get_symbol_frequencies, get_symbol_index,
+                           symbol_index_path, update_symbol_dictionary)
+from storage import open_store
+
+DREAMS = ["I swam in the water near a tree", "A snake by the fire", "water water everywhere",
+          "Falling from a mountain", "nothing to see here", None, "a house on fire"]
+
+@pytest.fixture
+def symbols():
+    original = copy.deepcopy(DREAM_SYMBOLS)
+    yield
+    update_symbol_dictionary(original, replace=True)
+
+def _history(dreams):
+    return pd.DataFrame({'dream': dreams})
+
+def _in_memory(dreams):
+    return get_symbol_frequencies(_history(dreams))
+
+def test_incremental_sync_matches_full_count(tmp_path):
+    index = SymbolIndex(str(tmp_path / "index.jsonl"))
+    for size in range(1, len(DREAMS) + 1):
+        assert get_symbol_frequencies(_history(DREAMS[:size]), index=index) == _in_memory(DREAMS[:size])
+    assert len(index) == len(DREAMS)
+    # A fresh process reads the same totals back from the file
+    assert SymbolIndex(index.path).frequencies() == _in_memory(DREAMS)
+
+def test_rewritten_history_rebuilds_index(tmp_path):
+    index = SymbolIndex(str(tmp_path / "index.jsonl"))
+    get_symbol_frequencies(_history(DREAMS), index=index)
+    # Same last dream, different earlier ones
+    changed = ["a cat in the house"] + DREAMS[1:]
+    assert get_symbol_frequencies(_history(changed), index=index) == _in_memory(changed)
+    shorter = DREAMS[:3]
+    assert get_symbol_frequencies(_history(shorter), index=index) == _in_memory(shorter)
+
+def test_filtered_history_leaves_persisted_index_alone(tmp_path):
+    store = open_store(str(tmp_path / "dream_log.csv"))
+    index = get_symbol_index(store)
+    get_symbol_frequencies(_history(DREAMS), index=index)
+    with open(index.path, "rb") as f:
+        before = f.read()
+
+    assert _in_memory(DREAMS[2:4]) == {'water': 2, 'falling': 1, 'mountain': 1}
+    with open(index.path, "rb") as f:
+        assert f.read() == before
+    assert get_symbol_index(store).frequencies() == _in_memory(DREAMS)
+
+def test_each_store_has_its_own_index(tmp_path):
+    csv_store = open_store(str(tmp_path / "dream_log.csv"))
+    db_store = open_store(str(tmp_path / "dream_log.db"))
+    get_symbol_index(csv_store).add_dreams(DREAMS[:2])
+    get_symbol_index(db_store).add_dreams(DREAMS[2:3])
+
+    assert symbol_index_path(csv_store.path) != symbol_index_path(db_store.path)
+    assert os.path.dirname(get_symbol_index(db_store).path) == str(tmp_path)
+    assert get_symbol_index(db_store).frequencies() == {'water': 2}
+    assert get_symbol_index(csv_store).frequencies() == _in_memory(DREAMS[:2])
+
+def test_dictionary_change_invalidates_index(tmp_path, symbols):
+    index = SymbolIndex(str(tmp_path / "index.jsonl"))
+    get_symbol_frequencies(_history(DREAMS), index=index)
+    update_symbol_dictionary({'everywhere': {'meaning': 'Everything at once', 'category': 'settings',
+                                             'associations': []}})
+
+    assert index.is_stale()
+    assert get_symbol_frequencies(_history(DREAMS), index=index)['everywhere'] == 1
+    assert not SymbolIndex(index.path).is_stale()
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from timeline import DreamTimeline
+from storage import open_store
+
+EMOTIONS = ["joy", "fear", "sadness", "peace"]
+
+def _entries(count, seed=0):
+    rng = np.random.default_rng(seed)
+    entries = []
+    for i in range(count):
+        date = pd.Timestamp("2024-01-01") + pd.Timedelta(hours=int(rng.integers(0, 24 * 90)))
+        entries.append({
+            'date': pd.NaT if i % 17 == 5 else date,
+            'dream': f"dream {i}",
+            'sentiment': np.nan if i % 11 == 3 else float(rng.uniform(-1, 1)),
+            'category': ["nightmare", "lucid", "ordinary"][i % 3],
+            'emotions': [str(e) for e in rng.choice(EMOTIONS, size=int(rng.integers(1, 3)), replace=False)],
+        })
+    return entries
+
+def _reference(entries):
+    """The history sorted like the timeline, with windows computed by pandas."""
+    frame = pd.DataFrame(entries)
+    frame['position'] = np.arange(len(frame))
+    frame = frame.sort_values(['date', 'position'], kind="stable", na_position="last").reset_index(drop=True)
+    frame['sentiment_rolling'] = frame['sentiment'].rolling(3, min_periods=1).mean()
+    dated = frame['date'].notna()
+    by_date = frame[dated].set_index('date')['sentiment']
+    for window, column in [("7D", "sentiment_7d"), ("30D", "sentiment_30d")]:
+        frame[column] = frame['sentiment']
+        frame.loc[dated, column] = by_date.rolling(window, min_periods=1).mean().to_numpy()
+    return frame
+
+def _batches(entries, seed):
+    rng = np.random.default_rng(seed)
+    cuts = sorted(rng.choice(np.arange(1, len(entries)), size=6, replace=False))
+    return np.split(np.array(entries, dtype=object), cuts)
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_incremental_windows_match_pandas_rolling(seed):
+    entries = _entries(120, seed)
+    timeline = DreamTimeline()
+    for batch in _batches(entries, seed):
+        timeline.add_entries(list(batch))
+
+    expected = _reference(entries)
+    frame = timeline.frame
+    assert list(frame['dream']) == list(expected['dream'])
+    assert list(timeline.order) == list(expected['position'])
+    for column in ["sentiment_rolling", "sentiment_7d", "sentiment_30d"]:
+        np.testing.assert_allclose(frame[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                   atol=1e-6, equal_nan=True)
+
+def test_incremental_matches_bulk_load():
+    entries = _entries(80, seed=3)
+    incremental = DreamTimeline()
+    for batch in _batches(entries, 3):
+        incremental.add_entries(list(batch))
+    bulk = DreamTimeline(entries)
+    pd.testing.assert_frame_equal(incremental.frame, bulk.frame)
+    # Emotion columns come in first-seen order, which depends on insert order
+    pd.testing.assert_frame_equal(incremental.emotion_window("7D")[EMOTIONS], bulk.emotion_window("7D")[EMOTIONS])
+
+def test_between_matches_date_filter():
+    entries = _entries(100, seed=4)
+    timeline = DreamTimeline(entries)
+    expected = _reference(entries)
+    cases = [("2024-01-10", "2024-02-05"), ("2024-02-01", None), (None, "2024-01-03"), ("2025-01-01", None)]
+    for start, end in cases:
+        mask = expected['date'].notna()
+        if start is not None:
+            mask &= expected['date'] >= pd.Timestamp(start)
+        if end is not None:
+            mask &= expected['date'] < pd.Timestamp(end) + pd.Timedelta(days=1)
+        assert list(timeline.between(start, end)['dream']) == list(expected.loc[mask, 'dream'])
+    assert len(timeline.between()) == len(entries)
+    nightmares = timeline.between("2024-01-10", "2024-02-05", category="nightmare")
+    assert set(nightmares['category']) == {"nightmare"}
+
+def test_emotion_window_counts_each_window():
+    timeline = DreamTimeline(_entries(60, seed=5))
+    window = timeline.emotion_window("7D", "2024-01-15", "2024-03-01")
+    frame = timeline.frame.reset_index(names="sorted_date")
+    lo = int(np.flatnonzero(frame['sorted_date'] >= pd.Timestamp("2024-01-15"))[0])
+    assert len(window) == len(timeline.between("2024-01-15", "2024-03-01"))
+    for position, (date, counts) in enumerate(window.iterrows(), start=lo):
+        # (date - 7 days, date], up to and including this dream
+        rows = frame.iloc[:position + 1]
+        rows = rows[rows['sorted_date'] > date - pd.Timedelta("7D")]
+        expected = pd.Series([e for cell in rows['emotions'] for e in set(cell)], dtype=object).value_counts()
+        assert {e: int(counts.get(e, 0)) for e in EMOTIONS} == {e: int(expected.get(e, 0)) for e in EMOTIONS}
+
+def test_sync_follows_the_store(tmp_path):
+    store = open_store(str(tmp_path / "dream_log.csv"))
+    store.append_many(_entries(10, seed=6))
+    timeline = DreamTimeline().sync(store)
+    assert len(timeline) == 10 and timeline.store_version == store.version()
+    store.append_many(_entries(5, seed=7))
+    assert len(timeline.sync(store)) == 15
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from schema import as_list
+
+def split_themes(themes):
+    """Distinct, non-empty theme names of a history cell (list or comma-joined string)."""
+    distinct = []
+    for theme in as_list(themes):
+        if theme and theme not in distinct:
+            distinct.append(theme)
+    return distinct
+
+class ThemeMatrix:
+    """Sparse dreams x themes indicator matrix.
+
+    Each dream's theme list is tokenized once; cell (i, j) is 1 when dream i
+    has theme j exactly, so "run" never matches "running". Counts, top-k,
+    correlations and rolling frequencies are matrix operations over it.
+    Themes are numbered in the order they first appear.
+    """
+
+    def __init__(self, theme_lists):
+        self.index = {}
+        rows, columns = [], []
+        n_rows = 0
+        for row, themes in enumerate(theme_lists):
+            n_rows = row + 1
+            for theme in themes:
+                column = self.index.setdefault(theme, len(self.index))
+                rows.append(row)
+                columns.append(column)
+
+        self.themes = list(self.index)
+        data = np.ones(len(rows), dtype=np.float64)
+        # Duplicate (row, theme) pairs collapse to 1 so cells stay indicators
+        matrix = sparse.csr_matrix((data, (rows, columns)), shape=(n_rows, len(self.themes)))
+        matrix.data[:] = 1.0
+        self.matrix = matrix
+
+    @classmethod
+    def from_series(cls, themes_column):
+        """Build from a history themes column, e.g. dream_log['themes']."""
+        return cls(split_themes(value) for value in themes_column)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def counts(self):
+        """Number of dreams containing each theme, in self.themes order."""
+        return np.asarray(self.matrix.sum(axis=0)).ravel()
+
+    def top_k(self, k=10):
+        """Return the k most frequent (theme, count) pairs; ties keep first-seen order."""
+        counts = self.counts()
+        order = np.argsort(-counts, kind="stable")[:k]
+        return [(self.themes[i], int(counts[i])) for i in order]
+
+    def columns(self, themes):
+        return [self.index[theme] for theme in themes]
+
+    def indicators(self, themes, order=None):
+        """Dense 0/1 DataFrame of the given themes, with rows optionally reordered."""
+        dense = self.matrix[:, self.columns(themes)].toarray()
+        if order is not None:
+            dense = dense[order]
+        return pd.DataFrame(dense, columns=list(themes))
+
+    def correlation(self, themes=None):
+        """Pearson correlation between theme indicator columns, as a DataFrame.
+
+        Computed from the sparse co-occurrence matrix X^T X; themes present
+        in every dream or in none have undefined correlation (NaN), as with
+        DataFrame.corr.
+        """
+        themes = list(themes) if themes is not None else self.themes
+        sub = self.matrix[:, self.columns(themes)]
+        n = sub.shape[0]
+        sums = np.asarray(sub.sum(axis=0)).ravel()
+        cooccurrence = (sub.T @ sub).toarray()
+
+        covariance = n * cooccurrence - np.outer(sums, sums)
+        variance = n * sums - sums ** 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = covariance / np.sqrt(np.outer(variance, variance))
+        corr[np.outer(variance, variance) <= 0] = np.nan
+        return pd.DataFrame(corr, index=themes, columns=themes)
+
+    def rolling_frequency(self, themes, window=3, order=None):
+        """Rolling mean of each theme's indicator over window consecutive dreams.
+
+        order is an optional row permutation, e.g. sorting dreams by date.
+        Windows at the start are shorter, like rolling(min_periods=1).
+        """
+        dense = self.matrix[:, self.columns(themes)].toarray()
+        if order is not None:
+            dense = dense[order]
+        cumulative = np.cumsum(dense, axis=0)
+        shifted = np.zeros_like(cumulative)
+        shifted[window:] = cumulative[:-window]
+        sizes = np.minimum(np.arange(1, len(dense) + 1), window)[:, None]
+        return pd.DataFrame((cumulative - shifted) / sizes, columns=list(themes))
@@ -0,0 +1,212 @@
+import threading
+import numpy as np
+import pandas as pd
+
+from schema import to_typed, as_list, SCHEMA_VERSION
+
+# Rolling windows kept for every dream, as a number of dreams or a time span,
+# and the frame column holding the mean sentiment over each
+ROLLING_WINDOWS = {
+    3: "sentiment_rolling",
+    "7D": "sentiment_7d",
+    "30D": "sentiment_30d"
+}
+
+_timeline = None
+
+def _day_bounds(start_date=None, end_date=None):
+    # Inclusive days, as in DreamStore.query: [start 00:00, day after end 00:00)
+    start = pd.Timestamp(start_date).normalize() if start_date is not None else None
+    end = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1) if end_date is not None else None
+    return start, end
+
+class DreamTimeline:
+    """The dream history sorted by date, with rolling windows kept up to date.
+
+    Rows are ordered by their parsed date, dreams on the same date keeping
+    history order and undated dreams last, so date ranges are found by
+    binary search and returned as slices rather than filtered copies.
+    Prefix sums of sentiment and per-emotion counts give the rolling
+    sentiment means (ROLLING_WINDOWS) and emotion window counts for any
+    dream in constant time; appends only compute them for new rows.
+
+    The timeline records the store version it describes; sync() reloads
+    it when the store changed without it, e.g. from another process.
+    """
+
+    def __init__(self, history=None):
+        self._lock = threading.RLock()
+        self.store_version = None
+        self._clear()
+        if history is not None:
+            self._insert(history)
+
+    def _clear(self):
+        self.frame = to_typed(pd.DataFrame(columns=["date", "sentiment"]))
+        self.frame.index = pd.DatetimeIndex([])
+        # History position of each sorted row, e.g. to align per-row data
+        self.order = np.empty(0, dtype=np.int64)
+        self._dated = 0
+        self.emotions = []
+        self._sentiment_sum = np.zeros(1)
+        self._sentiment_count = np.zeros(1, dtype=np.int64)
+        self._emotion_counts = np.zeros((1, 0), dtype=np.int32)
+        self._starts = {window: np.empty(0, dtype=np.int64) for window in ROLLING_WINDOWS}
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def dates(self):
+        return self.frame.index.to_numpy()
+
+    def _insert(self, entries):
+        new = to_typed(pd.DataFrame(entries).reset_index(drop=True))
+        if len(new) == 0:
+            return
+        if "sentiment" not in new.columns:
+            new["sentiment"] = np.float32("nan")
+
+        with self._lock:
+            frame = self.frame
+            size = len(frame)
+            new_order = np.arange(size, size + len(new))
+            dates = frame.index.to_numpy()
+
+            # Rows before the first new date keep their position and windows;
+            # everything after it is re-sorted and recomputed
+            first = new["date"].min()
+            split = size if pd.isna(first) else int(np.searchsorted(dates, first.to_datetime64(), side="right"))
+            tail = pd.concat([frame.iloc[split:].reset_index(drop=True), new], ignore_index=True)
+            tail_order = np.concatenate([self.order[split:], new_order])
+            ranks = np.lexsort((tail_order, tail["date"].to_numpy()))
+            tail = tail.iloc[ranks].reset_index(drop=True)
+            tail_order = tail_order[ranks]
+
+            dates = np.concatenate([dates[:split], tail["date"].to_numpy()])
+            order = np.concatenate([self.order[:split], tail_order])
+
+            sentiment = pd.to_numeric(tail["sentiment"], errors="coerce").to_numpy(dtype=np.float64)
+            valid = ~np.isnan(sentiment)
+            sentiment_sum = np.concatenate([
+                self._sentiment_sum[:split + 1],
+                self._sentiment_sum[split] + np.cumsum(np.where(valid, sentiment, 0.0))])
+            sentiment_count = np.concatenate([
+                self._sentiment_count[:split + 1], self._sentiment_count[split] + np.cumsum(valid)])
+
+            emotions = list(self.emotions)
+            columns = {emotion: i for i, emotion in enumerate(emotions)}
+            rows, cols = [], []
+            for row, cell in enumerate(tail["emotions"] if "emotions" in tail.columns else []):
+                for emotion in set(as_list(cell)):
+                    if emotion not in columns:
+                        columns[emotion] = len(emotions)
+                        emotions.append(emotion)
+                    rows.append(row)
+                    cols.append(columns[emotion])
+            tail_counts = np.zeros((len(tail), len(emotions)), dtype=np.int32)
+            np.add.at(tail_counts, (rows, cols), 1)
+            head_counts = np.zeros((split + 1, len(emotions)), dtype=np.int32)
+            head_counts[:, :len(self.emotions)] = self._emotion_counts[:split + 1]
+            emotion_counts = np.concatenate([head_counts, head_counts[-1] + np.cumsum(tail_counts, axis=0)])
+
+            positions = np.arange(split, len(dates))
+            starts = {}
+            for window, column in ROLLING_WINDOWS.items():
+                if isinstance(window, int):
+                    tail_starts = np.maximum(0, positions - window + 1)
+                else:
+                    # Time windows are (date - span, date], as in DataFrame.rolling
+                    tail_starts = np.searchsorted(dates, dates[split:] - pd.Timedelta(window).to_timedelta64(),
+                                                  side="right")
+                    # Undated dreams are only averaged with themselves
+                    tail_starts = np.where(np.isnat(dates[split:]), positions, tail_starts)
+                starts[window] = np.concatenate([self._starts[window][:split], tail_starts])
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    tail[column] = ((sentiment_sum[positions + 1] - sentiment_sum[tail_starts])
+                                    / (sentiment_count[positions + 1] - sentiment_count[tail_starts]))
+
+            frame = pd.concat([frame.iloc[:split].reset_index(drop=True), tail], ignore_index=True)
+            if "category" in frame.columns and frame["category"].dtype != "category":
+                frame["category"] = frame["category"].astype("category")
+            frame.index = pd.DatetimeIndex(dates)
+            frame.attrs["schema_version"] = SCHEMA_VERSION
+
+            self.frame = frame
+            self.order = order
+            self._dated = int(np.count_nonzero(~np.isnat(dates)))
+            self.emotions = emotions
+            self._sentiment_sum = sentiment_sum
+            self._sentiment_count = sentiment_count
+            self._emotion_counts = emotion_counts
+            self._starts = starts
+
+    def add_entries(self, entries, store_version=None):
+        """Fold newly stored entries (dicts keyed by history column) into the timeline."""
+        with self._lock:
+            self._insert(list(entries))
+            self.store_version = store_version
+
+    def rebuild(self, store):
+        """Reload the whole timeline from the store."""
+        with self._lock:
+            store_version = store.version()
+            self._clear()
+            self._insert(store.load())
+            self.store_version = store_version
+
+    def reset(self, store_version=None):
+        """Empty the timeline, e.g. when the dream history is cleared."""
+        with self._lock:
+            self._clear()
+            self.store_version = store_version
+
+    def sync(self, store):
+        """Rebuild the timeline if the store changed without it."""
+        with self._lock:
+            if self.store_version is None or self.store_version != store.version():
+                self.rebuild(store)
+        return self
+
+    def _bounds(self, start_date=None, end_date=None):
+        start, end = _day_bounds(start_date, end_date)
+        dates = self.dates
+        if start is None and end is None:
+            return 0, len(dates)
+        # Undated dreams sort last and only match an unbounded range
+        lo = 0 if start is None else int(np.searchsorted(dates, start.to_datetime64(), side="left"))
+        hi = self._dated if end is None else int(np.searchsorted(dates, end.to_datetime64(), side="left"))
+        return lo, max(lo, hi)
+
+    def between(self, start_date=None, end_date=None, category=None):
+        """Return dreams between two days (inclusive) and in a category, in date order.
+
+        The date range is a slice of the timeline, not a copy; only a
+        category filter selects rows out of it.
+        """
+        with self._lock:
+            lo, hi = self._bounds(start_date, end_date)
+            rows = self.frame.iloc[lo:hi]
+        if category is not None and "category" in rows.columns:
+            rows = rows[rows["category"] == category]
+        return rows
+
+    def emotion_window(self, window="30D", start_date=None, end_date=None):
+        """Count each emotion over the rolling window ending at every dream in the range.
+
+        Returns a DataFrame indexed by date with a column per emotion.
+        """
+        with self._lock:
+            lo, hi = self._bounds(start_date, end_date)
+            positions = np.arange(lo, hi)
+            counts = self._emotion_counts[positions + 1] - self._emotion_counts[self._starts[window][lo:hi]]
+            return pd.DataFrame(counts, index=self.frame.index[lo:hi], columns=self.emotions)
+
+def get_timeline(store=None):
+    """Return the process-wide timeline, synced with store when one is given."""
+    global _timeline
+    if _timeline is None:
+        _timeline = DreamTimeline()
+    if store is not None:
+        _timeline.sync(store)
+    return _timeline
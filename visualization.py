@@ -6,7 +6,12 @@ from wordcloud import WordCloud
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from theme_matrix import ThemeMatrix
+from timeline import DreamTimeline
+from schema import as_list
+from metrics import timed
 
+@timed()
 def plot_sentiment_over_time(dream_log):
     fig, ax = plt.subplots(figsize=(10, 6))
     sns.lineplot(data=dream_log, x="date", y="sentiment", marker="o")
@@ -17,6 +22,7 @@ def plot_sentiment_over_time(dream_log):
     plt.tight_layout()
     return fig
 
+@timed()
 def generate_wordcloud(theme_list):
     all_words = " ".join(theme_list)
     wordcloud = WordCloud(width=800, height=400, 
@@ -30,17 +36,27 @@ def generate_wordcloud(theme_list):
     plt.axis("off")
     return fig
 
-def plot_emotion_distribution(dream_log):
-    if 'emotions' not in dream_log.columns:
-        return None
-    
-    all_emotions = []
-    for emotions_str in dream_log['emotions']:
-        if isinstance(emotions_str, str):
-            emotions = [e.strip() for e in emotions_str.split(',')]
-            all_emotions.extend(emotions)
-    
-    emotion_counts = pd.Series(all_emotions).value_counts()
+def _counts_series(counter, n=None):
+    # Most frequent first; ties keep first-seen order, as value_counts does
+    counts = pd.Series(dict(counter), dtype="int64").sort_values(ascending=False, kind="stable")
+    return counts.head(n) if n is not None else counts
+
+@timed()
+def plot_emotion_distribution(dream_log, aggregates=None):
+    """Bar chart of emotion frequencies, read from aggregates when given."""
+    if aggregates is not None:
+        if not aggregates.emotion_counts:
+            return None
+        emotion_counts = _counts_series(aggregates.emotion_counts)
+    else:
+        if 'emotions' not in dream_log.columns:
+            return None
+        
+        all_emotions = []
+        for emotions in dream_log['emotions']:
+            all_emotions.extend(as_list(emotions))
+        
+        emotion_counts = pd.Series(all_emotions).value_counts()
     
     fig, ax = plt.subplots(figsize=(10, 6))
     emotion_counts.plot(kind='bar', colormap='viridis')
@@ -51,32 +67,19 @@ def plot_emotion_distribution(dream_log):
     plt.tight_layout()
     return fig
 
-def plot_theme_correlation(dream_log):
+@timed()
+def plot_theme_correlation(dream_log, theme_matrix=None):
     if len(dream_log) < 5 or 'themes' not in dream_log.columns:
         return None
     
-    all_themes = set()
-    for themes_str in dream_log['themes']:
-        if isinstance(themes_str, str):
-            themes = [t.strip() for t in themes_str.split(',')]
-            all_themes.update(themes)
-    
-    theme_counts = {}
-    for theme in all_themes:
-        count = sum(1 for themes_str in dream_log['themes'] 
-                  if isinstance(themes_str, str) and theme in themes_str)
-        theme_counts[theme] = count
-    
-    top_themes = sorted(theme_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-    top_theme_names = [t[0] for t in top_themes]
-    
-    theme_matrix = pd.DataFrame(index=dream_log.index, columns=top_theme_names)
-    for theme in top_theme_names:
-        theme_matrix[theme] = dream_log['themes'].apply(
-            lambda x: 1 if isinstance(x, str) and theme in x else 0
-        )
+    # Themes are matched exactly, not as substrings of the themes string
+    if theme_matrix is None:
+        theme_matrix = ThemeMatrix.from_series(dream_log['themes'])
+    top_theme_names = [theme for theme, _ in theme_matrix.top_k(10)]
+    if not top_theme_names:
+        return None
     
-    corr_matrix = theme_matrix.corr()
+    corr_matrix = theme_matrix.correlation(top_theme_names)
     
     fig, ax = plt.subplots(figsize=(10, 8))
     sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1, ax=ax)
@@ -84,21 +87,29 @@ def plot_theme_correlation(dream_log):
     plt.tight_layout()
     return fig
 
-def plot_interactive_sentiment_timeline(dream_log):
-    if len(dream_log) < 2:
+@timed()
+def plot_interactive_sentiment_timeline(dream_log, timeline=None):
+    """Sentiment per dream with its rolling averages, read from timeline when given."""
+    if timeline is None:
+        if len(dream_log) < 2:
+            return None
+        timeline = DreamTimeline(dream_log)
+    if len(timeline) < 2:
         return None
     
-    dream_log = dream_log.copy()
-    dream_log['date'] = pd.to_datetime(dream_log['date'])
-    dream_log = dream_log.sort_values('date')
-    
-    dream_log['sentiment_rolling'] = dream_log['sentiment'].rolling(window=3, min_periods=1).mean()
+    # Already in date order, with the rolling means kept by the timeline
+    dream_log = timeline.frame
     
     fig = px.line(dream_log, x='date', y=['sentiment', 'sentiment_rolling'], 
                  title='Dream Sentiment Timeline',
                  labels={'value': 'Sentiment Score', 'date': 'Date', 'variable': 'Metric'},
                  color_discrete_map={'sentiment': 'royalblue', 'sentiment_rolling': 'firebrick'})
     
+    # Longer windows start hidden and can be toggled from the legend
+    for column, color in (('sentiment_7d', 'darkorange'), ('sentiment_30d', 'seagreen')):
+        fig.add_scatter(x=dream_log['date'], y=dream_log[column], mode='lines', name=column,
+                        line=dict(color=color), visible='legendonly')
+    
     fig.update_layout(
         hovermode='x unified',
         legend=dict(title='', orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
@@ -107,6 +118,33 @@ def plot_interactive_sentiment_timeline(dream_log):
     
     return fig
 
+@timed()
+def plot_emotion_timeline(timeline, window="30D", top_n=5):
+    """Share of the most common emotions among all emotions in the rolling window ending at each dream."""
+    if len(timeline) < 2:
+        return None
+    
+    counts = timeline.emotion_window(window).drop(columns=["neutral"], errors="ignore")
+    counts = counts[counts.index.notna()]
+    if counts.empty or not counts.to_numpy().any():
+        return None
+    
+    top_emotions = counts.sum().nlargest(top_n).index
+    shares = counts[top_emotions].div(counts.sum(axis=1).replace(0, np.nan), axis=0)
+    
+    fig = px.line(shares, x=shares.index, y=list(top_emotions),
+                 title=f'Emotions Over Time ({window} window)',
+                 labels={'value': 'Share of Emotions', 'x': 'Date', 'variable': 'Emotion'})
+    fig.update_layout(
+        hovermode='x unified',
+        legend=dict(title='', orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        xaxis_title='Date',
+        yaxis_title='Share of Emotions',
+        yaxis_tickformat='.0%')
+    
+    return fig
+
+@timed()
 def plot_dream_symbol_network(dream_symbols, min_occurrences=2):
     if not dream_symbols or len(dream_symbols) < 3:
         return None
@@ -146,27 +184,25 @@ def plot_dream_symbol_network(dream_symbols, min_occurrences=2):
     
     return fig
 
-def create_dream_dashboard(dream_log):
-    if len(dream_log) < 3:
+@timed()
+def create_dream_dashboard(dream_log, aggregates=None, timeline=None):
+    """Four-panel dashboard; with aggregates it plots daily mean sentiment and never reads dream_log.
+
+    A timeline, when given, supplies the dreams already sorted by date.
+    """
+    if aggregates is not None:
+        return _dashboard_from_aggregates(aggregates)
+    
+    if timeline is None:
+        if len(dream_log) < 3:
+            return None
+        timeline = DreamTimeline(dream_log)
+    if len(timeline) < 3:
         return None
     
-    fig = make_subplots(
-        rows=2, cols=2,
-        subplot_titles=(
-            'Sentiment Over Time', 
-            'Emotion Distribution',
-            'Dream Categories', 
-            'Theme Frequency'
-        ),
-        specs=[
-            [{'type': 'scatter'}, {'type': 'bar'}],
-            [{'type': 'pie'}, {'type': 'bar'}]
-        ]
-    )
+    fig = _dashboard_figure()
     
-    dream_log = dream_log.copy()
-    dream_log['date'] = pd.to_datetime(dream_log['date'])
-    dream_log = dream_log.sort_values('date')
+    dream_log = timeline.frame
     
     fig.add_trace(
         go.Scatter(x=dream_log['date'], y=dream_log['sentiment'], mode='lines+markers',
@@ -176,10 +212,8 @@ def create_dream_dashboard(dream_log):
     
     if 'emotions' in dream_log.columns:
         all_emotions = []
-        for emotions_str in dream_log['emotions']:
-            if isinstance(emotions_str, str):
-                emotions = [e.strip() for e in emotions_str.split(',')]
-                all_emotions.extend(emotions)
+        for emotions in dream_log['emotions']:
+            all_emotions.extend(as_list(emotions))
         
         emotion_counts = pd.Series(all_emotions).value_counts().head(5)
         
@@ -191,6 +225,8 @@ def create_dream_dashboard(dream_log):
     
     if 'category' in dream_log.columns:
         category_counts = dream_log['category'].value_counts()
+        # Categorical columns also count categories with no dreams
+        category_counts = category_counts[category_counts > 0]
         fig.add_trace(
             go.Pie(labels=category_counts.index, values=category_counts.values,
                    name='Categories'),
@@ -199,10 +235,8 @@ def create_dream_dashboard(dream_log):
     
     if 'themes' in dream_log.columns:
         all_themes = []
-        for themes_str in dream_log['themes']:
-            if isinstance(themes_str, str):
-                themes = [t.strip() for t in themes_str.split(',')]
-                all_themes.extend(themes)
+        for themes in dream_log['themes']:
+            all_themes.extend(as_list(themes))
         
         theme_counts = pd.Series(all_themes).value_counts().head(10)
         
@@ -218,4 +252,65 @@ def create_dream_dashboard(dream_log):
         title_text="Dream Analysis Dashboard"
     )
     
-    return fig
\ No newline at end of file
+    return fig
+
+def _dashboard_figure():
+    return make_subplots(
+        rows=2, cols=2,
+        subplot_titles=(
+            'Sentiment Over Time', 
+            'Emotion Distribution',
+            'Dream Categories', 
+            'Theme Frequency'
+        ),
+        specs=[
+            [{'type': 'scatter'}, {'type': 'bar'}],
+            [{'type': 'pie'}, {'type': 'bar'}]
+        ]
+    )
+
+def _dashboard_from_aggregates(aggregates):
+    if aggregates.total < 3:
+        return None
+    
+    fig = _dashboard_figure()
+    
+    dates, sentiments = aggregates.daily_sentiment()
+    fig.add_trace(
+        go.Scatter(x=pd.to_datetime(dates), y=sentiments, mode='lines+markers',
+                 name='Sentiment', line=dict(color='royalblue')),
+        row=1, col=1
+    )
+    
+    if aggregates.emotion_counts:
+        emotion_counts = _counts_series(aggregates.emotion_counts, 5)
+        fig.add_trace(
+            go.Bar(x=emotion_counts.index, y=emotion_counts.values, name='Emotions',
+                  marker_color='mediumseagreen'),
+            row=1, col=2
+        )
+    
+    if aggregates.category_counts:
+        category_counts = _counts_series(aggregates.category_counts)
+        fig.add_trace(
+            go.Pie(labels=category_counts.index, values=category_counts.values,
+                   name='Categories'),
+            row=2, col=1
+        )
+    
+    if aggregates.theme_counts:
+        theme_counts = _counts_series(aggregates.theme_counts, 10)
+        fig.add_trace(
+            go.Bar(x=theme_counts.index, y=theme_counts.values, name='Themes',
+                  marker_color='coral'),
+            row=2, col=2
+        )
+    
+    fig.update_layout(
+        height=800,
+        showlegend=False,
+        title_text="Dream Analysis Dashboard"
+    )
+    
+    return fig
+